@@ -0,0 +1,81 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+"""
+Size and speed of the binary codec compared to pydantic JSON for BotResults with long sessions.
+
+    python -m benchmarks.bench_codec [--messages 1000 10000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from ai_tool_lib.bot.codec import BotResultsView, decode_results, encode_results
+from ai_tool_lib.bot.message import BotMessage, BotMessageRole, BotToolMessage
+from ai_tool_lib.bot.results import BotResults, BotToolCall
+from ai_tool_lib.bot.session import BotSession
+from ai_tool_lib.bot.tool.response import ToolBotResponse, ToolUserResponse
+
+
+def build_results(count: int) -> BotResults:
+    session = BotSession.new()
+    session.messages = [BotMessage(role=BotMessageRole.SYSTEM, content="You are a helpful assistant.")]
+    tool_calls = []
+    for i in range(count // 3):
+        call_id = f"call_{i}"
+        args = f'{{"query": "example query {i}"}}'
+        session.messages += [
+            BotMessage(role=BotMessageRole.USER, content=f"Question number {i}?"),
+            BotMessage(
+                role=BotMessageRole.BOT,
+                content=None,
+                tool_calls=[BotToolMessage(id=call_id, name="search", args=args)],
+            ),
+            BotMessage(role=BotMessageRole.TOOL, content="result " * 20, tool_call_id=call_id),
+        ]
+        tool_calls.append(
+            BotToolCall(tool="search", args={"query": f"example query {i}"}, response=ToolBotResponse(content="result"))
+        )
+    tool_calls.append(BotToolCall(tool="done", args={}, response=ToolUserResponse(data={"message": "Done."})))
+    results = BotResults.new(prompt="Question?", session=session)
+    results.tool_calls = tool_calls
+    return results
+
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(
+        f"{'messages':>9} {'json KB':>8} {'codec KB':>9} {'json enc ms':>12} {'codec enc ms':>13}"
+        f" {'json dec ms':>12} {'codec dec ms':>13} {'response ms':>12} {'last 50 ms':>11}"
+    )
+    for count in args.messages:
+        results = build_results(count)
+        json_data = results.model_dump_json()
+        codec_data = encode_results(results)
+        print(
+            f"{count:>9} {len(json_data) / 1024:>8.1f} {len(codec_data) / 1024:>9.1f}"
+            f" {timed(results.model_dump_json, args.repeat):>12.2f}"
+            f" {timed(lambda r=results: encode_results(r), args.repeat):>13.2f}"
+            f" {timed(lambda d=json_data: BotResults.model_validate_json(d), args.repeat):>12.2f}"
+            f" {timed(lambda d=codec_data: decode_results(d), args.repeat):>13.2f}"
+            f" {timed(lambda d=codec_data: BotResultsView(d).response_data, args.repeat):>12.3f}"
+            f" {timed(lambda d=codec_data: BotResultsView(d).session(last=50), args.repeat):>11.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
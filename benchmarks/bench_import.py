@@ -0,0 +1,100 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+"""
+Cold import time of the library's entry points, each measured in a fresh interpreter. Importing the
+package or building tools and sessions must not import any client SDK, clients are imported by
+get_bot_client when they are first asked for.
+
+    python -m benchmarks.bench_import [--repeat 5]
+    python -m benchmarks.bench_import --max-ms 400
+
+The exit code is 1 if a scenario imports a forbidden module or is slower than --max-ms.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+SCENARIOS = {
+    "package": ("import ai_tool_lib", ("openai", "importlib.metadata")),
+    "tools and sessions": (
+        "from ai_tool_lib import BasicTool, BotSession, PropertyDefinition\n"
+        "BasicTool('done', 'Respond.', properties=[PropertyDefinition(name='m', type=str, description='')], "
+        "execute=lambda m: None)\n"
+        "BotSession.new()",
+        ("openai",),
+    ),
+    "openai client": ("from ai_tool_lib import get_bot_client\nget_bot_client('openai', api_key='_', tools=[])", ()),
+}
+""" Scenario name, code to time and modules it must not import. """
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+exec(compile({code!r}, "<scenario>", "exec"))
+elapsed = time.perf_counter() - start
+print(json.dumps({{"ms": elapsed * 1000, "forbidden": [m for m in {forbidden!r} if m in sys.modules]}}))
+"""
+
+
+def measure(code: str, forbidden: tuple[str, ...]) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(code=code, forbidden=forbidden)],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output)
+
+
+def slowest_modules(code: str, count: int) -> list[tuple[int, str]]:
+    """Modules with the highest cumulative import time, from python -X importtime."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True
+    ).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        modules.append((int(cumulative), name.strip()))
+    return sorted(modules, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="interpreters started per scenario")
+    parser.add_argument("--max-ms", type=float, help="fail if a scenario's median import time is slower")
+    parser.add_argument("--top", type=int, default=0, help="show the slowest modules of each scenario")
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'scenario':>20} {'median ms':>10} {'min ms':>8}  forbidden imports")
+    for name, (code, forbidden) in SCENARIOS.items():
+        runs = [measure(code, forbidden) for _ in range(args.repeat)]
+        times = [r["ms"] for r in runs]
+        imported = sorted({m for r in runs for m in r["forbidden"]})
+        median = statistics.median(times)
+        print(f"{name:>20} {median:>10.1f} {min(times):>8.1f}  {', '.join(imported) or '-'}")
+        for cumulative, module in slowest_modules(code, args.top):
+            print(f"{'':>20} {cumulative / 1000:>10.1f}  {module}")
+        if imported:
+            failures.append(f"{name} imports {', '.join(imported)}")
+        # scenarios that create a client are expected to be slow
+        if args.max_ms is not None and forbidden and median > args.max_ms:
+            failures.append(f"{name} took {median:.1f} ms")
+
+    for failure in failures:
+        print(f"FAILED {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
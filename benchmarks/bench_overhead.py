@@ -0,0 +1,176 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+"""
+Per-iteration overhead of the library itself, measured against a local stub endpoint with scripted
+tool calls, as the number of tools, the session length and the tool call fan-out grow.
+
+CPU time is the client thread's only, so the in-process stub server is not counted. Peak memory is
+measured in a separate pass with tracemalloc, which includes the stub server's allocations.
+
+    python -m benchmarks.bench_overhead [--repeat 5] [--latency 0]
+    python -m benchmarks.bench_overhead --save baseline.json
+    python -m benchmarks.bench_overhead --compare baseline.json [--threshold 0.25]
+
+With --compare the exit code is 1 if any scenario's CPU time or peak memory grew by more than
+the threshold, so it can gate dependency upgrades in CI.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable
+
+from ai_tool_lib import BasicTool, BotSession, PropertyDefinition, ToolBotResponse, ToolUserResponse, get_bot_client
+from ai_tool_lib.bot.message import BotMessage, BotMessageRole, BotToolMessage
+from benchmarks.stub_server import StubChatCompletionServer
+
+COMPARED_METRICS = ("cpu_ms", "peak_kib")
+""" Metrics checked against the baseline. Wall time depends on the machine's load too much to gate on. """
+
+
+def make_tools(count: int) -> list[BasicTool]:
+    tools = [
+        BasicTool(
+            f"lookup_{i}",
+            f"Look up record {i}.",
+            properties=[PropertyDefinition(name="query", type=str, description="What to look up.")],
+            execute=lambda query: ToolBotResponse(content=f"found {query}"),
+        )
+        for i in range(count - 1)
+    ]
+    tools.append(
+        BasicTool(
+            "done",
+            "Respond to the user.",
+            properties=[PropertyDefinition(name="message", type=str, description="Your response to the user.")],
+            execute=lambda message: ToolUserResponse(data={"message": message}),
+        )
+    )
+    return tools
+
+
+def fan_out_script(fan_out: int) -> Callable[[dict], dict]:
+    """Call `fan_out` lookups in the first iteration of a run, then answer the user."""
+
+    def script(request: dict) -> dict:
+        if request["messages"][-1]["role"] == "tool":
+            return {"tool_calls": [("done", {"message": "ok"})]}
+        return {"tool_calls": [(f"lookup_{i % 9}", {"query": f"q{i}"}) for i in range(fan_out)]}
+
+    return script
+
+
+def make_history(count: int) -> list[BotMessage]:
+    messages = [BotMessage(role=BotMessageRole.SYSTEM, content="You are a helpful assistant.")]
+    for i in range(count // 3):
+        call_id = f"history_{i}"
+        messages += [
+            BotMessage(role=BotMessageRole.USER, content=f"Question number {i}?"),
+            BotMessage(
+                role=BotMessageRole.BOT,
+                content=None,
+                tool_calls=[BotToolMessage(id=call_id, name="lookup_0", args=f'{{"query": "q{i}"}}')],
+            ),
+            BotMessage(role=BotMessageRole.TOOL, content="result " * 20, tool_call_id=call_id),
+        ]
+    return messages
+
+
+def scenarios(args: argparse.Namespace) -> list[tuple[str, int, dict, int, int]]:
+    """Scenario name, parameter, client options, history length and fan-out."""
+    return [
+        *[("tools", n, {"tools": make_tools(n)}, 0, 1) for n in args.tools],
+        *[("history", n, {"tools": make_tools(10)}, n, 1) for n in args.history],
+        *[("fan_out", n, {"tools": make_tools(10)}, 0, n) for n in args.fan_out],
+        *[("fan_out_parallel", n, {"tools": make_tools(10), "parallel_tool_calls": True}, 0, n) for n in args.fan_out],
+    ]
+
+
+def measure(server: StubChatCompletionServer, options: dict, history: int, fan_out: int, repeat: int) -> dict:
+    server.script = fan_out_script(fan_out)
+    client = get_bot_client("openai", api_key="_", base_url=server.url, model="stub", session_token_limit=0, **options)
+    base = make_history(history) if history else None
+
+    def run():
+        session = BotSession.new()
+        if base:
+            # share the messages, like a session resumed between runs, so their serialization stays cached
+            session.messages = list(base)
+        return client.run("Question?", session)
+
+    # the first run renders tool definitions and warms the connection pool
+    run()
+    wall, cpu, iterations = [], [], 0
+    for _ in range(repeat):
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        results = run()
+        cpu.append(time.thread_time() - cpu_start)
+        wall.append(time.perf_counter() - wall_start)
+        iterations = results.iterations
+
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        "wall_ms": statistics.median(wall) / iterations * 1000,
+        "cpu_ms": statistics.median(cpu) / iterations * 1000,
+        "peak_kib": peak / 1024,
+    }
+
+
+def compare(measured: dict[str, dict], baseline: dict[str, dict], threshold: float) -> list[str]:
+    regressions = []
+    for key, metrics in measured.items():
+        for metric in COMPARED_METRICS:
+            before = baseline.get(key, {}).get(metric)
+            if before and metrics[metric] > before * (1 + threshold):
+                regressions.append(f"{key} {metric}: {before:.3f} -> {metrics[metric]:.3f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tools", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--history", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--fan-out", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per scenario, the median is reported")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated model latency in seconds")
+    parser.add_argument("--save", help="write the results to a baseline file")
+    parser.add_argument("--compare", help="baseline file to check the results against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed growth over the baseline")
+    args = parser.parse_args()
+
+    measured: dict[str, dict] = {}
+    with StubChatCompletionServer(latency=args.latency) as server:
+        print(f"{'scenario':>16} {'n':>6} {'wall ms/iter':>13} {'cpu ms/iter':>12} {'peak KiB':>10}")
+        for name, n, options, history, fan_out in scenarios(args):
+            metrics = measured[f"{name}:{n}"] = measure(server, options, history, fan_out, args.repeat)
+            print(
+                f"{name:>16} {n:>6} {metrics['wall_ms']:>13.3f} {metrics['cpu_ms']:>12.3f} {metrics['peak_kib']:>10.0f}"
+            )
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(measured, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(measured, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+"""
+Throughput of BaseBotClient.run_many against a local stub endpoint as concurrency grows.
+
+    python -m benchmarks.bench_run_many [--prompts 200] [--latency 0.05]
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from ai_tool_lib import BasicTool, PropertyDefinition, ToolUserResponse, get_bot_client
+from benchmarks.stub_server import StubChatCompletionServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prompts", type=int, default=200, help="number of prompts per run")
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated model latency in seconds")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    args = parser.parse_args()
+
+    with StubChatCompletionServer(latency=args.latency) as server:
+        client = get_bot_client(
+            "openai",
+            api_key="_",
+            base_url=server.url,
+            model="stub",
+            tools=[
+                BasicTool(
+                    "done",
+                    "Respond to the user.",
+                    properties=[PropertyDefinition(name="message", type=str, description="Your response to the user.")],
+                    execute=lambda message: ToolUserResponse(data={"message": message}),
+                )
+            ],
+        )
+        prompts = [f"prompt {i}" for i in range(args.prompts)]
+        print(f"{'concurrency':>11} {'seconds':>9} {'runs/s':>9} {'errors':>7}")
+        for concurrency in args.concurrency:
+            start = time.perf_counter()
+            errors = sum(1 for item in client.run_many(prompts, concurrency=concurrency) if item.error)
+            elapsed = time.perf_counter() - start
+            print(f"{concurrency:>11} {elapsed:>9.2f} {len(prompts) / elapsed:>9.1f} {errors:>7}")
+
+
+if __name__ == "__main__":
+    main()
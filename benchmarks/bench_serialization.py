@@ -0,0 +1,66 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+"""
+Cost of serializing the message history for one chat completion request as the session grows.
+New messages are serialized once and earlier ones are reused, so the cached cost only grows
+by a pointer lookup per message while the uncached cost grows by a full model dump per message.
+
+    python -m benchmarks.bench_serialization [--iterations 50]
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from ai_tool_lib.bot.client.openai import OpenAIBotClient
+from ai_tool_lib.bot.message import BotMessage, BotMessageRole, BotToolMessage
+
+
+def iteration_messages(i: int) -> list[BotMessage]:
+    call_id = f"call_{i}"
+    return [
+        BotMessage(
+            role=BotMessageRole.BOT,
+            content=None,
+            tool_calls=[BotToolMessage(id=call_id, name="search", args=f'{{"query": "example query {i}"}}')],
+        ),
+        BotMessage(role=BotMessageRole.TOOL, content="result " * 50, tool_call_id=call_id),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--iterations", type=int, default=50, help="iterations timed per history size")
+    args = parser.parse_args()
+
+    client = OpenAIBotClient(api_key="_", base_url="http://127.0.0.1:1", tools=[])
+    print(f"{'history':>8} {'cached us/iter':>15} {'uncached us/iter':>17}")
+    for history in args.history:
+        messages = [BotMessage(role=BotMessageRole.USER, content="hello")]
+        for i in range(history // 2):
+            messages.extend(iteration_messages(i))
+        # warm the cache as earlier iterations would have
+        for m in messages:
+            m.wire("openai", client._chat_completion_from_bot_message)
+
+        start = time.perf_counter()
+        for i in range(args.iterations):
+            batch = iteration_messages(history + i)
+            [m.wire("openai", client._chat_completion_from_bot_message) for m in (*messages, *batch)]
+        cached = (time.perf_counter() - start) / args.iterations
+
+        start = time.perf_counter()
+        for i in range(args.iterations):
+            batch = iteration_messages(history + i)
+            [client._chat_completion_from_bot_message(m) for m in (*messages, *batch)]
+        uncached = (time.perf_counter() - start) / args.iterations
+
+        print(f"{history:>8} {cached * 1e6:>15.1f} {uncached * 1e6:>17.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+"""
+Cost of saving one iteration and loading a long session, rewriting the whole session
+as a JSON blob compared to appending to a SQLiteBotSessionStore.
+
+    python -m benchmarks.bench_session_store [--messages 10000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import pathlib
+import tempfile
+import time
+
+from ai_tool_lib.bot.message import BotMessage, BotMessageRole, BotToolMessage
+from ai_tool_lib.bot.session import BotSession
+from ai_tool_lib.bot.session_store import SQLiteBotSessionStore
+
+
+def iteration_messages(i: int) -> list[BotMessage]:
+    call_id = f"call_{i}"
+    return [
+        BotMessage(
+            role=BotMessageRole.BOT,
+            content=None,
+            tool_calls=[BotToolMessage(id=call_id, name="search", args=f'{{"query": "example query {i}"}}')],
+        ),
+        BotMessage(role=BotMessageRole.TOOL, content="result " * 50, tool_call_id=call_id),
+    ]
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--last", type=int, default=50, help="messages loaded by the partial load")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteBotSessionStore(pathlib.Path(tmp) / "sessions.db")
+        blob_path = pathlib.Path(tmp) / "session.json"
+        print(
+            f"{'messages':>9} {'blob save ms':>13} {'append ms':>10} "
+            f"{'blob load ms':>13} {'load ms':>8} {'load last ms':>13}"
+        )
+        for count in args.messages:
+            session = BotSession.new()
+            session.messages = [m for i in range(count // 2) for m in iteration_messages(i)]
+            store.save(session)
+            blob_path.write_text(session.model_dump_json())
+
+            session.messages += iteration_messages(count)
+            blob_save = timed(lambda s=session: blob_path.write_text(s.model_dump_json()))
+            append = timed(lambda s=session: store.save(s))
+            blob_load = timed(lambda: BotSession.model_validate_json(blob_path.read_text()))
+            load = timed(lambda uid=session.uid: store.load(uid))
+            load_last = timed(lambda uid=session.uid: store.load(uid, last=args.last))
+            print(f"{count:>9} {blob_save:>13.2f} {append:>10.2f} {blob_load:>13.2f} {load:>8.2f} {load_last:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+from __future__ import annotations
+
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Self
+
+ScriptResponse = dict[str, Any]
+"""
+Scripted response, {"content": str | None, "tool_calls": [(name, args), ...], "usage": (prompt, completion)},
+or an error response, {"status": int, "headers": {name: value}}.
+"""
+
+
+def done_script(_request: dict) -> ScriptResponse:
+    """Default script, immediately answers the user with the 'done' tool."""
+    return {"tool_calls": [("done", {"message": "ok"})]}
+
+
+def echo_script(request: dict) -> ScriptResponse:
+    """Answers the user with their latest prompt using the 'done' tool."""
+    prompt = next(m["content"] for m in reversed(request["messages"]) if m["role"] == "user")
+    return {"tool_calls": [("done", {"message": prompt})]}
+
+
+class StubChatCompletionServer:
+    """
+    In-process OpenAI compatible chat completions endpoint with scripted responses,
+    used to run the bot without a live model.
+    """
+
+    def __init__(
+        self,
+        script: Callable[[dict], ScriptResponse] = done_script,
+        latency: float | Callable[[], float] = 0.0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        """
+        :param script: Called with each request body, returns the response to send.
+        :param latency: Seconds to wait before responding, or a callable returning it.
+        :param host: Host to bind to.
+        :param port: Port to bind to, 0 picks a free port.
+
+        Set healthy to False to answer every request, and model listings, with 503 errors.
+        """
+        self.script = script
+        self.latency = latency
+        self.request_count = 0
+        self.healthy = True
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        if isinstance(host, bytes):
+            host = host.decode()
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> Self:
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> Self:
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _respond(self, request: dict) -> tuple[ScriptResponse, list[dict]]:
+        with self._lock:
+            self.request_count += 1
+        latency = self.latency() if callable(self.latency) else self.latency
+        if latency:
+            time.sleep(latency)
+        response = self.script(request)
+        tool_calls = [
+            {
+                "id": f"call_{next(self._ids)}",
+                "type": "function",
+                "function": {"name": name, "arguments": json.dumps(args)},
+            }
+            for name, args in response.get("tool_calls", [])
+        ]
+        return response, tool_calls
+
+    def _completion(self, request: dict, response: ScriptResponse, tool_calls: list[dict]) -> dict:
+        prompt_tokens, completion_tokens = response.get("usage", (10, 5))
+        return {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "tool_calls" if tool_calls else "stop",
+                    "message": {
+                        "role": "assistant",
+                        "content": response.get("content"),
+                        "tool_calls": tool_calls or None,
+                    },
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def _chunks(self, request: dict, response: ScriptResponse, tool_calls: list[dict]) -> list[dict]:
+        prompt_tokens, completion_tokens = response.get("usage", (10, 5))
+        base = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time())}
+        base["model"] = request.get("model", "stub")
+        chunks = []
+        if response.get("content"):
+            chunks.append({**base, "choices": [{"index": 0, "delta": {"content": response["content"]}}]})
+        for i, call in enumerate(tool_calls):
+            head = {"index": i, "id": call["id"], "type": "function", "function": {"name": call["function"]["name"]}}
+            chunks.append({**base, "choices": [{"index": 0, "delta": {"tool_calls": [head]}}]})
+            args = call["function"]["arguments"]
+            for j in range(0, len(args), 16):
+                part = {"index": i, "function": {"arguments": args[j : j + 16]}}
+                chunks.append({**base, "choices": [{"index": 0, "delta": {"tool_calls": [part]}}]})
+        finish_reason = "tool_calls" if tool_calls else "stop"
+        chunks.append({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}]})
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        chunks.append({**base, "choices": [], "usage": usage})
+        return chunks
+
+    def _handler_class(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if not server.healthy:
+                    self._send_error({"status": 503})
+                    return
+                models = [{"id": "stub", "object": "model", "owned_by": "stub"}]
+                body = json.dumps({"object": "list", "data": models})
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body.encode())
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                if not server.healthy:
+                    self._send_error({"status": 503})
+                    return
+                response, tool_calls = server._respond(request)
+                if response.get("status"):
+                    self._send_error(response)
+                    return
+                if request.get("stream"):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    for chunk in server._chunks(request, response, tool_calls):
+                        self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self._write_chunk(b"data: [DONE]\n\n")
+                    self.wfile.write(b"0\r\n\r\n")
+                    return
+                body = json.dumps(server._completion(request, response, tool_calls)).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_error(self, response: ScriptResponse):
+                body = json.dumps({"error": {"message": "scripted error", "type": "stub_error"}}).encode()
+                self.send_response(response["status"])
+                for name, value in response.get("headers", {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _write_chunk(self, data: bytes):
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
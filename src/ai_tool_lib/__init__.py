@@ -3,23 +3,55 @@
 # SPDX-License-Identifier: MIT
 from __future__ import annotations
 
-from ai_tool_lib.bot.client import get_bot_client as _get_bot_client
-from ai_tool_lib.bot.results import BotResults as _BotResults
-from ai_tool_lib.bot.session import BotSession as _BotSession
-from ai_tool_lib.bot.tool.base_tool import BaseTool as _BaseTool
-from ai_tool_lib.bot.tool.basic_tool import BasicTool as _BasicTool
-from ai_tool_lib.bot.tool.property import PropertyDefinition as _PropertyDefinition
-from ai_tool_lib.bot.tool.response import ToolBotResponse as _ToolBotResponse
-from ai_tool_lib.bot.tool.response import ToolResponse as _ToolResponse
-from ai_tool_lib.bot.tool.response import ToolUserResponse as _ToolUserResponse
-
-get_bot_client = _get_bot_client
-BotSession = _BotSession
-BotResults = _BotResults
-BaseTool = _BaseTool
-Tool = _BaseTool
-BasicTool = _BasicTool
-PropertyDefinition = _PropertyDefinition
-ToolBotResponse = _ToolBotResponse
-ToolUserResponse = _ToolUserResponse
-ToolResponse = _ToolResponse
+import importlib
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from ai_tool_lib.bot.client import get_bot_client
+    from ai_tool_lib.bot.results import BotResults
+    from ai_tool_lib.bot.session import BotSession
+    from ai_tool_lib.bot.tool.base_tool import BaseTool
+    from ai_tool_lib.bot.tool.base_tool import BaseTool as Tool
+    from ai_tool_lib.bot.tool.basic_tool import BasicTool
+    from ai_tool_lib.bot.tool.property import PropertyDefinition
+    from ai_tool_lib.bot.tool.response import ToolBotResponse, ToolResponse, ToolUserResponse
+
+# exports are imported on first use so importing the package stays fast
+_EXPORTS = {
+    "get_bot_client": ("ai_tool_lib.bot.client", "get_bot_client"),
+    "BotSession": ("ai_tool_lib.bot.session", "BotSession"),
+    "BotResults": ("ai_tool_lib.bot.results", "BotResults"),
+    "BaseTool": ("ai_tool_lib.bot.tool.base_tool", "BaseTool"),
+    "Tool": ("ai_tool_lib.bot.tool.base_tool", "BaseTool"),
+    "BasicTool": ("ai_tool_lib.bot.tool.basic_tool", "BasicTool"),
+    "PropertyDefinition": ("ai_tool_lib.bot.tool.property", "PropertyDefinition"),
+    "ToolBotResponse": ("ai_tool_lib.bot.tool.response", "ToolBotResponse"),
+    "ToolUserResponse": ("ai_tool_lib.bot.tool.response", "ToolUserResponse"),
+    "ToolResponse": ("ai_tool_lib.bot.tool.response", "ToolResponse"),
+}
+
+__all__ = [
+    "BaseTool",
+    "BasicTool",
+    "BotResults",
+    "BotSession",
+    "PropertyDefinition",
+    "Tool",
+    "ToolBotResponse",
+    "ToolResponse",
+    "ToolUserResponse",
+    "get_bot_client",
+]
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _EXPORTS:
+        err_msg = f"module {__name__!r} has no attribute {name!r}"
+        raise AttributeError(err_msg)
+    module, attr = _EXPORTS[name]
+    value = globals()[name] = getattr(importlib.import_module(module), attr)
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted([*globals(), *_EXPORTS])
@@ -0,0 +1,67 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from ai_tool_lib.bot.results import BotBatchItem, BotResults
+
+if TYPE_CHECKING:
+    import os
+
+
+class BatchCheckpoint:
+    """
+    Append-only JSON lines file recording the completed items of a batch run,
+    used to resume an interrupted batch without running those prompts again.
+    """
+
+    def __init__(self, path: str | os.PathLike):
+        """
+        :param path: Path of the checkpoint file, created if it does not exist.
+        """
+        self.path = Path(path)
+        self.completed = self._load()
+
+    def get(self, index: int, prompt: str) -> BotBatchItem | None:
+        """
+        Get a completed item, only if it was recorded for the same prompt.
+        :param index: Position of the prompt in the batch.
+        :param prompt: The user's prompt for the bot.
+        """
+        item = self.completed.get(index)
+        return item if item and item.prompt == prompt else None
+
+    def write(self, item: BotBatchItem):
+        """
+        Record a completed item.
+        :param item: The batch item, only successful items are recorded.
+        """
+        if not item.results:
+            return
+        line = json.dumps({"index": item.index, "prompt": item.prompt, "results": item.results.model_dump(mode="json")})
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def _load(self) -> dict[int, BotBatchItem]:
+        out: dict[int, BotBatchItem] = {}
+        if not self.path.exists():
+            return out
+        with self.path.open(encoding="utf-8") as f:
+            for line in f:
+                try:
+                    data = json.loads(line)
+                except ValueError:
+                    # partial line left by an interrupted write
+                    continue
+                out[data["index"]] = BotBatchItem(
+                    index=data["index"],
+                    prompt=data["prompt"],
+                    results=BotResults.model_validate(data["results"]),
+                    from_checkpoint=True,
+                )
+        return out
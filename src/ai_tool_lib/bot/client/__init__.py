@@ -1,14 +1,106 @@
 from __future__ import annotations
 
-from ai_tool_lib.bot.client.openai import OpenAIBotClient
+import importlib
+import threading
+from typing import TYPE_CHECKING, Any, Iterator
+
 from ai_tool_lib.error.bot import BotClientNotFoundError
 
-AVAILABLE_CLIENTS = [OpenAIBotClient]
+if TYPE_CHECKING:
+    from ai_tool_lib.bot.client.base import BaseBotClient
+
+ENTRY_POINT_GROUP = "ai_tool_lib.clients"
+""" Entry point group third party packages register bot clients in, e.g. `myclient = "my_pkg.client:MyBotClient"`. """
+
+BUILTIN_CLIENTS = {
+    "openai": "ai_tool_lib.bot.client.openai:OpenAIBotClient",
+    "openai_async": "ai_tool_lib.bot.client.openai:AsyncOpenAIBotClient",
+    "replay": "ai_tool_lib.bot.client.replay:ReplayBotClient",
+}
+
+_LAZY_ATTRIBUTES = {
+    "OpenAIBotClient": "ai_tool_lib.bot.client.openai",
+    "AsyncOpenAIBotClient": "ai_tool_lib.bot.client.openai",
+    "ReplayBotClient": "ai_tool_lib.bot.client.replay",
+}
+
+
+class BotClientRegistry:
+    """
+    Bot client classes by name. Clients are only imported when they are asked for, so importing
+    the library does not import the SDKs of clients that are never used.
+    """
+
+    def __init__(self, clients: dict[str, str] | None = None):
+        """
+        :param clients: Client names and their "module:class" import paths.
+        """
+        self._targets: dict[str, str | type[BaseBotClient]] = dict(clients or {})
+        self._entry_points_loaded = False
+        self._lock = threading.Lock()
+
+    def register(self, name: str, client: str | type[BaseBotClient]):
+        """
+        Register a bot client, replacing any client of the same name.
+        :param name: Name passed to get_bot_client.
+        :param client: The client class, or its "module:class" import path to import it on first use.
+        """
+        with self._lock:
+            self._targets[name] = client
+
+    def get(self, name: str) -> type[BaseBotClient]:
+        """
+        Get a bot client class, importing it if needed.
+        :param name: The client name.
+        """
+        if name not in self._targets:
+            self._load_entry_points()
+        with self._lock:
+            target = self._targets.get(name)
+            if target is None:
+                err_msg = f"bot client {name} was not found"
+                raise BotClientNotFoundError(err_msg)
+            if isinstance(target, str):
+                module, _, attr = target.partition(":")
+                target = self._targets[name] = getattr(importlib.import_module(module), attr)
+            return target
+
+    def names(self) -> list[str]:
+        """Names of every available client, without importing them."""
+        self._load_entry_points()
+        return sorted(self._targets)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.names()
+
+    def __iter__(self) -> Iterator[type[BaseBotClient]]:
+        # imports every client
+        return iter([self.get(name) for name in self.names()])
+
+    def _load_entry_points(self):
+        if self._entry_points_loaded:
+            return
+        # importing importlib.metadata alone takes longer than the rest of the library
+        from importlib.metadata import entry_points  # noqa: PLC0415
+
+        with self._lock:
+            for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+                # clients registered in code take precedence over installed packages
+                self._targets.setdefault(entry_point.name, entry_point.value)
+            self._entry_points_loaded = True
+
+
+AVAILABLE_CLIENTS = BotClientRegistry(BUILTIN_CLIENTS)
 
 
 def get_bot_client(name: str, **kwargs):
-    for client_class in AVAILABLE_CLIENTS:
-        if client_class.name() == name:
-            return client_class(**kwargs)
-    err_msg = f"bot client {name} was not found"
-    raise BotClientNotFoundError(err_msg)
+    return AVAILABLE_CLIENTS.get(name)(**kwargs)
+
+
+def __getattr__(name: str) -> Any:
+    # client classes used to be imported here, keep them importable from this module without importing them eagerly
+    module = _LAZY_ATTRIBUTES.get(name)
+    if module is None:
+        err_msg = f"module {__name__!r} has no attribute {name!r}"
+        raise AttributeError(err_msg)
+    return getattr(importlib.import_module(module), name)
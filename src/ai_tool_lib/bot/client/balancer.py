@@ -0,0 +1,396 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import random
+import threading
+import time
+from enum import StrEnum
+from typing import Any, Callable, Iterable
+
+import openai
+from pydantic import BaseModel
+
+from ai_tool_lib.bot.client.transport import OpenAITransport, TransportStats
+
+
+class BalancingStrategy(StrEnum):
+    """How the balancer picks an endpoint for a request."""
+
+    LEAST_OUTSTANDING = "least_outstanding"
+    """ The endpoint with the fewest requests in flight. """
+
+    EWMA = "ewma"
+    """ The endpoint with the lowest moving average latency, weighted by its requests in flight. """
+
+
+class EndpointState(StrEnum):
+    """Circuit breaker state of an endpoint."""
+
+    HEALTHY = "healthy"
+    """ The endpoint receives requests. """
+
+    EJECTED = "ejected"
+    """ The endpoint failed too often and receives no requests until its ejection time is up. """
+
+    HALF_OPEN = "half_open"
+    """ The ejection time is up, one trial request at a time is sent until one succeeds or fails. """
+
+
+class EndpointStats(BaseModel):
+    """Statistics of a balanced endpoint."""
+
+    url: str
+    """ Base URL of the endpoint. """
+
+    healthy: bool = True
+    """ Whether the endpoint receives requests, False while it is ejected or half open. """
+
+    state: EndpointState = EndpointState.HEALTHY
+    """ Circuit breaker state of the endpoint. """
+
+    outstanding: int = 0
+    """ Number of requests in flight. """
+
+    requests: int = 0
+    """ Number of requests routed to the endpoint. """
+
+    failures: int = 0
+    """ Number of requests that failed with connection or server errors. """
+
+    consecutive_failures: int = 0
+    """ Number of failures since the last successful request or probe. """
+
+    ejections: int = 0
+    """ Number of times the circuit breaker ejected the endpoint. """
+
+    ewma_latency: float = 0.0
+    """ Moving average of request latency in seconds. """
+
+    last_error: str | None = None
+    """ The latest failure. """
+
+    transport: TransportStats | None = None
+    """ Connection pool statistics of the endpoint. """
+
+
+class Endpoint:
+    """An endpoint's transport and its balancing state."""
+
+    def __init__(self, transport: OpenAITransport):
+        self.transport = transport
+        self.url = str(transport.base_url)
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.trial_in_flight = False
+        self.ewma_latency = 0.0
+        self.last_error: str | None = None
+
+    def state(self, now: float) -> EndpointState:
+        """Circuit breaker state of the endpoint."""
+        if not self.ejected_until:
+            return EndpointState.HEALTHY
+        return EndpointState.EJECTED if now < self.ejected_until else EndpointState.HALF_OPEN
+
+    def available(self, now: float) -> bool:
+        """Whether the endpoint may receive a request, a half open one only while no trial request is in flight."""
+        state = self.state(now)
+        return state == EndpointState.HEALTHY or (state == EndpointState.HALF_OPEN and not self.trial_in_flight)
+
+
+class EndpointLease:
+    """An endpoint chosen for one request, release it once the request is finished."""
+
+    def __init__(
+        self,
+        endpoint: Endpoint,
+        on_release: Callable[[EndpointLease, BaseException | None], None],
+        *,
+        trial: bool = False,
+    ):
+        """
+        :param endpoint: The endpoint.
+        :param on_release: Called with the lease and the request's error once the request is finished.
+        :param trial: Whether the request is the trial request of a half open endpoint.
+        """
+        self.endpoint = endpoint
+        self.on_release = on_release
+        self.trial = trial
+        self.start = time.perf_counter()
+        self.latency: float | None = None
+        self._released = False
+
+    def responded(self):
+        """Record the latency now rather than on release, for streams whose body takes longer than the response."""
+        if self.latency is None:
+            self.latency = time.perf_counter() - self.start
+
+    def release(self, error: BaseException | None = None):
+        """
+        Report the outcome of the request, only the first call counts.
+        :param error: The error the request failed with, if any.
+        """
+        if not self._released:
+            self._released = True
+            self.on_release(self, error)
+
+
+class EndpointBalancer:
+    """
+    Routes chat completions across several OpenAI compatible endpoints serving the same models. Endpoints
+    that keep failing are ejected by a circuit breaker and brought back by periodic probes, or given a
+    trial request once their ejection time is up. Share one balancer between bot clients so they all see
+    the same load and health.
+    """
+
+    def __init__(
+        self,
+        endpoints: Iterable[str | OpenAITransport],
+        api_key: str = "",
+        *,
+        strategy: BalancingStrategy | str = BalancingStrategy.LEAST_OUTSTANDING,
+        sticky: bool = False,
+        failure_threshold: int = 3,
+        ejection_time: float = 30.0,
+        probe_interval: float | None = 5.0,
+        probe_timeout: float = 2.0,
+        ewma_decay: float = 0.3,
+        is_failure: Callable[[BaseException], bool] | None = None,
+        logger: logging.Logger | None = None,
+        seed: int | None = None,
+    ):
+        """
+        :param endpoints: Base URLs of the endpoints, or their transports. Transports created for URLs do not retry
+            on their own, use the client's retry policy so retries go to another endpoint.
+        :param api_key: API key for endpoints given as URLs.
+        :param strategy: How to pick an endpoint, see BalancingStrategy.
+        :param sticky: Send every request of a session to the same endpoint while it is healthy, so server side
+            prefix caches stay warm. Sessions are spread with rendezvous hashing, so an ejected endpoint only moves
+            its own sessions and every process agrees on the mapping.
+        :param failure_threshold: Consecutive failures that eject an endpoint.
+        :param ejection_time: Seconds an ejected endpoint is left alone before it gets a trial request.
+        :param probe_interval: Seconds between probes of ejected endpoints, which list their models. None to only
+            rely on trial requests.
+        :param probe_timeout: Timeout of a probe in seconds.
+        :param ewma_decay: Weight of the latest latency in the moving average, from 0 to 1.
+        :param is_failure: Whether a request error counts against the endpoint, defaults to connection errors,
+            timeouts and server errors.
+        :param logger: Optional logger.
+        :param seed: Seed for breaking ties, for reproducible routing.
+        """
+        self.endpoints = [
+            Endpoint(
+                e if isinstance(e, OpenAITransport) else OpenAITransport(api_key=api_key, base_url=e, max_retries=0)
+            )
+            for e in endpoints
+        ]
+        if not self.endpoints:
+            err_msg = "endpoint balancer requires at least one endpoint"
+            raise ValueError(err_msg)
+        self.strategy = BalancingStrategy(strategy)
+        self.sticky = sticky
+        self.failure_threshold = failure_threshold
+        self.ejection_time = ejection_time
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.ewma_decay = ewma_decay
+        self.is_failure = is_failure or is_endpoint_failure
+        self.logger = logger
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._prober: threading.Thread | None = None
+
+    def acquire(self, key: str | None = None) -> EndpointLease:
+        """
+        Choose an endpoint for a request. If every endpoint is ejected the one due back first is used.
+        :param key: Identifies the session the request belongs to, for sticky routing.
+        """
+        now = time.monotonic()
+        with self._lock:
+            candidates = [e for e in self.endpoints if e.available(now)]
+            if not candidates:
+                candidates = [min(self.endpoints, key=lambda e: e.ejected_until)]
+            if self.sticky and key is not None:
+                endpoint = max(candidates, key=lambda e: _rendezvous_weight(key, e.url))
+            else:
+                scores = [self._score(e) for e in candidates]
+                best = min(scores)
+                endpoint = self._random.choice([e for e, s in zip(candidates, scores) if s == best])
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            trial = endpoint.state(now) == EndpointState.HALF_OPEN and not endpoint.trial_in_flight
+            if trial:
+                endpoint.trial_in_flight = True
+        return EndpointLease(endpoint, self._release, trial=trial)
+
+    def stats(self) -> list[EndpointStats]:
+        """Current statistics of every endpoint."""
+        now = time.monotonic()
+        with self._lock:
+            stats = [
+                EndpointStats(
+                    url=e.url,
+                    healthy=e.state(now) == EndpointState.HEALTHY,
+                    state=e.state(now),
+                    outstanding=e.outstanding,
+                    requests=e.requests,
+                    failures=e.failures,
+                    consecutive_failures=e.consecutive_failures,
+                    ejections=e.ejections,
+                    ewma_latency=e.ewma_latency,
+                    last_error=e.last_error,
+                )
+                for e in self.endpoints
+            ]
+        for stat, endpoint in zip(stats, self.endpoints):
+            stat.transport = endpoint.transport.stats()
+        return stats
+
+    def probe(self):
+        """Probe every ejected endpoint now, endpoints that respond are brought back."""
+        now = time.monotonic()
+        with self._lock:
+            ejected = [e for e in self.endpoints if e.state(now) != EndpointState.HEALTHY]
+        for endpoint in ejected:
+            try:
+                endpoint.transport.client.with_options(timeout=self.probe_timeout, max_retries=0).models.list()
+            except Exception as e:  # noqa: BLE001
+                self._log("Endpoint probe failed.", level=logging.DEBUG, endpoint=endpoint.url, error=str(e))
+                continue
+            with self._lock:
+                endpoint.consecutive_failures = 0
+                endpoint.ejected_until = 0.0
+            self._log("Endpoint restored.", endpoint=endpoint.url)
+
+    def close(self):
+        """Stop probing and close the endpoints' transports."""
+        self._stop.set()
+        for endpoint in self.endpoints:
+            endpoint.transport.close()
+
+    def _score(self, endpoint: Endpoint) -> float:
+        if self.strategy == BalancingStrategy.EWMA:
+            # endpoints without a measured latency yet score zero so they are tried
+            return endpoint.ewma_latency * (endpoint.outstanding + 1)
+        return endpoint.outstanding
+
+    def _release(self, lease: EndpointLease, error: BaseException | None):
+        endpoint = lease.endpoint
+        latency = lease.latency if lease.latency is not None else time.perf_counter() - lease.start
+        failed = error is not None and self.is_failure(error)
+        ejected = restored = False
+        with self._lock:
+            endpoint.outstanding -= 1
+            if lease.trial:
+                endpoint.trial_in_flight = False
+            # a request cancelled or refused for reasons of its own says nothing about the endpoint's latency
+            if error is None or failed:
+                endpoint.ewma_latency = (
+                    latency
+                    if not endpoint.ewma_latency
+                    else self.ewma_decay * latency + (1 - self.ewma_decay) * endpoint.ewma_latency
+                )
+            if error is None:
+                endpoint.consecutive_failures = 0
+                restored = bool(endpoint.ejected_until)
+                endpoint.ejected_until = 0.0
+            elif failed:
+                endpoint.failures += 1
+                endpoint.consecutive_failures += 1
+                endpoint.last_error = f"{error.__class__.__name__}: {error}"
+                # a failed trial request ejects the endpoint again right away
+                if endpoint.consecutive_failures >= self.failure_threshold or lease.trial:
+                    endpoint.ejected_until = time.monotonic() + self.ejection_time
+                    endpoint.ejections += 1
+                    ejected = True
+        if ejected:
+            self._log(
+                "Endpoint ejected.",
+                level=logging.WARNING,
+                endpoint=endpoint.url,
+                consecutive_failures=endpoint.consecutive_failures,
+                error=endpoint.last_error,
+            )
+            self._start_prober()
+        elif restored:
+            self._log("Endpoint restored.", endpoint=endpoint.url)
+
+    def _start_prober(self):
+        if self.probe_interval is None or self._prober is not None:
+            return
+        with self._lock:
+            if self._prober is None:
+                self._prober = threading.Thread(target=self._probe_loop, name="ai_tool_lib_probe", daemon=True)
+                self._prober.start()
+
+    def _probe_loop(self):
+        while not self._stop.wait(self.probe_interval):
+            self.probe()
+
+    def _log(self, message: str, level: int = logging.INFO, **kwargs):
+        if self.logger:
+            self.logger.log(level, message, extra={"_module": "balancer", **kwargs})
+
+
+class BalancedStream:
+    """Wraps a chat completion stream to release its endpoint once the stream is closed."""
+
+    def __init__(self, stream: Any, lease: EndpointLease):
+        self.stream = stream
+        self.lease = lease
+
+    def __iter__(self) -> Any:
+        return iter(self.stream)
+
+    def __aiter__(self) -> Any:
+        return self.stream.__aiter__()
+
+    def __enter__(self) -> Any:
+        return self.stream.__enter__()
+
+    def __exit__(self, *args) -> Any:
+        try:
+            return self.stream.__exit__(*args)
+        finally:
+            self.lease.release(args[1])
+
+    def close(self):
+        try:
+            self.stream.close()
+        finally:
+            self.lease.release()
+
+    async def aclose(self):
+        try:
+            await self.stream.close()
+        finally:
+            self.lease.release()
+
+    async def __aenter__(self) -> Any:
+        return await self.stream.__aenter__()
+
+    async def __aexit__(self, *args) -> Any:
+        try:
+            return await self.stream.__aexit__(*args)
+        finally:
+            self.lease.release(args[1])
+
+
+def is_endpoint_failure(e: BaseException) -> bool:
+    """Whether a request error means the endpoint is unhealthy, connection errors, timeouts and server errors."""
+    if isinstance(e, openai.APIConnectionError):
+        return True
+    return isinstance(e, openai.APIStatusError) and e.status_code >= 500  # noqa: PLR2004
+
+
+def _rendezvous_weight(key: str, url: str) -> int:
+    return int.from_bytes(hashlib.blake2b(f"{key}|{url}".encode(), digest_size=8).digest(), "big")
@@ -4,19 +4,58 @@
 
 from __future__ import annotations
 
+import asyncio
 import logging
+import threading
+import time
 from abc import abstractmethod
-from typing import TYPE_CHECKING, Callable, Iterable
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    ContextManager,
+    Generator,
+    Iterable,
+    Iterator,
+    TypeVar,
+)
 
+from ai_tool_lib.bot.batch import BatchCheckpoint
+from ai_tool_lib.bot.event import BotIterationEvent, BotResponseEvent
 from ai_tool_lib.bot.message import BotMessage, BotMessageRole
-from ai_tool_lib.bot.results import BotResults
+from ai_tool_lib.bot.metrics import BotSpanKind, record_span
+from ai_tool_lib.bot.results import BotBatchItem, BotResults
 from ai_tool_lib.bot.session import BotSession
+from ai_tool_lib.bot.tokens import HeuristicTokenEstimator
+from ai_tool_lib.bot.tool.cache import ToolResultCache
+from ai_tool_lib.bot.tool.dispatcher import ToolCallDispatcher
 from ai_tool_lib.bot.tool.handler import ToolHandler
+from ai_tool_lib.bot.tool.registry import ToolRegistry
 from ai_tool_lib.bot.tool.response import ToolUserResponse
-from ai_tool_lib.error.bot import BotIterationLimitError, BotTokenLimitError, MalformedBotResponseError
+from ai_tool_lib.error.bot import (
+    BotDeadlineError,
+    BotError,
+    BotIterationLimitError,
+    BotTokenLimitError,
+    MalformedBotResponseError,
+)
 
 if TYPE_CHECKING:
+    import os
+
+    from ai_tool_lib.bot.compaction import BaseCompactor
+    from ai_tool_lib.bot.event import BotEvent
+    from ai_tool_lib.bot.metrics import BaseMetricsHook, BotSpan
+    from ai_tool_lib.bot.ratelimit import HedgePolicy, RateLimiter, RetryPolicy
+    from ai_tool_lib.bot.session_store import BotSessionStore
+    from ai_tool_lib.bot.tokens import BaseTokenEstimator, TokenLimitHook
     from ai_tool_lib.bot.tool.base_tool import BaseTool
+    from ai_tool_lib.bot.tool.execution import BaseExecutionPolicy
 
 DEFAULT_SYSTEM_PROMPT = """
 You are a helpful assistant with access to tools which can help you assist the user.
@@ -26,30 +65,76 @@ DEFAULT_ITERATION_LIMIT_PROMPT = """
 It is now time to respond to the user. If you were unable to complete the task then let the user know why.
 """
 
+TOOL_HANDLER_CACHE_SIZE = 32
+""" Number of distinct tool sets to keep tool handlers for when tools is a callable. """
+
+T = TypeVar("T")
+
 
 class BaseBotClient:
     def __init__(
         self,
-        tools: Iterable[BaseTool] | Callable[[BotResults], Iterable[BaseTool]],
+        tools: Iterable[BaseTool] | ToolRegistry | Callable[[BotResults], Iterable[BaseTool]],
         logger: logging.Logger | None = None,
         system_prompt: str = DEFAULT_SYSTEM_PROMPT,
         session_token_limit: int = 64000,
         iteration_limit: int = 5,
         iteration_limit_prompt: str | None = DEFAULT_ITERATION_LIMIT_PROMPT,
         error_retry_limit: int = 3,
+        *,
+        parallel_tool_calls: bool = False,
+        max_tool_workers: int | None = None,
+        tool_executor: Executor | None = None,
+        tool_cache: ToolResultCache | None = None,
+        tool_execution_policy: BaseExecutionPolicy | None = None,
+        request_token_limit: int = 0,
+        token_estimator: BaseTokenEstimator | None = None,
+        on_token_limit: TokenLimitHook | None = None,
+        compactor: BaseCompactor | None = None,
+        session_store: BotSessionStore | None = None,
+        rate_limiter: RateLimiter | None = None,
+        retry_policy: RetryPolicy | None = None,
+        hedge_policy: HedgePolicy | None = None,
+        metrics: BaseMetricsHook | None = None,
+        latency_budget: float | None = None,
+        final_answer_reserve: float | None = None,
     ):
         """
         Client used to interact with AI LLM bot.
-        :param tools: The tools the bot can use, must provide at least one. It can be a callable that is passed BotResults every iteration.
+        :param tools: The tools the bot can use, must provide at least one. It can be a ToolRegistry, or a callable that is passed BotResults every iteration, such as a ToolIndex that offers only the most relevant tools.
         :param logger: Optional logger.
         :param system_prompt: The system prompt which gives the bot instructions on how to handle the user's prompt.
         :param session_token_limit: Number of input tokens allowed in a session.
         :param iteration_limit: Number of iterations allowed in a single run.
         :param iteration_limit_prompt: Message to send to the bot on the last iteration.
         :param error_retry_limit: Number of retries the bot is allowed when it provides an errorneous response.
+        :param parallel_tool_calls: Execute multiple tool calls from a single response concurrently. Tools that are not thread safe still run one at a time, in order. Once a call gives a user response the calls after it are not recorded and those not started yet are cancelled, but thread safe calls may already be running or finished. Mark tools with side effects that must not happen after a user response as not thread safe.
+        :param max_tool_workers: Size of the thread pool used to execute tools, defaults to the ThreadPoolExecutor default.
+        :param tool_executor: Optional executor used to execute tools instead of the client's own thread pool.
+        :param tool_cache: Memoizes the responses of cacheable tools, defaults to an in-process cache per client.
+        :param tool_execution_policy: Where tools are executed, inline, on a thread pool or in worker processes,
+            and their deadline. Tools can set their own. Defaults to executing tools inline without a deadline.
+        :param request_token_limit: Number of input tokens allowed in a single request, checked with the token estimator before the request is sent. Zero for no limit.
+        :param token_estimator: Estimates the size of requests, defaults to a heuristic that needs no tokenizer.
+        :param on_token_limit: Called when a request would exceed the request token limit, it can return compacted messages to send instead. The request is refused if it is not set.
+        :param compactor: Compacts the messages sent with every request, the session history itself is kept in full.
+        :param session_store: Saves sessions as runs progress, only the new messages are written after every iteration.
+        :param rate_limiter: Holds requests back to stay within requests and tokens per minute limits, using the
+            estimated request size. Share one between clients, or use a SQLite store to share it between processes.
+        :param retry_policy: Retries requests that failed with rate limit, connection or server errors, honoring
+            Retry-After. This is separate from the error retry limit, which covers malformed bot responses.
+        :param hedge_policy: Sends a duplicate of a request that is slow to respond and uses whichever responds
+            first. The tokens spent on discarded responses are counted separately on the results.
+        :param metrics: Receives the timing spans of runs, iterations, requests, retries and tool calls as they end.
+            The spans of a run are also kept on its results.
+        :param latency_budget: Seconds each run may take. Requests and tools time out when the budget runs out,
+            and the run fails with BotDeadlineError if it has not produced a user response by then.
+        :param final_answer_reserve: Once less than this many seconds of the latency budget remain the bot is
+            sent the iteration limit prompt for its final answer, rather than starting another full iteration.
+            Defaults to twice the duration of the run's slowest iteration so far.
         """
         self.tools = tools
-        if isinstance(self.tools, Iterable):
+        if isinstance(self.tools, Iterable) and not isinstance(self.tools, ToolRegistry):
             self.tools = list(self.tools)
         self.logger = logger
         self.system_prompt = system_prompt
@@ -57,6 +142,26 @@ class BaseBotClient:
         self.iteration_limit = iteration_limit
         self.iteration_limit_prompt = iteration_limit_prompt
         self.error_retry_limit = error_retry_limit
+        self.parallel_tool_calls = parallel_tool_calls
+        self.max_tool_workers = max_tool_workers
+        self.tool_executor = tool_executor
+        self.tool_cache = tool_cache or ToolResultCache()
+        self.tool_execution_policy = tool_execution_policy
+        self.request_token_limit = request_token_limit
+        self.token_estimator = token_estimator or HeuristicTokenEstimator()
+        self.on_token_limit = on_token_limit
+        self.compactor = compactor
+        self.session_store = session_store
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy
+        self.hedge_policy = hedge_policy
+        self.metrics = metrics
+        self.latency_budget = latency_budget
+        self.final_answer_reserve = final_answer_reserve
+        self._tool_registry = ToolRegistry()
+        self._tool_handlers: OrderedDict[tuple, ToolHandler] = OrderedDict()
+        self._tool_handlers_lock = threading.Lock()
+        self._tool_executor_lock = threading.Lock()
 
     def run(self, prompt: str, session: BotSession | None = None) -> BotResults:
         """
@@ -64,62 +169,159 @@ class BaseBotClient:
         :param prompt: Prompt for bot.
         :param session: Session with previous chat history.
         """
+        for event in self.iter_run(prompt, session):
+            if isinstance(event, BotResponseEvent):
+                results = event.results
+        return results
 
-        if not session:
-            session = BotSession.new()
-            session.messages = [BotMessage(role=BotMessageRole.SYSTEM, content=self.system_prompt)]
+    async def arun(self, prompt: str, session: BotSession | None = None) -> BotResults:
+        """
+        Run the bot with given prompt without blocking the event loop. Resume previous session if provided.
+        :param prompt: Prompt for bot.
+        :param session: Session with previous chat history.
+        """
+        async for event in self.aiter_run(prompt, session):
+            if isinstance(event, BotResponseEvent):
+                results = event.results
+        return results
 
-        self._log("Init bot.", prompt=prompt, client=self.name(), session_uid=session.uid)
+    def iter_run(self, prompt: str, session: BotSession | None = None) -> Iterator[BotEvent]:
+        """
+        Run the bot with given prompt, yielding events as the run progresses. The last event is a
+        BotResponseEvent holding the final results.
+        :param prompt: Prompt for bot.
+        :param session: Session with previous chat history.
+        """
 
-        session.messages.append(BotMessage(role=BotMessageRole.USER, content=prompt))
-        results = BotResults.new(prompt=prompt, session=session)
+        session, results = self._start_run(prompt, session)
 
-        for iteration in range(1, self.iteration_limit + 1):
-            self._log(f"Iteration {iteration}.", iteration=iteration, results=results, session_uid=session.uid)
-            results.iterations = iteration
+        try:
+            with self._span(None, BotSpanKind.RUN, self.name()) as results.trace:
+                for iteration in range(1, self.iteration_limit + 1):
+                    with self._iteration(iteration, session, results):
+                        # submit messages to llm, allow it to retry if malformed response is returned
+                        for err_retry_iter in range(self.error_retry_limit):
+                            try:
+                                session.messages += yield from self._iter_chat_completion(session.messages, results)
+                                break
+                            except MalformedBotResponseError as e:
+                                if not self._handle_malformed_response(e, err_retry_iter, session, results):
+                                    raise
+                    yield BotIterationEvent(iteration=iteration, results=results)
 
-            # check token limit
-            if self.session_token_limit > 0 and results.input_tokens > self.session_token_limit:
-                err_msg = "session reached token limit"
-                raise BotTokenLimitError(err_msg, results=results)
+                    # if tool returns a user response then we're done
+                    if self._has_user_response(session, results):
+                        break
+                response = self._end_run(results)
+            yield response
+        finally:
+            self._finish_run(session, results)
 
-            # on last iteration add iteration limit prompt
-            if iteration == self.iteration_limit:
-                self._log("Iteration limit reached", iteration_limit=self.iteration_limit, session_uid=session.uid)
-                if self.iteration_limit_prompt:
-                    session.messages.append(BotMessage(role=BotMessageRole.USER, content=self.iteration_limit_prompt))
-
-            # submit messages to llm, allow it to retry if malformed response is returned
-            for err_retry_iter in range(self.error_retry_limit):
-                try:
-                    session.messages += self._handle_chat_completion(messages=session.messages, results=results)
-                    break
-                except MalformedBotResponseError as e:
-                    if err_retry_iter >= self.error_retry_limit - 1:
-                        raise
-                    session.messages.append(BotMessage(role=BotMessageRole.USER, content=e.retry_message()))
-                    self._log(
-                        f"Bot malformed response. Retry #{err_retry_iter+1}",
-                        level=logging.WARNING,
-                        retry_number=err_retry_iter + 1,
-                        error_class=e.__class__.__name__,
-                        error=str(e),
-                        retry_message=e.retry_message(),
-                        session_uid=session.uid,
-                    )
+    async def aiter_run(self, prompt: str, session: BotSession | None = None) -> AsyncIterator[BotEvent]:
+        """
+        Async version of iter_run.
+        :param prompt: Prompt for bot.
+        :param session: Session with previous chat history.
+        """
+
+        session, results = self._start_run(prompt, session)
 
-            # if tool returns a user response then we're done
-            if results.tool_calls and isinstance(results.tool_calls[-1].response, ToolUserResponse):
-                self._log(
-                    "User response received.",
-                    response=results.tool_calls[-1].response,
-                    results=results,
-                    session_uid=session.uid,
-                )
-                return results
+        try:
+            with self._span(None, BotSpanKind.RUN, self.name()) as results.trace:
+                for iteration in range(1, self.iteration_limit + 1):
+                    with self._iteration(iteration, session, results):
+                        # submit messages to llm, allow it to retry if malformed response is returned
+                        for err_retry_iter in range(self.error_retry_limit):
+                            try:
+                                messages: list[BotMessage] = []
+                                async for event in self._aiter_chat_completion(session.messages, results, messages):
+                                    yield event
+                                session.messages += messages
+                                break
+                            except MalformedBotResponseError as e:
+                                if not self._handle_malformed_response(e, err_retry_iter, session, results):
+                                    raise
+                    yield BotIterationEvent(iteration=iteration, results=results)
+
+                    # if tool returns a user response then we're done
+                    if self._has_user_response(session, results):
+                        break
+                response = self._end_run(results)
+            yield response
+        finally:
+            self._finish_run(session, results)
+
+    def run_many(
+        self,
+        prompts: Iterable[str],
+        concurrency: int = 8,
+        *,
+        ordered: bool = True,
+        checkpoint: str | os.PathLike | None = None,
+    ) -> Iterator[BotBatchItem]:
+        """
+        Run many prompts concurrently, each in a new session, yielding an item per prompt as it finishes.
+        All runs share this client and its HTTP connection pool.
+        :param prompts: Prompts for bot.
+        :param concurrency: Maximum number of runs in flight.
+        :param ordered: Yield items in prompt order rather than completion order.
+        :param checkpoint: Optional checkpoint file path. Completed items are appended to it and loaded
+            from it instead of being run again when the batch is resumed.
+        """
+        store = BatchCheckpoint(checkpoint) if checkpoint else None
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"{self.name()}-batch")
+        # bound the runs submitted ahead of time (and buffered out of order) so prompts can be a lazy iterable
+        window = concurrency * 2
+        pending: dict[Future, int] = {}
+        buffered: dict[int, BotBatchItem] = {}
+        next_index = 0
+        prompts_iter = enumerate(prompts)
+        exhausted = False
+        try:
+            while pending or not exhausted:
+                finished: list[BotBatchItem] = []
+                while not exhausted and len(pending) + len(buffered) + len(finished) < window:
+                    try:
+                        index, prompt = next(prompts_iter)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    item = store.get(index, prompt) if store else None
+                    if item:
+                        finished.append(item)
+                    else:
+                        pending[executor.submit(self._run_batch_item, index, prompt)] = index
+                if pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        del pending[future]
+                        item = future.result()
+                        if store:
+                            store.write(item)
+                        finished.append(item)
+                for item in finished:
+                    if not ordered:
+                        yield item
+                    else:
+                        buffered[item.index] = item
+                while next_index in buffered:
+                    yield buffered.pop(next_index)
+                    next_index += 1
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
 
-        err_msg = "bot reached iteration limit without producing a user response"
-        raise BotIterationLimitError(err_msg, results=results)
+    def _run_batch_item(self, index: int, prompt: str) -> BotBatchItem:
+        try:
+            return BotBatchItem(index=index, prompt=prompt, results=self.run(prompt))
+        except BotError as e:
+            self._log("Batch item failed.", level=logging.WARNING, index=index, error=str(e))
+            return BotBatchItem(index=index, prompt=prompt, results=None, error=e)
+        # a failed prompt must not stop the batch, its error is reported on its item instead
+        except Exception as e:  # noqa: BLE001
+            self._log("Batch item failed.", level=logging.WARNING, index=index, error=str(e))
+            err = BotError(str(e))
+            err.__cause__ = e
+            return BotBatchItem(index=index, prompt=prompt, results=None, error=err)
 
     @staticmethod
     @abstractmethod
@@ -136,16 +338,520 @@ class BaseBotClient:
         """
         ...
 
+    async def _ahandle_chat_completion(self, messages: list[BotMessage], results: BotResults) -> list[BotMessage]:
+        """
+        Async version of _handle_chat_completion. Clients without a native async
+        implementation have the blocking call offloaded to the default executor.
+        :param messages: Chat history with LLM.
+        :param results: Current results
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._handle_chat_completion, messages, results)
+
+    def _iter_chat_completion(
+        self, messages: list[BotMessage], results: BotResults
+    ) -> Generator[BotEvent, None, list[BotMessage]]:
+        """
+        Submit current context to LLM as chat completion, yielding events as they happen.
+        Returns the new messages. Clients that support streaming should override this.
+        :param messages: Chat history with LLM.
+        :param results: Current results
+        """
+        yield from ()
+        return self._handle_chat_completion(messages=messages, results=results)
+
+    async def _aiter_chat_completion(
+        self, messages: list[BotMessage], results: BotResults, out: list[BotMessage]
+    ) -> AsyncIterator[BotEvent]:
+        """
+        Async version of _iter_chat_completion. Async generators cannot return a value
+        so the new messages are appended to `out`.
+        :param messages: Chat history with LLM.
+        :param results: Current results
+        :param out: List the new messages are appended to.
+        """
+        out += await self._ahandle_chat_completion(messages=messages, results=results)
+        # no events without a native implementation
+        events: tuple[BotEvent, ...] = ()
+        for event in events:
+            yield event
+
+    def _start_run(self, prompt: str, session: BotSession | None) -> tuple[BotSession, BotResults]:
+        if not session:
+            session = BotSession.new()
+            session.messages = [BotMessage(role=BotMessageRole.SYSTEM, content=self.system_prompt)]
+
+        self._log("Init bot.", prompt=prompt, client=self.name(), session_uid=session.uid)
+
+        session.messages.append(BotMessage(role=BotMessageRole.USER, content=prompt))
+        return session, BotResults.new(prompt=prompt, session=session, latency_budget=self.latency_budget)
+
+    def _end_run(self, results: BotResults) -> BotResponseEvent:
+        response = results.response
+        if response is None:
+            err_msg = "bot reached iteration limit without producing a user response"
+            raise BotIterationLimitError(err_msg, results=results)
+        results.latency_remaining = results.remaining_time()
+        return BotResponseEvent(response=response, results=results)
+
+    def _finish_run(self, session: BotSession, results: BotResults):
+        results.latency_remaining = results.remaining_time()
+        # keep what happened even if the run failed
+        self._save_session(session)
+
+    @contextmanager
+    def _iteration(self, iteration: int, session: BotSession, results: BotResults) -> Iterator[None]:
+        with self._span(results.trace, BotSpanKind.ITERATION, str(iteration)):
+            self._start_iteration(iteration, session, results)
+            yield
+            self._save_session(session)
+
+    def _start_iteration(self, iteration: int, session: BotSession, results: BotResults):
+        self._log(f"Iteration {iteration}.", iteration=iteration, results=results, session_uid=session.uid)
+        results.iterations = iteration
+
+        # check token limit
+        if self.session_token_limit > 0 and results.input_tokens > self.session_token_limit:
+            err_msg = "session reached token limit"
+            raise BotTokenLimitError(err_msg, results=results)
+
+        remaining = self._get_remaining_time(results)
+        if remaining is not None and results.iteration_span:
+            results.iteration_span.attributes["latency_remaining"] = remaining
+
+        # on last iteration, or when the latency budget has no room for more, add iteration limit prompt
+        final_answer = False
+        if iteration == self.iteration_limit:
+            self._log("Iteration limit reached", iteration_limit=self.iteration_limit, session_uid=session.uid)
+            final_answer = not results.early_final_answer
+        elif not results.early_final_answer and self._is_latency_budget_low(results, remaining):
+            self._log(
+                "Latency budget low, asking for final answer.",
+                level=logging.WARNING,
+                latency_remaining=remaining,
+                session_uid=session.uid,
+            )
+            results.early_final_answer = final_answer = True
+        if final_answer and self.iteration_limit_prompt:
+            session.messages.append(
+                BotMessage(role=BotMessageRole.USER, content=self.iteration_limit_prompt, synthetic=True)
+            )
+
+    def _get_remaining_time(self, results: BotResults) -> float | None:
+        """
+        Seconds left in the run's latency budget, None without a budget. Raises BotDeadlineError once it has run out.
+        :param results: Current results.
+        """
+        remaining = results.remaining_time()
+        if remaining is not None and remaining <= 0:
+            err_msg = f"run exceeded its latency budget of {results.latency_budget:g} seconds"
+            raise BotDeadlineError(err_msg, results=results)
+        return remaining
+
+    def _is_latency_budget_low(self, results: BotResults, remaining: float | None) -> bool:
+        if remaining is None:
+            return False
+        reserve = self.final_answer_reserve
+        if reserve is None:
+            # an iteration that calls tools and the final answer after it
+            spans = results.trace.children if results.trace else []
+            durations = [s.duration for s in spans if s.kind == BotSpanKind.ITERATION]
+            reserve = 2 * max(durations, default=0)
+        return remaining < reserve
+
+    def _budget_request(
+        self, messages: list[BotMessage], results: BotResults, extra_tokens: int = 0
+    ) -> tuple[list[BotMessage], int]:
+        """
+        Estimate the size of a request before it is sent. Over the request token limit the on_token_limit
+        hook may compact the messages, otherwise the request is refused. Returns the messages to send and
+        their estimated size.
+        :param messages: Chat history with LLM.
+        :param results: Current results.
+        :param extra_tokens: Tokens the request uses besides its messages, e.g. tool definitions.
+        """
+        if self.compactor:
+            budget = self.request_token_limit - extra_tokens if self.request_token_limit > 0 else None
+            messages = self._compact_request(self.compactor, messages, results, budget)
+        estimate = self.token_estimator.count_messages(messages) + extra_tokens
+        if self.request_token_limit > 0 and estimate > self.request_token_limit:
+            self._log(
+                "Request would exceed token limit.",
+                level=logging.WARNING,
+                estimated_tokens=estimate,
+                request_token_limit=self.request_token_limit,
+                session_uid=results.session.uid,
+            )
+            compacted = None
+            if self.on_token_limit:
+                compacted = self.on_token_limit(messages, self.request_token_limit - extra_tokens, results)
+            if compacted is not None:
+                estimate = self.token_estimator.count_messages(compacted) + extra_tokens
+            if compacted is None or estimate > self.request_token_limit:
+                err_msg = f"request would exceed token limit, estimated {estimate} tokens"
+                raise BotTokenLimitError(err_msg, results=results)
+            messages = compacted
+        results.estimated_input_tokens += estimate
+        return messages, estimate
+
+    def _send_request(
+        self, send: Callable[[], T], results: BotResults, estimated_tokens: int, span: BotSpan | None = None
+    ) -> T:
+        """
+        Send a request through the rate limiter, retrying transient errors with the retry policy.
+        :param send: Sends the request.
+        :param results: Current results.
+        :param estimated_tokens: Estimated input tokens of the request.
+        :param span: Span of the request, retries are added to it.
+        """
+        attempt = 0
+        hedge_policy = self.hedge_policy
+        while True:
+            if self.rate_limiter:
+                # every attempt is reserved in full, a failed request may still have counted against the limits
+                results.rate_limit_wait += self.rate_limiter.acquire(estimated_tokens)
+            try:
+                if hedge_policy:
+                    return self._send_hedged(hedge_policy, send, results, estimated_tokens, span)
+                return send()
+            except Exception as e:
+                # a request cut short by the latency budget failed because of it
+                self._get_remaining_time(results)
+                delay = self._get_retry_delay(e, attempt, results)
+                if delay is None:
+                    raise
+                with self._span(span, BotSpanKind.RETRY, e.__class__.__name__, attempt=attempt + 1):
+                    time.sleep(delay)
+            attempt += 1
+
+    async def _asend_request(
+        self, send: Callable[[], Awaitable[T]], results: BotResults, estimated_tokens: int, span: BotSpan | None = None
+    ) -> T:
+        """
+        Async version of _send_request.
+        :param send: Sends the request.
+        :param results: Current results.
+        :param estimated_tokens: Estimated input tokens of the request.
+        :param span: Span of the request, retries are added to it.
+        """
+        attempt = 0
+        hedge_policy = self.hedge_policy
+        while True:
+            if self.rate_limiter:
+                results.rate_limit_wait += await self.rate_limiter.aacquire(estimated_tokens)
+            try:
+                if hedge_policy:
+                    return await self._asend_hedged(hedge_policy, send, results, estimated_tokens, span)
+                return await send()
+            except Exception as e:
+                self._get_remaining_time(results)
+                delay = self._get_retry_delay(e, attempt, results)
+                if delay is None:
+                    raise
+                with self._span(span, BotSpanKind.RETRY, e.__class__.__name__, attempt=attempt + 1):
+                    await asyncio.sleep(delay)
+            attempt += 1
+
+    def _send_hedged(
+        self,
+        hedge_policy: HedgePolicy,
+        send: Callable[[], T],
+        results: BotResults,
+        estimated_tokens: int,
+        span: BotSpan | None,
+    ) -> T:
+        """
+        Send a request, and a duplicate of it from the hedge policy's thread pool if it is slow to respond.
+        The first response wins, a sync request cannot be interrupted so the other one is closed once it responds.
+        :param hedge_policy: The client's hedge policy.
+        :param send: Sends the request.
+        :param results: Current results.
+        :param estimated_tokens: Estimated input tokens of the request.
+        :param span: Span of the request, the hedge is added to it.
+        """
+        delay = hedge_policy.delay()
+        if delay is None:
+            return self._timed_send(hedge_policy, send)
+        executor = hedge_policy.executor()
+        first = executor.submit(self._timed_send, hedge_policy, send)
+        if wait([first], delay).done:
+            return first.result()
+        if self.rate_limiter:
+            results.rate_limit_wait += self.rate_limiter.acquire(estimated_tokens)
+        with self._span(span, BotSpanKind.HEDGE, "hedge", delay=delay) as hedge_span:
+            futures = [first, executor.submit(self._timed_send, hedge_policy, send)]
+            results.hedged_requests += 1
+            winner = None
+            pending = set(futures)
+            while winner is None and pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                winner = next((f for f in futures if f in done and f.exception() is None), None)
+            for future in futures:
+                if future is not winner:
+                    self._discard_hedged(future, results, estimated_tokens)
+            hedge_span.attributes["won"] = winner is not None and winner is not first
+            if winner is None:
+                # both failed, the error of the original request is retried as if it had not been hedged
+                return first.result()
+            if winner is not first:
+                results.hedge_wins += 1
+            return winner.result()
+
+    async def _asend_hedged(
+        self,
+        hedge_policy: HedgePolicy,
+        send: Callable[[], Awaitable[T]],
+        results: BotResults,
+        estimated_tokens: int,
+        span: BotSpan | None,
+    ) -> T:
+        """
+        Async version of _send_hedged, the request that loses is cancelled.
+        :param hedge_policy: The client's hedge policy.
+        :param send: Sends the request.
+        :param results: Current results.
+        :param estimated_tokens: Estimated input tokens of the request.
+        :param span: Span of the request, the hedge is added to it.
+        """
+        delay = hedge_policy.delay()
+        if delay is None:
+            return await self._atimed_send(hedge_policy, send)
+        first = asyncio.ensure_future(self._atimed_send(hedge_policy, send))
+        futures = [first]
+        try:
+            done, _ = await asyncio.wait(futures, timeout=delay)
+            if done:
+                return first.result()
+            if self.rate_limiter:
+                results.rate_limit_wait += await self.rate_limiter.aacquire(estimated_tokens)
+            with self._span(span, BotSpanKind.HEDGE, "hedge", delay=delay) as hedge_span:
+                futures.append(asyncio.ensure_future(self._atimed_send(hedge_policy, send)))
+                results.hedged_requests += 1
+                winner = None
+                pending = set(futures)
+                while winner is None and pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    winner = next((f for f in futures if f in done and f.exception() is None), None)
+                for future in futures:
+                    if future is not winner:
+                        await self._adiscard_hedged(future, results, estimated_tokens)
+                hedge_span.attributes["won"] = winner is not None and winner is not first
+                if winner is None:
+                    return first.result()
+                if winner is not first:
+                    results.hedge_wins += 1
+                return winner.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def _timed_send(self, hedge_policy: HedgePolicy, send: Callable[[], T]) -> T:
+        start = time.perf_counter()
+        response = send()
+        hedge_policy.observe(time.perf_counter() - start)
+        return response
+
+    async def _atimed_send(self, hedge_policy: HedgePolicy, send: Callable[[], Awaitable[T]]) -> T:
+        start = time.perf_counter()
+        response = await send()
+        hedge_policy.observe(time.perf_counter() - start)
+        return response
+
+    def _discard_hedged(self, future: Future, results: BotResults, estimated_tokens: int):
+        if not future.done():
+            # the request was still processing the prompt or generating, its input tokens are likely billed
+            results.hedge_input_tokens += estimated_tokens
+            future.add_done_callback(self._close_hedged)
+        elif future.exception() is None:
+            self._count_hedged_response(future.result(), results, estimated_tokens)
+            self._close_response(future.result())
+
+    def _close_hedged(self, future: Future):
+        if future.exception() is None:
+            self._close_response(future.result())
+
+    async def _adiscard_hedged(self, future: asyncio.Future, results: BotResults, estimated_tokens: int):
+        if not future.done():
+            future.cancel()
+            results.hedge_input_tokens += estimated_tokens
+        elif not future.cancelled() and future.exception() is None:
+            self._count_hedged_response(future.result(), results, estimated_tokens)
+            await self._aclose_response(future.result())
+
+    def _count_hedged_response(self, response: Any, results: BotResults, estimated_tokens: int):
+        usage = self._get_response_usage(response)
+        if usage is None:
+            results.hedge_input_tokens += estimated_tokens
+            return
+        results.hedge_input_tokens += usage[0]
+        results.hedge_output_tokens += usage[1]
+        self._settle_request(estimated_tokens, *usage)
+
+    def _get_response_usage(self, response: Any) -> tuple[int, int] | None:  # noqa: ARG002
+        """Input and output tokens of an API response, None if it does not say, e.g. for streams."""
+        return None
+
+    def _close_response(self, response: Any):
+        """Release an API response that is not used, e.g. a stream discarded by hedging."""
+
+    async def _aclose_response(self, response: Any):
+        """Async version of _close_response."""
+        self._close_response(response)
+
+    def _get_retry_delay(self, e: Exception, attempt: int, results: BotResults) -> float | None:
+        if not self.retry_policy or not self._is_retryable_error(e):
+            return None
+        retry_after = self._get_retry_after(e)
+        delay = self.retry_policy.delay(attempt, retry_after)
+        remaining = results.remaining_time()
+        if delay is None or (remaining is not None and delay >= remaining):
+            return None
+        if retry_after is not None and self.rate_limiter:
+            # the API is telling every client sharing the limits to back off, not just this one
+            self.rate_limiter.pause(delay)
+        results.request_retries += 1
+        results.retry_wait += delay
+        self._log(
+            f"Request failed. Retry #{attempt + 1} in {delay:.2f}s",
+            level=logging.WARNING,
+            retry_number=attempt + 1,
+            retry_delay=delay,
+            retry_after=retry_after,
+            error_class=e.__class__.__name__,
+            error=str(e),
+            session_uid=results.session.uid,
+        )
+        return delay
+
+    def _is_retryable_error(self, e: Exception) -> bool:  # noqa: ARG002
+        """Whether a request error is transient, e.g. a rate limit, connection or server error."""
+        return False
+
+    def _get_retry_after(self, e: Exception) -> float | None:  # noqa: ARG002
+        """Seconds the API asked to wait before retrying, None if it did not say."""
+        return None
+
+    def _settle_request(self, estimated_tokens: int, input_tokens: int, output_tokens: int):
+        """
+        Correct the rate limiter's reservation with the actual usage of a request.
+        :param estimated_tokens: Tokens reserved before the request was sent.
+        :param input_tokens: Input tokens the API reported.
+        :param output_tokens: Output tokens the API reported.
+        """
+        # without usage from the API the estimate stands
+        if self.rate_limiter and (input_tokens or output_tokens):
+            self.rate_limiter.adjust(input_tokens + output_tokens - estimated_tokens)
+
+    def _compact_request(
+        self, compactor: BaseCompactor, messages: list[BotMessage], results: BotResults, budget: int | None
+    ) -> list[BotMessage]:
+        compacted = compactor.compact(messages, self.token_estimator, budget)
+        if compacted is messages:
+            return messages
+        kept = {id(m) for m in compacted}
+        removed_messages = sum(1 for m in messages if id(m) not in kept)
+        removed_tokens = self.token_estimator.count_messages(messages) - self.token_estimator.count_messages(compacted)
+        results.compacted_messages += removed_messages
+        results.compacted_tokens += removed_tokens
+        self._log(
+            "Compacted request.",
+            removed_messages=removed_messages,
+            removed_tokens=removed_tokens,
+            session_uid=results.session.uid,
+        )
+        return compacted
+
+    def _handle_malformed_response(
+        self, e: MalformedBotResponseError, err_retry_iter: int, session: BotSession, results: BotResults
+    ) -> bool:
+        """Count a malformed response and ask the bot to retry, returns False when no retries are left."""
+        results.malformed_responses += 1
+        if err_retry_iter >= self.error_retry_limit - 1:
+            return False
+        session.messages.append(BotMessage(role=BotMessageRole.USER, content=e.retry_message(), synthetic=True))
+        self._log(
+            f"Bot malformed response. Retry #{err_retry_iter+1}",
+            level=logging.WARNING,
+            retry_number=err_retry_iter + 1,
+            error_class=e.__class__.__name__,
+            error=str(e),
+            retry_message=e.retry_message(),
+            session_uid=session.uid,
+        )
+        return True
+
+    def _span(self, parent: BotSpan | None, kind: BotSpanKind, name: str, **attributes) -> ContextManager[BotSpan]:
+        return record_span(parent, kind, name, self.metrics, **attributes)
+
+    def _save_session(self, session: BotSession):
+        if self.session_store:
+            self.session_store.save(session)
+
+    def _has_user_response(self, session: BotSession, results: BotResults) -> bool:
+        if results.tool_calls and isinstance(results.tool_calls[-1].response, ToolUserResponse):
+            self._log(
+                "User response received.",
+                response=results.tool_calls[-1].response,
+                results=results,
+                session_uid=session.uid,
+            )
+            return True
+        return False
+
+    def _get_tool_call_dispatcher(self, tool_handler: ToolHandler, results: BotResults) -> ToolCallDispatcher:
+        if self.parallel_tool_calls:
+            return ToolCallDispatcher(tool_handler, results, executor=self._get_tool_executor(), parallel=True)
+        return ToolCallDispatcher(tool_handler, results, executor=self.tool_executor)
+
+    def _get_tool_executor(self) -> Executor:
+        if not self.tool_executor:
+            with self._tool_executor_lock:
+                if not self.tool_executor:
+                    self.tool_executor = ThreadPoolExecutor(
+                        max_workers=self.max_tool_workers, thread_name_prefix=f"{self.name()}-tool"
+                    )
+        return self.tool_executor
+
     def _generate_message(self, role: str, content: str) -> dict:
         return {"role": role, "content": content}
 
     def _get_tool_handler(self, results: BotResults) -> ToolHandler:
-        tools = []
-        if isinstance(self.tools, list):
-            tools = self.tools
-        elif isinstance(self.tools, Callable):
-            tools = list(self.tools(results))
-        return ToolHandler(tools=tools, logger=self.logger)
+        # reuse the handler, and so its rendered definitions, while the offered tools are unchanged
+        if isinstance(self.tools, ToolRegistry):
+            # the handler follows changes to the registry itself
+            registry: ToolRegistry | None = self.tools
+            key: tuple = (id(registry),)
+            names: tuple[str, ...] = ()
+        else:
+            tools: list[BaseTool] = []
+            if isinstance(self.tools, list):
+                tools = self.tools
+            elif isinstance(self.tools, Callable):
+                tools = list(self.tools(results))
+                results.offered_tools.append([t.name() for t in tools])
+                if results.iteration_span:
+                    results.iteration_span.attributes["offered_tools"] = len(tools)
+            # every tool is validated once when the client first sees it, offered tools are a view of them
+            names = tuple(self._tool_registry.merge(tools))
+            key = (names, self._tool_registry.version)
+            registry = None
+        with self._tool_handlers_lock:
+            handler = self._tool_handlers.get(key)
+            if handler:
+                self._tool_handlers.move_to_end(key)
+                return handler
+        handler = ToolHandler(
+            tools=registry if registry is not None else self._tool_registry.subset(names),
+            logger=self.logger,
+            cache=self.tool_cache,
+            metrics=self.metrics,
+            execution_policy=self.tool_execution_policy,
+        )
+        with self._tool_handlers_lock:
+            self._tool_handlers[key] = handler
+            while len(self._tool_handlers) > TOOL_HANDLER_CACHE_SIZE:
+                self._tool_handlers.popitem(last=False)
+        return handler
 
     def _log(self, message: str, level: int = logging.INFO, **kwargs):
         if self.logger:
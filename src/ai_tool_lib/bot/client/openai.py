@@ -4,15 +4,20 @@
 
 from __future__ import annotations
 
+import email.utils
 import json
-from typing import TYPE_CHECKING
+import logging
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, AsyncIterator, ContextManager, Generator, Iterator, TypeVar
 
 import openai
 from openai.types.chat import (
+    ChatCompletion,
     ChatCompletionAssistantMessageParam,
+    ChatCompletionChunk,
     ChatCompletionFunctionMessageParam,
     ChatCompletionMessageParam,
-    ChatCompletionMessageToolCall,
     ChatCompletionMessageToolCallParam,
     ChatCompletionSystemMessageParam,
     ChatCompletionToolMessageParam,
@@ -22,106 +27,562 @@ from openai.types.chat import (
 from openai.types.chat.chat_completion_message_tool_call_param import Function
 from openai.types.shared_params.function_definition import FunctionDefinition
 
+from ai_tool_lib.bot.client.balancer import BalancedStream
 from ai_tool_lib.bot.client.base import BaseBotClient
-from ai_tool_lib.bot.message import BotMessage, BotMessageRole, BotToolMessage
-from ai_tool_lib.bot.results import BotResults, BotToolCall
-from ai_tool_lib.bot.tool.response import ToolBotResponse, ToolResponse, ToolUserResponse
+from ai_tool_lib.bot.client.transport import OpenAITransport, get_transport
+from ai_tool_lib.bot.event import BotTokenEvent
+from ai_tool_lib.bot.message import BotCompletion, BotMessage, BotMessageRole, BotToolMessage
+from ai_tool_lib.bot.metrics import BotSpanKind
+from ai_tool_lib.bot.results import BotModelUsage
+from ai_tool_lib.bot.router import RoutingContext
 from ai_tool_lib.error.bot import BotNoToolCallError, UnexpectedBotResponseError
+from ai_tool_lib.utils.cache import stable_hash
+from ai_tool_lib.utils.generator import adrain, drain
 
 if TYPE_CHECKING:
+    from openai.types.completion_usage import CompletionUsage
+
+    from ai_tool_lib.bot.client.balancer import EndpointBalancer, EndpointLease
+    from ai_tool_lib.bot.client.replay import Cassette
+    from ai_tool_lib.bot.event import BotEvent
+    from ai_tool_lib.bot.metrics import BotSpan
+    from ai_tool_lib.bot.results import BotResults
+    from ai_tool_lib.bot.router import ModelRouter
+    from ai_tool_lib.bot.tool.base_tool import BaseTool
+    from ai_tool_lib.bot.tool.dispatcher import ToolCallDispatcher
     from ai_tool_lib.bot.tool.handler import ToolHandler
+    from ai_tool_lib.utils.cache import BaseCache
+
+
+OpenAIClientT = TypeVar("OpenAIClientT", openai.OpenAI, openai.AsyncOpenAI)
+
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 429})
+""" HTTP status codes, besides server errors, that are retried with the retry policy. """
+
+
+class ChatCompletionStreamAssembler:
+    """
+    Assembles streamed chat completion chunks into a bot message. Tool calls are reported in
+    order, each as soon as its arguments and those of every call before it form complete JSON objects.
+    """
+
+    def __init__(self):
+        self.content: list[str] = []
+        self.tool_calls: dict[int, BotToolMessage] = {}
+        self.usage: CompletionUsage | None = None
+        self.has_choices = False
+        self._parsed: set[int] = set()
+        self._completed: set[int] = set()
+
+    def add(self, chunk: ChatCompletionChunk) -> tuple[str, list[BotToolMessage]]:
+        """
+        Add a chunk, returns the content delta and any tool calls completed by it.
+        :param chunk: Streamed chat completion chunk.
+        """
+        if chunk.usage:
+            self.usage = chunk.usage
+        if not chunk.choices:
+            return "", []
+        self.has_choices = True
+        delta = chunk.choices[0].delta
+        if delta.content:
+            self.content.append(delta.content)
+        if not delta.tool_calls:
+            return delta.content or "", []
+        for t in delta.tool_calls:
+            call = self.tool_calls.get(t.index)
+            if call is None:
+                call = self.tool_calls[t.index] = BotToolMessage(id="", name="", args="")
+            if t.id:
+                call.id = t.id
+            if t.function and t.function.name:
+                call.name += t.function.name
+            if t.function and t.function.arguments:
+                call.args += t.function.arguments
+                # a JSON object cannot be extended, once the arguments parse they are complete
+                if call.args.rstrip().endswith("}") and self._is_json(call.args):
+                    self._parsed.add(t.index)
+        return delta.content or "", self._complete(self._parsed.__contains__)
+
+    def finish(self) -> list[BotToolMessage]:
+        """Mark the stream as finished, returns the remaining tool calls."""
+        return self._complete(lambda _: True)
+
+    def message(self) -> BotMessage:
+        return BotMessage(
+            role=BotMessageRole.BOT,
+            content="".join(self.content) if self.content else None,
+            tool_calls=[self.tool_calls[i] for i in sorted(self.tool_calls)] or None,
+        )
+
+    def _complete(self, match) -> list[BotToolMessage]:
+        indexes = []
+        for i in sorted(self.tool_calls):
+            if i in self._completed:
+                continue
+            if not match(i):
+                break
+            indexes.append(i)
+        self._completed.update(indexes)
+        return [self.tool_calls[i] for i in indexes]
+
+    @staticmethod
+    def _is_json(value: str) -> bool:
+        try:
+            json.loads(value)
+        except ValueError:
+            return False
+        return True
+
+
+class _CompletionStream:
+    """A chat completion being streamed, and how many of its tool calls were dispatched early."""
+
+    def __init__(self):
+        self.assembler = ChatCompletionStreamAssembler()
+        # tool calls completed so far, and those of them dispatched while streaming, always the first ones
+        self.streamed = 0
+        self.early = 0
 
 
 class OpenAIBotClient(BaseBotClient):
-    def __init__(self, api_key: str, base_url: str | None = None, model: str = "gpt-4o-mini", **kwargs):
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str | None = None,
+        model: str = "gpt-4o-mini",
+        *,
+        stream: bool = False,
+        cache: BaseCache | None = None,
+        transport: OpenAITransport | None = None,
+        recorder: Cassette | None = None,
+        balancer: EndpointBalancer | None = None,
+        router: ModelRouter | None = None,
+        **kwargs,
+    ):
+        """
+        :param api_key: OpenAI API key.
+        :param base_url: Base URL of an OpenAI compatible API.
+        :param model: The model to use.
+        :param stream: Stream chat completions. Calls of tools that allow early dispatch are executed as soon as their
+            arguments are complete, other calls once the whole completion is received and checked.
+        :param cache: Optional completion cache. Identical requests are answered from it without calling the
+            API, their tool calls are still executed.
+        :param transport: Connection pool and API clients to use, defaults to the process wide transport
+            for the base URL and API key so every bot client for an endpoint shares its connections.
+        :param recorder: Records every completion received from the API to a cassette, for the replay client.
+        :param balancer: Spreads chat completions across several endpoints serving the model, every attempt of a
+            request picks its endpoint so retries move away from failing ones. Overrides base_url and transport
+            for chat completions.
+        :param router: Picks the model of every request, e.g. a small model for simple requests and a large one
+            once the bot responded with malformed tool calls. Defaults to the model for every request.
+        """
         super().__init__(**kwargs)
-        self.client = openai.OpenAI(
-            api_key=api_key,
-            base_url=base_url,
-        )
+        self.balancer = balancer
+        self.router = router
+        if transport is None and balancer is not None:
+            transport = balancer.endpoints[0].transport
+        self.transport = transport or get_transport(api_key=api_key, base_url=base_url)
         self.model = model
+        self.stream = stream
+        self.cache = cache
+        self.recorder = recorder
         self._log("Using OpenAI client.", base_url=base_url, model=model)
 
+    @property
+    def client(self) -> openai.OpenAI:
+        return self.transport.client
+
+    @client.setter
+    def client(self, client: openai.OpenAI):
+        # an assigned client gets a transport of its own, rather than replacing the shared transport's client
+        self.transport = OpenAITransport.from_client(client)
+
     @staticmethod
     def name() -> str:
         return "openai"
 
     def _handle_chat_completion(self, messages: list[BotMessage], results: BotResults):
+        return drain(self._iter_chat_completion(messages=messages, results=results))
+
+    def _iter_chat_completion(
+        self, messages: list[BotMessage], results: BotResults
+    ) -> Generator[BotEvent, None, list[BotMessage]]:
+        request, estimate, dispatcher = self._start_chat_completion(messages, results)
+        with self._request_span(request, results) as span:
+            cache_key, completion = self._get_cached_completion(request, results)
+            span.attributes["cached"] = completion is not None
+            if completion is None and self.stream:
+                stream = _CompletionStream()
+                client = self._request_client(self.client)
+                # only opening the stream is retried, chunks may already have dispatched tool calls
+                with self._send_request(
+                    lambda: self._send_chat_completion(client, request, results), results, estimate, span
+                ) as chunks, self._reading_stream(request, stream, estimate, span, results):
+                    for chunk in chunks:
+                        event, early_calls = self._add_stream_chunk(stream, chunk, dispatcher, results)
+                        if event:
+                            yield event
+                        for call in early_calls:
+                            yield from dispatcher.dispatch(call)
+                completion, tool_calls = self._received_stream(request, stream, estimate, span, results)
+            else:
+                if completion is None:
+                    client = self._request_client(self.client)
+                    response = self._send_request(
+                        lambda: self._send_chat_completion(client, request, results), results, estimate, span
+                    )
+                    completion = self._received_response(request, response, estimate, span, results)
+                tool_calls = completion.message.tool_calls or []
+                if completion.message.content:
+                    yield BotTokenEvent(content=completion.message.content)
+            span.attributes.update(
+                estimated_tokens=estimate, input_tokens=completion.input_tokens, output_tokens=completion.output_tokens
+            )
+        self._end_chat_completion(completion, tool_calls, dispatcher, results, cache_key)
+        for call in tool_calls:
+            yield from dispatcher.dispatch(call)
+        return [completion.message, *(yield from dispatcher.finish())]
+
+    def _start_chat_completion(
+        self, messages: list[BotMessage], results: BotResults
+    ) -> tuple[dict[str, Any], int, ToolCallDispatcher]:
+        """Build the request of an iteration, returns it with its estimated input tokens and the tool call dispatcher."""
         tool_handler = self._get_tool_handler(results)
-        response = self.client.chat.completions.create(
-            messages=[self._chat_completion_from_bot_message(m) for m in messages],
-            model=self.model,
-            temperature=0.2,
-            top_p=0.1,
-            tools=self._get_tool_definitions(tool_handler),
-            tool_choice="required",
+        messages, estimate = self._budget_request(messages, results, self._get_tool_definition_tokens(tool_handler))
+        model = self._get_model(results, estimate, tool_handler)
+        request = self._chat_completion_request(messages, tool_handler, model)
+        return request, estimate, self._get_tool_call_dispatcher(tool_handler, results)
+
+    def _request_span(self, request: dict[str, Any], results: BotResults) -> ContextManager[BotSpan]:
+        return self._span(results.iteration_span, BotSpanKind.REQUEST, request["model"], stream=self.stream)
+
+    def _add_stream_chunk(
+        self, stream: _CompletionStream, chunk: ChatCompletionChunk, dispatcher: ToolCallDispatcher, results: BotResults
+    ) -> tuple[BotTokenEvent | None, list[BotToolMessage]]:
+        """Add a streamed chunk, returns the event for its content and the tool calls to dispatch right away."""
+        # the request timeout bounds each read of a stream, not the whole of it
+        self._get_remaining_time(results)
+        content, tool_calls = stream.assembler.add(chunk)
+        early_calls = []
+        for call in tool_calls:
+            # calls are recorded in order, none is dispatched early after one that has to wait
+            if stream.early == stream.streamed and dispatcher.can_dispatch_early(call):
+                stream.early += 1
+                early_calls.append(call)
+            stream.streamed += 1
+        return BotTokenEvent(content=content) if content else None, early_calls
+
+    @contextmanager
+    def _reading_stream(
+        self,
+        request: dict[str, Any],
+        stream: _CompletionStream,
+        estimated_tokens: int,
+        span: BotSpan,
+        results: BotResults,
+    ) -> Iterator[None]:
+        try:
+            yield
+        except BaseException:
+            # the stream failed or a tool dispatched early raised, the tokens used so far still count but an
+            # incomplete completion is not recorded for replay
+            completion = self._completion_with_usage(stream.assembler.message(), stream.assembler.usage, results)
+            self._received_completion(request, completion, estimated_tokens, span, results, record=False)
+            raise
+
+    def _received_stream(
+        self,
+        request: dict[str, Any],
+        stream: _CompletionStream,
+        estimated_tokens: int,
+        span: BotSpan,
+        results: BotResults,
+    ) -> tuple[BotCompletion, list[BotToolMessage]]:
+        """Finish a streamed completion, returns it with the tool calls that were not dispatched early."""
+        stream.assembler.finish()
+        completion = self._completion_from_stream(stream.assembler, results)
+        self._received_completion(request, completion, estimated_tokens, span, results)
+        return completion, (completion.message.tool_calls or [])[stream.early :]
+
+    def _received_response(
+        self,
+        request: dict[str, Any],
+        response: ChatCompletion,
+        estimated_tokens: int,
+        span: BotSpan,
+        results: BotResults,
+    ) -> BotCompletion:
+        completion = self._completion_from_chat_completion(response, results)
+        self._received_completion(request, completion, estimated_tokens, span, results)
+        return completion
+
+    def _received_completion(
+        self,
+        request: dict[str, Any],
+        completion: BotCompletion,
+        estimated_tokens: int,
+        span: BotSpan,
+        results: BotResults,
+        *,
+        record: bool = True,
+    ):
+        self._settle_request(estimated_tokens, completion.input_tokens, completion.output_tokens)
+        latency = time.time() - span.start
+        usage = results.model_usage.get(request["model"])
+        if usage is None:
+            usage = results.model_usage[request["model"]] = BotModelUsage()
+        usage.requests += 1
+        usage.input_tokens += completion.input_tokens
+        usage.output_tokens += completion.output_tokens
+        usage.latency += latency
+        if record and self.recorder is not None:
+            self.recorder.record(request, completion, latency)
+
+    def _end_chat_completion(
+        self,
+        completion: BotCompletion,
+        tool_calls: list[BotToolMessage],
+        dispatcher: ToolCallDispatcher,
+        results: BotResults,
+        cache_key: str | None,
+    ):
+        self._check_completion(completion, results, cache_key)
+        dispatcher.validate(tool_calls)
+
+    def _send_chat_completion(
+        self, client: openai.OpenAI | openai.AsyncOpenAI, request: dict[str, Any], results: BotResults
+    ) -> Any:
+        # called for every attempt so retries only get what is left of the latency budget
+        timeout = self._get_remaining_time(results)
+        if self.balancer is None:
+            return self._create_chat_completion(client, request, timeout)
+        lease = self.balancer.acquire(results.session.uid)
+        self._log(
+            "Sending chat completion.",
+            level=logging.DEBUG,
+            endpoint=lease.endpoint.url,
+            session_uid=results.session.uid,
         )
+        if isinstance(client, openai.AsyncOpenAI):
+            return self._acreate_balanced_chat_completion(lease, request, timeout)
+        try:
+            response = self._create_chat_completion(
+                self._request_client(lease.endpoint.transport.client), request, timeout
+            )
+        except BaseException as e:
+            lease.release(e)
+            raise
+        return self._balanced_response(lease, response)
+
+    async def _acreate_balanced_chat_completion(
+        self, lease: EndpointLease, request: dict[str, Any], timeout: float | None
+    ) -> Any:
+        try:
+            response = await self._create_chat_completion(
+                self._request_client(lease.endpoint.transport.async_client), request, timeout
+            )
+        except BaseException as e:
+            lease.release(e)
+            raise
+        return self._balanced_response(lease, response)
+
+    def _balanced_response(self, lease: EndpointLease, response: Any) -> Any:
+        if isinstance(response, (openai.Stream, openai.AsyncStream)):
+            # the endpoint is busy until the stream is read, but its latency is the time to the first byte
+            lease.responded()
+            return BalancedStream(response, lease)
+        lease.release()
+        return response
+
+    def _create_chat_completion(
+        self, client: openai.OpenAI | openai.AsyncOpenAI, request: dict[str, Any], timeout: float | None = None
+    ) -> Any:
+        return client.chat.completions.create(
+            **request,
+            # a None timeout would disable the client's default one
+            timeout=openai.NOT_GIVEN if timeout is None else timeout,
+        )
+
+    def _get_response_usage(self, response: Any) -> tuple[int, int] | None:
+        if isinstance(response, ChatCompletion) and response.usage:
+            return response.usage.prompt_tokens, response.usage.completion_tokens
+        return None
+
+    def _close_response(self, response: Any):
+        if isinstance(response, (openai.Stream, BalancedStream)):
+            response.close()
+
+    async def _aclose_response(self, response: Any):
+        if isinstance(response, openai.AsyncStream):
+            await response.close()
+        elif isinstance(response, BalancedStream):
+            await response.aclose()
+
+    def _request_client(self, client: OpenAIClientT) -> OpenAIClientT:
+        # the retry policy takes over from the OpenAI client's own retries, which would hide Retry-After from it
+        return client.with_options(max_retries=0) if self.retry_policy else client
+
+    def _is_retryable_error(self, e: Exception) -> bool:
+        if isinstance(e, openai.APIConnectionError):
+            return True
+        return isinstance(e, openai.APIStatusError) and (
+            e.status_code in RETRYABLE_STATUS_CODES or e.status_code >= 500  # noqa: PLR2004
+        )
+
+    def _get_retry_after(self, e: Exception) -> float | None:
+        if not isinstance(e, openai.APIStatusError):
+            return None
+        headers = e.response.headers
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except (KeyError, ValueError):
+            pass
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            # Retry-After may also be an HTTP date
+            date = email.utils.parsedate_tz(value)
+            return max(0.0, email.utils.mktime_tz(date) - time.time()) if date else None
+
+    def _get_model(self, results: BotResults, estimated_tokens: int, tool_handler: ToolHandler) -> str:
+        if self.router is None:
+            return self.model
+        model = self.router.route(
+            RoutingContext(
+                results=results,
+                estimated_tokens=estimated_tokens,
+                tools=[t.name() for t in tool_handler.tools],
+                iteration=results.iterations,
+                malformed_responses=results.malformed_responses,
+                remaining_time=results.remaining_time(),
+            )
+        )
+        self._log("Routed request.", level=logging.DEBUG, model=model, session_uid=results.session.uid)
+        return model
+
+    def _chat_completion_request(
+        self, messages: list[BotMessage], tool_handler: ToolHandler, model: str | None = None
+    ) -> dict[str, Any]:
+        request = {
+            # messages are serialized once and reused for every later iteration and run
+            "messages": [m.wire("openai", self._chat_completion_from_bot_message) for m in messages],
+            "model": model or self.model,
+            "temperature": 0.2,
+            "top_p": 0.1,
+            "tools": self._get_tool_definitions(tool_handler),
+            "tool_choice": "required",
+        }
+        if self.stream:
+            request["stream"] = True
+            request["stream_options"] = {"include_usage": True}
+        return request
+
+    def _get_cached_completion(
+        self, request: dict[str, Any], results: BotResults
+    ) -> tuple[str | None, BotCompletion | None]:
+        """Look up a request in the completion cache, returns the cache key and the completion on a hit."""
+        if self.cache is None:
+            return None, None
+        # streaming does not change the completion so share entries with non streamed requests
+        key = "completion:" + stable_hash(
+            {
+                # a model name can refer to different models on different endpoints
+                "endpoint": self._cache_endpoint(),
+                **{k: v for k, v in request.items() if k not in ("stream", "stream_options", "timeout")},
+            }
+        )
+        value = self.cache.get(key)
+        if value is None:
+            results.cache_misses += 1
+            return key, None
+        completion = BotCompletion.model_validate_json(value)
+        results.cache_hits += 1
+        results.cached_input_tokens += completion.input_tokens
+        results.cached_output_tokens += completion.output_tokens
+        self._log("Completion cache hit.", cache_key=key, session_uid=results.session.uid)
+        return None, completion
+
+    def _cache_endpoint(self) -> str | list[str] | None:
+        # balanced endpoints serve the same model, any of them may answer a request
+        if self.balancer is not None:
+            return sorted(endpoint.url for endpoint in self.balancer.endpoints)
+        return self.transport.base_url
+
+    def _completion_from_chat_completion(self, response: ChatCompletion, results: BotResults) -> BotCompletion:
         if len(response.choices) == 0:
             msg = "empty response from chat completion endpoint"
             raise UnexpectedBotResponseError(msg, results=results)
 
         response_message = response.choices[0].message
-        out = [
-            BotMessage(
-                role=BotMessageRole.BOT,
-                content=response_message.content,
-                tool_calls=[
-                    BotToolMessage(id=t.id, name=t.function.name, args=t.function.arguments)
-                    for t in response_message.tool_calls
-                ]
-                if response_message.tool_calls
-                else None,
-            )
-        ]
+        message = BotMessage(
+            role=BotMessageRole.BOT,
+            content=response_message.content,
+            tool_calls=[
+                BotToolMessage(id=t.id, name=t.function.name, args=t.function.arguments)
+                for t in response_message.tool_calls
+            ]
+            if response_message.tool_calls
+            else None,
+        )
+        return self._completion_with_usage(message, response.usage, results)
+
+    def _completion_from_stream(self, assembler: ChatCompletionStreamAssembler, results: BotResults) -> BotCompletion:
+        if not assembler.has_choices:
+            msg = "empty response from chat completion endpoint"
+            raise UnexpectedBotResponseError(msg, results=results)
+        return self._completion_with_usage(assembler.message(), assembler.usage, results)
 
+    def _completion_with_usage(
+        self, message: BotMessage, usage: CompletionUsage | None, results: BotResults
+    ) -> BotCompletion:
+        completion = BotCompletion(message=message)
         # add token usages
-        if response.usage:
-            results.input_tokens += response.usage.prompt_tokens
-            results.output_tokens += response.usage.completion_tokens
+        if usage:
+            completion.input_tokens = usage.prompt_tokens
+            completion.output_tokens = usage.completion_tokens
+            results.input_tokens += usage.prompt_tokens
+            results.output_tokens += usage.completion_tokens
+        return completion
 
+    def _check_completion(self, completion: BotCompletion, results: BotResults, cache_key: str | None = None):
         # let bot know it must use tool calls if none provided
-        if not response_message.tool_calls:
+        if not completion.message.tool_calls:
             err_msg = "bot did not call a tool"
             raise BotNoToolCallError(err_msg, results=results)
+        if self.cache is not None and cache_key:
+            self.cache.set(cache_key, completion.model_dump_json())
 
-        # handle tool calls
-        for call in response_message.tool_calls:
-            resp = self._tool_call(tool_handler, call)
-            results.tool_calls.append(
-                BotToolCall(tool=call.function.name, args=json.loads(call.function.arguments), response=resp)
-            )
-            # tool provided a user answer
-            if isinstance(resp, ToolUserResponse):
-                out.append(BotMessage(role=BotMessageRole.TOOL, content="(done)", tool_call_id=call.id))
-                break
-            # tool provided a response for the bot to read
-            if isinstance(resp, ToolBotResponse):
-                out.append(BotMessage(role=BotMessageRole.TOOL, content=resp.content, tool_call_id=call.id))
-
-        return out
+    def _get_tool_definitions(self, tool_handler: ToolHandler) -> list[ChatCompletionToolParam]:
+        return tool_handler.registry.definitions("openai", self._get_tool_definition)
 
-    def _tool_call(self, tool_handler: ToolHandler, tool_call: ChatCompletionMessageToolCall) -> ToolResponse:
-        return tool_handler.call(tool_call.function.name, json.loads(tool_call.function.arguments))
+    def _get_tool_definition_tokens(self, tool_handler: ToolHandler) -> int:
+        definitions = tool_handler.registry.definitions(
+            f"openai:tokens:{self.token_estimator.name()}",
+            lambda t: self.token_estimator.count_json(self._get_tool_definition(t)),
+        )
+        return sum(definitions)
 
-    def _get_tool_definitions(self, tool_handler: ToolHandler) -> list[ChatCompletionToolParam]:
-        return [
-            ChatCompletionToolParam(
-                function=FunctionDefinition(
-                    name=t.name(),
-                    description=t.description(),
-                    parameters={
-                        "type": "object",
-                        "properties": {p.name: p.to_json_schema() for p in t.properties()},
-                        "required": [p.name for p in filter(lambda p: p.required, t.properties())],
-                    },
-                ),
-                type="function",
-            )
-            for t in tool_handler.tools
-        ]
+    def _get_tool_definition(self, tool: BaseTool) -> ChatCompletionToolParam:
+        return ChatCompletionToolParam(
+            function=FunctionDefinition(
+                name=tool.name(),
+                description=tool.description(),
+                parameters={
+                    "type": "object",
+                    "properties": {p.name: p.to_json_schema() for p in tool.properties()},
+                    "required": [p.name for p in filter(lambda p: p.required, tool.properties())],
+                },
+            ),
+            type="function",
+        )
 
     def _chat_completion_from_bot_message(self, message: BotMessage) -> ChatCompletionMessageParam:
-        dump = message.model_dump(mode="json")
+        # the synthetic flag is only for the library, not the API
+        dump = message.model_dump(mode="json", exclude={"synthetic"})
         match message.role:
             case BotMessageRole.FUNC:
                 return ChatCompletionFunctionMessageParam(**dump)
@@ -143,3 +604,65 @@ class OpenAIBotClient(BaseBotClient):
                 dump["tool_calls"] = tool_calls
 
                 return ChatCompletionAssistantMessageParam(**dump)
+
+
+class AsyncOpenAIBotClient(OpenAIBotClient):
+    """OpenAI client with a native asyncio implementation of arun, built on openai.AsyncOpenAI."""
+
+    @property
+    def async_client(self) -> openai.AsyncOpenAI:
+        return self.transport.async_client
+
+    @staticmethod
+    def name() -> str:
+        return "openai_async"
+
+    async def _ahandle_chat_completion(self, messages: list[BotMessage], results: BotResults):
+        out: list[BotMessage] = []
+        await adrain(self._aiter_chat_completion(messages, results, out))
+        return out
+
+    async def _aiter_chat_completion(
+        self, messages: list[BotMessage], results: BotResults, out: list[BotMessage]
+    ) -> AsyncIterator[BotEvent]:
+        request, estimate, dispatcher = self._start_chat_completion(messages, results)
+        with self._request_span(request, results) as span:
+            cache_key, completion = self._get_cached_completion(request, results)
+            span.attributes["cached"] = completion is not None
+            if completion is None and self.stream:
+                stream = _CompletionStream()
+                client = self._request_client(self.async_client)
+                # only opening the stream is retried, chunks may already have dispatched tool calls
+                chunks = await self._asend_request(
+                    lambda: self._send_chat_completion(client, request, results), results, estimate, span
+                )
+                async with chunks:
+                    with self._reading_stream(request, stream, estimate, span, results):
+                        async for chunk in chunks:
+                            event, early_calls = self._add_stream_chunk(stream, chunk, dispatcher, results)
+                            if event:
+                                yield event
+                            for call in early_calls:
+                                async for call_event in dispatcher.adispatch(call):
+                                    yield call_event
+                completion, tool_calls = self._received_stream(request, stream, estimate, span, results)
+            else:
+                if completion is None:
+                    client = self._request_client(self.async_client)
+                    response = await self._asend_request(
+                        lambda: self._send_chat_completion(client, request, results), results, estimate, span
+                    )
+                    completion = self._received_response(request, response, estimate, span, results)
+                tool_calls = completion.message.tool_calls or []
+                if completion.message.content:
+                    yield BotTokenEvent(content=completion.message.content)
+            span.attributes.update(
+                estimated_tokens=estimate, input_tokens=completion.input_tokens, output_tokens=completion.output_tokens
+            )
+        self._end_chat_completion(completion, tool_calls, dispatcher, results, cache_key)
+        for call in tool_calls:
+            async for call_event in dispatcher.adispatch(call):
+                yield call_event
+        async for call_event in dispatcher.afinish():
+            yield call_event
+        out += [completion.message, *dispatcher.messages]
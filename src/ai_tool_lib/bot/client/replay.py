@@ -0,0 +1,361 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Iterator
+
+import openai
+
+from ai_tool_lib.bot.client.openai import OpenAIBotClient
+from ai_tool_lib.bot.client.transport import OpenAITransport, httpx
+from ai_tool_lib.bot.message import BotCompletion
+from ai_tool_lib.error.bot import BotDeadlineError, BotError, BotReplayMissError
+from ai_tool_lib.utils.cache import stable_hash
+from ai_tool_lib.utils.uuid import generate_uuid
+
+REPLAY_BASE_URL = "http://replay.invalid/v1"
+""" Base URL of replayed requests, they never leave the process. """
+
+ReplayLatency = Callable[[float], float]
+""" Returns the seconds to wait before a replayed completion is returned, given the recorded latency. """
+
+MATCH_LEVELS = ("exact", "turn", "step")
+"""
+How closely a request must match a recorded one, from closest to loosest. "exact" is the whole
+normalized request, "turn" is the tools, the latest user message and the step within the turn,
+"step" is the tools and the step within the turn only.
+"""
+
+
+class Cassette:
+    """
+    Append-only file of recorded chat completions, one JSON record per line, indexed in memory by
+    normalized request hashes. Records are parsed when first replayed.
+    """
+
+    def __init__(self, path: str | os.PathLike):
+        """
+        :param path: Path of the cassette file, it is created on the first recording.
+        """
+        self.path = str(path)
+        self._records: list[dict[str, Any]] = []
+        self._completions: dict[int, BotCompletion] = {}
+        self._index: dict[tuple[str, str], list[int]] = {}
+        self._counters: dict[tuple[str, str], Iterator[int]] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    if line.strip():
+                        self._add(json.loads(line))
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def record(self, request: dict[str, Any], completion: BotCompletion, latency: float):
+        """
+        Record a completion.
+        :param request: The chat completion request that was sent.
+        :param completion: The completion received.
+        :param latency: Seconds the API took to respond.
+        """
+        record = {
+            "keys": request_keys(request),
+            "model": request.get("model"),
+            "latency": latency,
+            "completion": completion.model_dump(mode="json"),
+        }
+        line = json.dumps(record, separators=(",", ":"))
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+            self._add(record)
+
+    def match(
+        self, request: dict[str, Any], levels: tuple[str, ...] = MATCH_LEVELS
+    ) -> tuple[BotCompletion, float, str] | None:
+        """
+        Find a recorded completion for a request, returns the completion, its recorded latency and the
+        level it matched at, or None. Requests recorded more than once are answered in turn.
+        :param request: The chat completion request.
+        :param levels: Match levels to try in order.
+        """
+        keys = request_keys(request)
+        for level in levels:
+            index_key = (level, keys[level])
+            with self._lock:
+                candidates = self._index.get(index_key)
+                if not candidates:
+                    continue
+                counter = self._counters.setdefault(index_key, itertools.count())
+                i = candidates[next(counter) % len(candidates)]
+                completion = self._completions.get(i)
+                if completion is None:
+                    completion = self._completions[i] = BotCompletion.model_validate(self._records[i]["completion"])
+            return completion, self._records[i]["latency"], level
+        return None
+
+    def _add(self, record: dict[str, Any]):
+        i = len(self._records)
+        self._records.append(record)
+        for level, key in record["keys"].items():
+            self._index.setdefault((level, key), []).append(i)
+
+
+def request_keys(request: dict[str, Any]) -> dict[str, str]:
+    """
+    Hashes of a chat completion request at every match level. Tool call IDs are renumbered and
+    whitespace is collapsed, the model and sampling options are ignored.
+    :param request: The chat completion request.
+    """
+    ids: dict[str, str] = {}
+    messages = []
+    for wire_message in request["messages"]:
+        message = dict(wire_message)
+        if isinstance(message.get("content"), str):
+            message["content"] = " ".join(message["content"].split())
+        if message.get("tool_calls"):
+            message["tool_calls"] = [
+                {**t, "id": ids.setdefault(t["id"], f"call_{len(ids)}")} for t in message["tool_calls"]
+            ]
+        if message.get("tool_call_id"):
+            message["tool_call_id"] = ids.setdefault(message["tool_call_id"], f"call_{len(ids)}")
+        messages.append(message)
+    last_user = max((i for i, m in enumerate(messages) if m["role"] == "user"), default=-1)
+    step = sum(1 for m in messages[last_user + 1 :] if m["role"] == "assistant")
+    tools = sorted(t["function"]["name"] for t in request.get("tools") or [])
+    user = messages[last_user]["content"] if last_user >= 0 else None
+    return {
+        "exact": stable_hash(
+            {"messages": messages, "tools": request.get("tools"), "tool_choice": request.get("tool_choice")}
+        ),
+        "turn": stable_hash({"tools": tools, "user": user, "step": step}),
+        "step": stable_hash({"tools": tools, "step": step}),
+    }
+
+
+def recorded_latency(scale: float = 1.0) -> ReplayLatency:
+    """
+    Wait as long as the API took when the completion was recorded.
+    :param scale: Multiplier for the recorded latency.
+    """
+    return lambda recorded: recorded * scale
+
+
+def lognormal_latency(median: float, sigma: float = 0.5, seed: int | None = None) -> ReplayLatency:
+    """
+    Wait a log-normally distributed time, the usual shape of model latencies with a long tail.
+    :param median: Median latency in seconds.
+    :param sigma: Standard deviation of the latency's logarithm, larger values give a longer tail.
+    :param seed: Seed for reproducible latencies.
+    """
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def latency(_recorded: float) -> float:
+        with lock:
+            return median * rng.lognormvariate(0, sigma)
+
+    return latency
+
+
+class ReplayTransport(OpenAITransport):
+    """
+    Transport whose HTTP layer answers chat completion requests from a cassette instead of the network, so
+    the OpenAI clients built on it parse and stream replayed completions like real ones.
+    """
+
+    def __init__(
+        self,
+        cassette: Cassette,
+        latency: float | ReplayLatency | None = None,
+        match_levels: tuple[str, ...] = MATCH_LEVELS,
+        on_replay: Callable[[str], None] | None = None,
+    ):
+        """
+        :param cassette: The cassette.
+        :param latency: Simulated model latency, seconds or a distribution such as lognormal_latency.
+            None for no delay.
+        :param match_levels: How closely requests must match recorded ones, see MATCH_LEVELS.
+        :param on_replay: Called with the match level of every replayed completion.
+        """
+        super().__init__(api_key="replay", base_url=REPLAY_BASE_URL, max_retries=0)
+        self.cassette = cassette
+        self.latency = latency
+        self.match_levels = match_levels
+        self.on_replay = on_replay
+
+    def replay(self, request: Any) -> tuple[float, Any]:
+        """
+        Match an HTTP request of a chat completion, returns the seconds to wait and then the HTTP response, or
+        the error to raise when the request times out first.
+        :param request: The HTTP request.
+        """
+        body = json.loads(request.read())
+        match = self.cassette.match(body, self.match_levels)
+        if match is None:
+            err_msg = "no recorded completion matches the request"
+            raise BotReplayMissError(err_msg)
+        completion, recorded, level = match
+        if self.on_replay:
+            self.on_replay(level)
+        delay = (self.latency(recorded) if callable(self.latency) else self.latency) or 0.0
+        timeout = (request.extensions.get("timeout") or {}).get("read")
+        if timeout is not None and delay > timeout:
+            # like the API the request times out, after waiting for it
+            err_msg = f"replayed completion takes {delay:g} seconds, the request timed out after {timeout:g} seconds"
+            return timeout, BotDeadlineError(err_msg)
+        if body.get("stream"):
+            content = b"".join(
+                b"data: " + json.dumps(c).encode() + b"\n\n" for c in _completion_chunks(body, completion)
+            )
+            return delay, httpx.Response(
+                200, headers={"content-type": "text/event-stream"}, content=content + b"data: [DONE]\n\n"
+            )
+        return delay, httpx.Response(200, json=_completion_body(body, completion))
+
+    def _create_http_transport(self) -> Any:
+        return _ReplayHTTPTransport(self.replay)
+
+    def _create_async_http_transport(self) -> Any:
+        return _AsyncReplayHTTPTransport(self.replay)
+
+
+class _ReplayHTTPTransport(httpx.BaseTransport):
+    def __init__(self, replay: Callable[[Any], tuple[float, Any]]):
+        self.replay = replay
+
+    def handle_request(self, request: Any) -> Any:
+        delay, response = self.replay(request)
+        if delay:
+            time.sleep(delay)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class _AsyncReplayHTTPTransport(httpx.AsyncBaseTransport):
+    def __init__(self, replay: Callable[[Any], tuple[float, Any]]):
+        self.replay = replay
+
+    async def handle_async_request(self, request: Any) -> Any:
+        delay, response = self.replay(request)
+        if delay:
+            await asyncio.sleep(delay)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def _completion_message(completion: BotCompletion) -> dict[str, Any]:
+    # tool call IDs must be unique within a session, recorded ones may be replayed more than once
+    tool_calls = [
+        {"id": f"call_{generate_uuid()}", "type": "function", "function": {"name": t.name, "arguments": t.args}}
+        for t in completion.message.tool_calls or []
+    ]
+    return {"role": "assistant", "content": completion.message.content, "tool_calls": tool_calls or None}
+
+
+def _completion_usage(completion: BotCompletion) -> dict[str, int]:
+    return {
+        "prompt_tokens": completion.input_tokens,
+        "completion_tokens": completion.output_tokens,
+        "total_tokens": completion.input_tokens + completion.output_tokens,
+    }
+
+
+def _completion_body(request: dict[str, Any], completion: BotCompletion) -> dict[str, Any]:
+    message = _completion_message(completion)
+    return {
+        "id": f"replay-{generate_uuid()}",
+        "created": int(time.time()),
+        "model": request["model"],
+        "object": "chat.completion",
+        "choices": [
+            {"index": 0, "finish_reason": "tool_calls" if message["tool_calls"] else "stop", "message": message}
+        ],
+        "usage": _completion_usage(completion),
+    }
+
+
+def _completion_chunks(request: dict[str, Any], completion: BotCompletion) -> list[dict[str, Any]]:
+    message = _completion_message(completion)
+    base = {
+        "id": f"replay-{generate_uuid()}",
+        "created": int(time.time()),
+        "model": request["model"],
+        "object": "chat.completion.chunk",
+    }
+    deltas = [
+        {"role": "assistant", "content": message["content"]},
+        *({"tool_calls": [{"index": i, **t}]} for i, t in enumerate(message["tool_calls"] or [])),
+    ]
+    return [
+        *({**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]} for delta in deltas),
+        {**base, "choices": [], "usage": _completion_usage(completion)},
+    ]
+
+
+class ReplayBotClient(OpenAIBotClient):
+    """
+    Answers chat completions from a cassette recorded with OpenAIBotClient, without a network or model.
+    Requests are built, sent, budgeted and traced like the OpenAI client's, a ReplayTransport answers them,
+    so tools, session stores and the library itself can be load tested and profiled under recorded model
+    behavior.
+    """
+
+    def __init__(
+        self,
+        cassette: Cassette | str | os.PathLike,
+        model: str = "replay",
+        latency: float | ReplayLatency | None = None,
+        match_levels: tuple[str, ...] = MATCH_LEVELS,
+        **kwargs,
+    ):
+        """
+        :param cassette: The cassette, or the path of its file.
+        :param model: Model name sent with requests, it is not used for matching.
+        :param latency: Simulated model latency, seconds or a distribution such as lognormal_latency.
+            None for no delay.
+        :param match_levels: How closely requests must match recorded ones, see MATCH_LEVELS. Use ("exact",) to
+            fail on any request that was not recorded.
+        :param kwargs: OpenAIBotClient options, e.g. stream to replay completions as streams of chunks.
+        """
+        cassette = cassette if isinstance(cassette, Cassette) else Cassette(cassette)
+        transport = ReplayTransport(cassette, latency, match_levels, on_replay=self._replayed)
+        super().__init__(
+            api_key=transport.api_key, base_url=transport.base_url, model=model, transport=transport, **kwargs
+        )
+        self.cassette = cassette
+        self._log("Using replay client.", cassette=self.cassette.path, records=len(self.cassette))
+
+    @staticmethod
+    def name() -> str:
+        return "replay"
+
+    def _is_retryable_error(self, e: Exception) -> bool:  # noqa: ARG002
+        return False
+
+    def _create_chat_completion(
+        self, client: openai.OpenAI | openai.AsyncOpenAI, request: dict[str, Any], timeout: float | None = None
+    ) -> Any:
+        try:
+            return super()._create_chat_completion(client, request, timeout)
+        except openai.APIConnectionError as e:
+            # SDK releases that wrap any error of the HTTP layer as a connection error would hide replay errors
+            if isinstance(e.__cause__, BotError):
+                raise e.__cause__ from None
+            raise
+
+    def _replayed(self, match_level: str):
+        self._log("Replay completion.", level=logging.DEBUG, match_level=match_level)
@@ -0,0 +1,298 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import threading
+import weakref
+from typing import Any, Callable
+
+import openai
+from pydantic import BaseModel
+
+
+def _sdk_http_module() -> Any:
+    # the HTTP library the openai SDK is built on, httpx or httpx2 in newer releases, is the one its default client
+    # subclasses
+    base = next(c for c in openai.DefaultHttpxClient.__mro__ if not c.__module__.startswith("openai"))
+    return sys.modules[base.__module__.partition(".")[0]]
+
+
+# typed as Any, which library it is is only known at runtime
+httpx: Any = _sdk_http_module()
+
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+
+_transports: dict[tuple[str | None, str], OpenAITransport] = {}
+_transports_lock = threading.Lock()
+
+
+class TransportStats(BaseModel):
+    """Connection pool statistics of a transport, the sync and async pools are summed."""
+
+    requests: int = 0
+    """ Number of HTTP requests sent. """
+
+    connects: int = 0
+    """ Number of new TCP connections, a high rate compared to requests means the pool is too small or expires connections too soon. """
+
+    tls_handshakes: int = 0
+    """ Number of TLS handshakes. """
+
+    open_connections: int = 0
+    """ Number of connections currently in the pool. """
+
+    idle_connections: int = 0
+    """ Number of pooled connections waiting for a request. """
+
+    max_connections: int = 0
+    """ Configured maximum number of connections per pool. """
+
+
+class OpenAITransport:
+    """
+    HTTP connection pool and OpenAI API clients for one endpoint and API key, shared by any
+    number of bot clients so connections and TLS sessions are reused between conversations.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str | None = None,
+        *,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        max_keepalive_connections: int = DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY,
+        http2: bool = False,
+        timeout: float | openai.Timeout | None = None,
+        max_retries: int = openai.DEFAULT_MAX_RETRIES,
+    ):
+        """
+        :param api_key: OpenAI API key.
+        :param base_url: Base URL of an OpenAI compatible API.
+        :param max_connections: Maximum number of concurrent connections.
+        :param max_keepalive_connections: Maximum number of idle connections kept open.
+        :param keepalive_expiry: Seconds an idle connection is kept open.
+        :param http2: Use HTTP/2 when the server supports it, requires the h2 package.
+        :param timeout: Request timeout in seconds, defaults to the OpenAI client's.
+        :param max_retries: Number of retries the OpenAI client makes on connection errors and rate limits.
+        """
+        self.api_key = api_key
+        self.base_url = base_url
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2
+        self.timeout = timeout if timeout is not None else openai.DEFAULT_TIMEOUT
+        self.max_retries = max_retries
+        self._stats = TransportStats(max_connections=max_connections)
+        self._stats_lock = threading.Lock()
+        self._client: openai.OpenAI | None = None
+        self._http_transport: Any = None
+        # async connections belong to the event loop that opened them
+        self._async_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, tuple[openai.AsyncOpenAI, Any]] = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_client(cls, client: openai.OpenAI) -> OpenAITransport:
+        """
+        Wrap an existing OpenAI client, its requests and connections are not counted in the stats.
+        Async clients are created with its API key, base URL, timeout and retries.
+        :param client: The OpenAI client.
+        """
+        transport = cls(
+            api_key=client.api_key,
+            base_url=str(client.base_url),
+            timeout=client.timeout,
+            max_retries=client.max_retries,
+        )
+        transport._client = client
+        return transport
+
+    @property
+    def client(self) -> openai.OpenAI:
+        """The shared OpenAI client."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    transport = self._http_transport = self._create_http_transport()
+                    self._client = openai.OpenAI(
+                        api_key=self.api_key,
+                        base_url=self.base_url,
+                        timeout=self.timeout,
+                        max_retries=self.max_retries,
+                        http_client=openai.DefaultHttpxClient(
+                            transport=_CountingTransport(transport, self._count_request, self._trace),
+                            timeout=self.timeout,
+                        ),
+                    )
+        return self._client
+
+    @property
+    def async_client(self) -> openai.AsyncOpenAI:
+        """The shared OpenAI async client for the running event loop."""
+        loop = asyncio.get_running_loop()
+        entry = self._async_clients.get(loop)
+        if entry is None:
+            with self._lock:
+                entry = self._async_clients.get(loop)
+                if entry is None:
+                    # the connections of finished loops cannot be reused or closed, forget them
+                    for closed in [lp for lp in self._async_clients if lp.is_closed()]:
+                        del self._async_clients[closed]
+                    transport = self._create_async_http_transport()
+                    client = openai.AsyncOpenAI(
+                        api_key=self.api_key,
+                        base_url=self.base_url,
+                        timeout=self.timeout,
+                        max_retries=self.max_retries,
+                        http_client=openai.DefaultAsyncHttpxClient(
+                            transport=_AsyncCountingTransport(transport, self._count_request, self._trace),
+                            timeout=self.timeout,
+                        ),
+                    )
+                    entry = self._async_clients[loop] = (client, transport)
+        return entry[0]
+
+    def stats(self) -> TransportStats:
+        """Current connection pool statistics."""
+        with self._stats_lock:
+            stats = self._stats.model_copy()
+        transports = [self._http_transport]
+        transports += [t for loop, (_, t) in list(self._async_clients.items()) if not loop.is_closed()]
+        for transport in transports:
+            connections = _pool_connections(transport)
+            stats.open_connections += len(connections)
+            stats.idle_connections += sum(1 for c in connections if c.is_idle())
+        return stats
+
+    def close(self):
+        """Close the sync client and its connections. Async clients are closed with their event loop."""
+        with self._lock:
+            if self._client:
+                self._client.close()
+                self._client = None
+                self._http_transport = None
+
+    def _create_http_transport(self) -> Any:
+        return httpx.HTTPTransport(limits=self.limits, http2=self.http2)
+
+    def _create_async_http_transport(self) -> Any:
+        return httpx.AsyncHTTPTransport(limits=self.limits, http2=self.http2)
+
+    def _trace(self, event_name: str, _info: dict):
+        if event_name == "connection.connect_tcp.complete":
+            with self._stats_lock:
+                self._stats.connects += 1
+        elif event_name == "connection.start_tls.complete":
+            with self._stats_lock:
+                self._stats.tls_handshakes += 1
+
+    def _count_request(self):
+        with self._stats_lock:
+            self._stats.requests += 1
+
+
+def _pool_connections(transport: Any) -> list[Any]:
+    # the HTTP library does not expose its connection pool publicly, it reads as empty if that changes
+    connections = getattr(getattr(transport, "_pool", None), "connections", None)
+    if not isinstance(connections, (list, tuple)):
+        return []
+    return [c for c in connections if callable(getattr(c, "is_idle", None))]
+
+
+class _CountingTransport(httpx.BaseTransport):
+    def __init__(self, transport: Any, on_request: Callable[[], None], on_trace: Callable[[str, dict], None]):
+        self.transport = transport
+        self.on_request = on_request
+        self.on_trace = on_trace
+
+    def handle_request(self, request: Any) -> Any:
+        self.on_request()
+        on_trace = self.on_trace
+        trace = request.extensions.get("trace")
+
+        def chained_trace(event_name: str, info: dict):
+            on_trace(event_name, info)
+            if trace:
+                trace(event_name, info)
+
+        request.extensions["trace"] = chained_trace
+        return self.transport.handle_request(request)
+
+    def close(self):
+        self.transport.close()
+
+
+class _AsyncCountingTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport: Any, on_request: Callable[[], None], on_trace: Callable[[str, dict], None]):
+        self.transport = transport
+        self.on_request = on_request
+        self.on_trace = on_trace
+
+    async def handle_async_request(self, request: Any) -> Any:
+        self.on_request()
+        on_trace = self.on_trace
+        trace = request.extensions.get("trace")
+
+        async def chained_trace(event_name: str, info: dict):
+            on_trace(event_name, info)
+            if trace:
+                await trace(event_name, info)
+
+        request.extensions["trace"] = chained_trace
+        return await self.transport.handle_async_request(request)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def get_transport(api_key: str, base_url: str | None = None, **kwargs) -> OpenAITransport:
+    """
+    Get the process wide transport for an endpoint and API key, creating it on first use.
+    Options are only applied when the transport is created.
+    :param api_key: OpenAI API key.
+    :param base_url: Base URL of an OpenAI compatible API.
+    :param kwargs: OpenAITransport options.
+    """
+    key = (base_url, api_key)
+    transport = _transports.get(key)
+    if transport is None:
+        with _transports_lock:
+            transport = _transports.get(key)
+            if transport is None:
+                transport = _transports[key] = OpenAITransport(api_key=api_key, base_url=base_url, **kwargs)
+    return transport
+
+
+def close_transport(api_key: str, base_url: str | None = None) -> bool:
+    """
+    Close and forget the process wide transport for an endpoint and API key, the next get_transport creates a
+    new one. Bot clients still holding it open new connections on their next request.
+    :param api_key: OpenAI API key.
+    :param base_url: Base URL of an OpenAI compatible API.
+    :return: Whether there was a transport to close.
+    """
+    with _transports_lock:
+        transport = _transports.pop((base_url, api_key), None)
+    if transport is None:
+        return False
+    transport.close()
+    return True
+
+
+def close_transports():
+    """Close and forget every process wide transport."""
+    with _transports_lock:
+        for transport in _transports.values():
+            transport.close()
+        _transports.clear()
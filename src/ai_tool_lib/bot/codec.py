@@ -0,0 +1,398 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+"""
+Compact binary encoding of BotSession and BotResults.
+
+Data is stored column by column rather than message by message: all roles, then all contents
+and so on. Roles and tool names are interned in a string table, strings are stored as one
+UTF-8 blob with a length column, and datetimes as integer microseconds. Each column is a
+single array or blob so encoding and decoding stay close to C speed, and sections can be
+decoded on their own, e.g. the response of a BotResults without its session.
+
+Layout: magic "ATLC", version, kind and section count bytes, a little endian u32 length per
+section, then the sections. Columns within a section are each prefixed by a u32 length.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import datetime as dt
+import functools
+import json
+import struct
+import sys
+from array import array
+from typing import Any, Iterator
+
+from pydantic import TypeAdapter
+
+from ai_tool_lib.bot.message import BotMessage, BotMessageRole
+from ai_tool_lib.bot.results import BotResults, BotToolCall
+from ai_tool_lib.bot.session import BotSession
+from ai_tool_lib.bot.tool.response import ToolBotResponse, ToolUserResponse
+from ai_tool_lib.error.codec import CodecError
+
+MAGIC = b"ATLC"
+VERSION = 2
+""" Incremented whenever the layout changes, data from other versions is rejected. """
+
+KIND_SESSION = 1
+KIND_RESULTS = 2
+
+_HEADER = struct.Struct("<4sBBB")
+_U32 = struct.Struct("<I")
+_BIG_ENDIAN = sys.byteorder == "big"
+_EPOCH = dt.datetime(1970, 1, 1, tzinfo=dt.timezone.utc)
+_MICROSECOND = dt.timedelta(microseconds=1)
+_NO_DATETIME = -(2**63)
+_MAX_INTERNED = 2**16
+_MESSAGES = TypeAdapter(list[BotMessage])
+_TOOL_CALLS = TypeAdapter(list[BotToolCall])
+
+
+def encode_session(session: BotSession) -> bytes:
+    """
+    Encode a session.
+    :param session: The session.
+    """
+    intern = _Interner()
+    session_section = _encode_session(session, intern)
+    return _pack(KIND_SESSION, [intern.encode(), session_section])
+
+
+def decode_session(data: bytes | memoryview, last: int | None = None) -> BotSession:
+    """
+    Decode a session.
+    :param data: Encoded session.
+    :param last: Only materialize the last number of messages, the leading system messages are always kept.
+    """
+    strings, session = _unpack(data, KIND_SESSION)
+    with _decoding():
+        return _decode_session(session, _decode_strings(strings), last)
+
+
+def encode_results(results: BotResults) -> bytes:
+    """
+    Encode results, including their session.
+    :param results: The results.
+    """
+    intern = _Interner()
+    sections = [
+        _encode_json(results.model_dump(mode="json", exclude={"tool_calls", "session"})),
+        # the final response is duplicated so it can be read without decoding every tool call
+        _encode_json(results.response.model_dump(mode="json") if results.response else None),
+        _encode_tool_calls(results.tool_calls, intern),
+        _encode_session(results.session, intern),
+    ]
+    return _pack(KIND_RESULTS, [intern.encode(), *sections])
+
+
+def decode_results(data: bytes | memoryview) -> BotResults:
+    """
+    Decode results.
+    :param data: Encoded results.
+    """
+    return BotResultsView(data).results()
+
+
+class BotResultsView:
+    """
+    Lazily decoded results, each part is decoded the first time it is used.
+    Reading the response does not decode the session.
+    """
+
+    def __init__(self, data: bytes | memoryview):
+        """
+        :param data: Encoded results, it is referenced rather than copied.
+        """
+        self._strings, self._meta, self._response, self._tool_calls, self._session = _unpack(data, KIND_RESULTS)
+
+    @functools.cached_property
+    def meta(self) -> dict[str, Any]:
+        """Every field of the results except the tool calls and session, as JSON values."""
+        with _decoding():
+            return json.loads(bytes(self._meta))
+
+    @functools.cached_property
+    def tool_calls(self) -> list[BotToolCall]:
+        with _decoding():
+            return _decode_tool_calls(self._tool_calls, self.strings)
+
+    @functools.cached_property
+    def response(self) -> ToolUserResponse | None:
+        with _decoding():
+            data = json.loads(bytes(self._response))
+            return ToolUserResponse.model_validate(data) if data else None
+
+    @property
+    def response_data(self) -> dict[str, Any]:
+        resp = self.response
+        return resp.data if resp and resp.data else {}
+
+    @functools.cached_property
+    def strings(self) -> list[str]:
+        with _decoding():
+            return _decode_strings(self._strings)
+
+    def session(self, last: int | None = None) -> BotSession:
+        """
+        Decode the session.
+        :param last: Only materialize the last number of messages, the leading system messages are always kept.
+        """
+        with _decoding():
+            return _decode_session(self._session, self.strings, last)
+
+    def results(self) -> BotResults:
+        """Decode the full results."""
+        with _decoding():
+            return BotResults.model_validate({**self.meta, "tool_calls": self.tool_calls, "session": self.session()})
+
+
+class _Interner:
+    def __init__(self):
+        self.index: dict[str, int] = {}
+
+    def __call__(self, value: str) -> int:
+        i = self.index.get(value)
+        if i is None:
+            i = self.index[value] = len(self.index)
+            if i >= _MAX_INTERNED:
+                err_msg = "too many distinct roles and tool names to encode"
+                raise CodecError(err_msg)
+        return i
+
+    def encode(self) -> bytes:
+        w = _Writer()
+        w.strs(list(self.index))
+        return w.getvalue()
+
+
+class _Writer:
+    def __init__(self):
+        self.parts: list[bytes] = []
+
+    def write_bytes(self, value: bytes):
+        self.parts += (_U32.pack(len(value)), value)
+
+    def json(self, value: Any):
+        self.write_bytes(json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode())
+
+    def array(self, typecode: str, values: list[int]):
+        a = array(typecode, values)
+        if _BIG_ENDIAN:
+            a.byteswap()
+        self.write_bytes(a.tobytes())
+
+    def strs(self, values: list[str | None]):
+        # lengths are in characters so the decoded blob can be sliced without re-encoding, -1 is None
+        self.array("i", [-1 if v is None else len(v) for v in values])
+        self.write_bytes("".join([v for v in values if v]).encode())
+
+    def datetimes(self, values: list[dt.datetime | None]):
+        self.array("q", [_NO_DATETIME if v is None else _to_micros(v) for v in values])
+
+    def getvalue(self) -> bytes:
+        return b"".join(self.parts)
+
+
+class _Reader:
+    def __init__(self, buf: memoryview):
+        self.buf = buf
+        self.pos = 0
+
+    def read_bytes(self) -> memoryview:
+        (size,) = _U32.unpack_from(self.buf, self.pos)
+        start = self.pos + _U32.size
+        self.pos = start + size
+        if self.pos > len(self.buf):
+            err_msg = "encoded data is truncated"
+            raise CodecError(err_msg)
+        return self.buf[start : self.pos]
+
+    def json(self) -> Any:
+        return json.loads(bytes(self.read_bytes()))
+
+    def array(self, typecode: str) -> array:
+        a = array(typecode)
+        a.frombytes(self.read_bytes())
+        if _BIG_ENDIAN:
+            a.byteswap()
+        return a
+
+    def strs(self) -> list[str | None]:
+        lengths = self.array("i")
+        text = str(self.read_bytes(), "utf-8")
+        out: list[str | None] = []
+        offset = 0
+        for length in lengths:
+            if length < 0:
+                out.append(None)
+                continue
+            out.append(text[offset : offset + length])
+            offset += length
+        return out
+
+    def datetimes(self) -> list[dt.datetime | None]:
+        return [None if v == _NO_DATETIME else _EPOCH + v * _MICROSECOND for v in self.array("q")]
+
+
+def _encode_json(value: Any) -> bytes:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def _encode_session(session: BotSession, intern: _Interner) -> bytes:
+    w = _Writer()
+    w.json(session.model_dump(mode="json", exclude={"messages"}))
+    messages = session.messages
+    w.array("H", [intern(m.role.value) for m in messages])
+    w.strs([m.content for m in messages])
+    w.strs([m.tool_call_id for m in messages])
+    w.array("B", [m.synthetic for m in messages])
+    calls = [m.tool_calls for m in messages]
+    w.array("i", [-1 if c is None else len(c) for c in calls])
+    flat = [t for c in calls if c for t in c]
+    w.strs([t.id for t in flat])
+    w.array("H", [intern(t.name) for t in flat])
+    w.strs([t.args for t in flat])
+    return w.getvalue()
+
+
+def _decode_session(buf: memoryview, strings: list[str], last: int | None) -> BotSession:
+    r = _Reader(buf)
+    header = r.json()
+    roles = r.array("H")
+    contents = r.strs()
+    tool_call_ids = r.strs()
+    synthetic = r.array("B")
+    counts = r.array("i")
+    call_ids = r.strs()
+    call_names = r.array("H")
+    call_args = r.strs()
+    role_enums = {i: BotMessageRole(strings[i]) for i in set(roles)}
+
+    # message indexes to materialize
+    indexes: range | list[int] = range(len(roles))
+    if last is not None:
+        head = 0
+        while head < len(roles) and role_enums[roles[head]] == BotMessageRole.SYSTEM:
+            head += 1
+        start = max(head, len(roles) - last)
+        # a tool message cannot be sent without the bot message that requested it
+        while start < len(roles) and start > head and role_enums[roles[start]] == BotMessageRole.TOOL:
+            start += 1
+        indexes = [*range(head), *range(start, len(roles))]
+
+    # offset of each message's tool calls in the flattened columns
+    offsets = [0] * (len(counts) + 1)
+    for i, count in enumerate(counts):
+        offsets[i + 1] = offsets[i] + max(count, 0)
+
+    # validating plain dicts in bulk is faster than constructing the models one by one
+    messages = _MESSAGES.validate_python(
+        [
+            {
+                "role": role_enums[roles[i]],
+                "content": contents[i],
+                "tool_calls": None
+                if counts[i] < 0
+                else [
+                    {"id": call_ids[j], "name": strings[call_names[j]], "args": call_args[j]}
+                    for j in range(offsets[i], offsets[i + 1])
+                ],
+                "tool_call_id": tool_call_ids[i],
+                "synthetic": bool(synthetic[i]),
+            }
+            for i in indexes
+        ]
+    )
+    return BotSession.model_validate({**header, "messages": messages})
+
+
+def _encode_tool_calls(tool_calls: list[BotToolCall], intern: _Interner) -> bytes:
+    w = _Writer()
+    w.array("H", [intern(c.tool) for c in tool_calls])
+    w.json([c.args for c in tool_calls])
+    responses = [c.response for c in tool_calls]
+    w.array("B", [isinstance(r, ToolUserResponse) for r in responses])
+    w.datetimes([r.created for r in responses])
+    w.strs([r.content if isinstance(r, ToolBotResponse) else None for r in responses])
+    w.json([r.data for r in responses])
+    return w.getvalue()
+
+
+def _decode_tool_calls(buf: memoryview, strings: list[str]) -> list[BotToolCall]:
+    r = _Reader(buf)
+    names = r.array("H")
+    args = r.json()
+    is_user = r.array("B")
+    created = r.datetimes()
+    contents = r.strs()
+    data = r.json()
+    return _TOOL_CALLS.validate_python(
+        [
+            {
+                "tool": strings[name],
+                "args": args[i],
+                "response": {"type": "user" if is_user[i] else "bot", "created": created[i], "data": data[i]}
+                | ({} if is_user[i] else {"content": contents[i]}),
+            }
+            for i, name in enumerate(names)
+        ]
+    )
+
+
+def _decode_strings(buf: memoryview) -> list[str]:
+    # interned strings are never None
+    return [s or "" for s in _Reader(buf).strs()]
+
+
+def _to_micros(value: dt.datetime) -> int:
+    # naive datetimes are taken to be UTC, all datetimes decode as UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=dt.timezone.utc)
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def _pack(kind: int, sections: list[bytes]) -> bytes:
+    return b"".join(
+        [_HEADER.pack(MAGIC, VERSION, kind, len(sections)), *(_U32.pack(len(s)) for s in sections), *sections]
+    )
+
+
+def _unpack(data: bytes | memoryview, kind: int) -> list[memoryview]:
+    buf = memoryview(data)
+    with _decoding():
+        magic, version, data_kind, count = _HEADER.unpack_from(buf)
+        if magic != MAGIC:
+            err_msg = "data was not encoded by this codec"
+            raise CodecError(err_msg)
+        if version != VERSION:
+            err_msg = f"unsupported codec version {version}, expected {VERSION}"
+            raise CodecError(err_msg)
+        if data_kind != kind:
+            err_msg = f"encoded data is of kind {data_kind}, expected {kind}"
+            raise CodecError(err_msg)
+        pos = _HEADER.size + count * _U32.size
+        sections = []
+        for i in range(count):
+            (size,) = _U32.unpack_from(buf, _HEADER.size + i * _U32.size)
+            sections.append(buf[pos : pos + size])
+            pos += size
+        if pos > len(buf):
+            err_msg = "encoded data is truncated"
+            raise CodecError(err_msg)
+    return sections
+
+
+@contextlib.contextmanager
+def _decoding() -> Iterator[None]:
+    # malformed data surfaces as whatever error the decoder hits first
+    try:
+        yield
+    except CodecError:
+        raise
+    except (struct.error, UnicodeDecodeError, ValueError, IndexError, KeyError, TypeError) as e:
+        err_msg = f"encoded data is malformed: {e!s}"
+        raise CodecError(err_msg) from e
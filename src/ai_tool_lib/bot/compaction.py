@@ -0,0 +1,259 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+from __future__ import annotations
+
+from abc import abstractmethod
+from collections import OrderedDict
+from functools import partial
+from typing import TYPE_CHECKING, Callable
+
+from ai_tool_lib.bot.message import BotMessage, BotMessageRole
+
+if TYPE_CHECKING:
+    import openai
+
+    from ai_tool_lib.bot.results import BotResults
+    from ai_tool_lib.bot.tokens import BaseTokenEstimator
+
+DEFAULT_TOOL_OUTPUT_STUB = "(Tool output removed to save space. Call the tool again if you need it.)"
+
+DEFAULT_SUMMARY_PROMPT = """
+Summarize the following conversation between a user and an assistant that uses tools.
+Keep every fact, decision and tool result the assistant may still need. Be concise.
+"""
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+MEMO_SIZE = 4096
+""" Number of derived messages each compactor keeps so repeated compactions return the same objects. """
+
+
+class BaseCompactor:
+    """
+    Reduces the messages sent to the bot. The session history is never changed, only the
+    messages sent with a single request. Compactors must keep every tool message paired with
+    the bot message that requested it.
+    """
+
+    def __init__(self):
+        # derived messages are reused so their serialized form and token counts stay cached
+        self._memo: OrderedDict[tuple, tuple[object, BotMessage]] = OrderedDict()
+
+    @abstractmethod
+    def compact(
+        self, messages: list[BotMessage], estimator: BaseTokenEstimator, budget: int | None = None
+    ) -> list[BotMessage]:
+        """
+        Compact the messages of a request.
+        :param messages: Chat history with LLM.
+        :param estimator: Token estimator.
+        :param budget: Number of tokens the messages should fit in, if known.
+        """
+        ...
+
+    def hook(self, estimator: BaseTokenEstimator) -> Callable[[list[BotMessage], int, BotResults], list[BotMessage]]:
+        """
+        Use the compactor as a BaseBotClient on_token_limit hook, so it only runs when a request is too big.
+        :param estimator: Token estimator, should be the client's.
+        """
+        return lambda messages, budget, _: self.compact(messages, estimator, budget)
+
+    def _derive(self, key: tuple, source: object, make: Callable[[], BotMessage]) -> BotMessage:
+        entry = self._memo.get(key)
+        # the source is kept alive with the entry so the ids in its key cannot be reused by other messages
+        if entry is None:
+            entry = self._memo[key] = (source, make())
+            while len(self._memo) > MEMO_SIZE:
+                self._memo.popitem(last=False)
+        self._memo.move_to_end(key)
+        return entry[1]
+
+
+class SlidingWindowCompactor(BaseCompactor):
+    """Keeps the leading system messages and the last turns, a turn starts at each user prompt."""
+
+    def __init__(self, max_turns: int = 10):
+        """
+        :param max_turns: Number of turns to keep.
+        """
+        super().__init__()
+        self.max_turns = max_turns
+
+    # the strategy counts turns, it needs neither the estimator nor the budget
+    def compact(
+        self,
+        messages: list[BotMessage],
+        estimator: BaseTokenEstimator,  # noqa: ARG002
+        budget: int | None = None,  # noqa: ARG002
+    ) -> list[BotMessage]:
+        head, turns = split_turns(messages)
+        return [*head, *(m for turn in turns[-self.max_turns :] for m in turn)]
+
+
+class ToolOutputCompactor(BaseCompactor):
+    """Replaces the content of old or large tool outputs with a stub, the tool messages themselves are kept."""
+
+    def __init__(self, keep_turns: int = 2, max_chars: int | None = None, stub: str = DEFAULT_TOOL_OUTPUT_STUB):
+        """
+        :param keep_turns: Tool outputs in this many of the latest turns are kept in full.
+        :param max_chars: Tool outputs in the latest turns longer than this are stubbed as well.
+        :param stub: Content of stubbed tool messages.
+        """
+        super().__init__()
+        self.keep_turns = keep_turns
+        self.max_chars = max_chars
+        self.stub = stub
+
+    # the strategy counts turns, it needs neither the estimator nor the budget
+    def compact(
+        self,
+        messages: list[BotMessage],
+        estimator: BaseTokenEstimator,  # noqa: ARG002
+        budget: int | None = None,  # noqa: ARG002
+    ) -> list[BotMessage]:
+        head, turns = split_turns(messages)
+        keep_from = len(turns) - self.keep_turns
+        out = list(head)
+        for i, turn in enumerate(turns):
+            for m in turn:
+                if m.role == BotMessageRole.TOOL and self._should_stub(m, old=i < keep_from):
+                    out.append(self._derive(("stub", id(m)), m, partial(m.model_copy, update={"content": self.stub})))
+                else:
+                    out.append(m)
+        return out
+
+    def _should_stub(self, message: BotMessage, *, old: bool) -> bool:
+        content = message.content or ""
+        if len(content) <= len(self.stub):
+            return False
+        return old or (self.max_chars is not None and len(content) > self.max_chars)
+
+
+class SummaryCompactor(BaseCompactor):
+    """
+    Replaces older turns with a single summary message once the history grows too big.
+    Summaries are remembered so each span of history is only summarized once.
+    """
+
+    def __init__(
+        self,
+        summarize: Callable[[list[BotMessage]], str] | None = None,
+        keep_turns: int = 2,
+        trigger_tokens: int | None = None,
+    ):
+        """
+        :param summarize: Summarizes messages, defaults to an extractive summary. See chat_summarizer for an LLM summary.
+        :param keep_turns: Number of the latest turns that are never summarized.
+        :param trigger_tokens: Summarize once the messages are estimated to exceed this, otherwise only when over the budget.
+        """
+        super().__init__()
+        self.summarize = summarize or extractive_summary
+        self.keep_turns = keep_turns
+        self.trigger_tokens = trigger_tokens
+
+    def compact(
+        self, messages: list[BotMessage], estimator: BaseTokenEstimator, budget: int | None = None
+    ) -> list[BotMessage]:
+        limits = [t for t in (budget, self.trigger_tokens) if t]
+        if not limits or estimator.count_messages(messages) <= min(limits):
+            return messages
+        head, turns = split_turns(messages)
+        if len(turns) <= self.keep_turns:
+            return messages
+        older = [m for turn in turns[: len(turns) - self.keep_turns] for m in turn]
+        newer = [m for turn in turns[len(turns) - self.keep_turns :] for m in turn]
+        summary = self._derive(
+            ("summary", *(id(m) for m in older)),
+            older,
+            lambda: BotMessage(role=BotMessageRole.SYSTEM, content=SUMMARY_PREFIX + self.summarize(older)),
+        )
+        return [*head, summary, *newer]
+
+
+class ChainCompactor(BaseCompactor):
+    """Applies compactors in order, stopping once the messages fit the budget."""
+
+    def __init__(self, *compactors: BaseCompactor):
+        """
+        :param compactors: Compactors from least to most lossy.
+        """
+        super().__init__()
+        self.compactors = compactors
+
+    def compact(
+        self, messages: list[BotMessage], estimator: BaseTokenEstimator, budget: int | None = None
+    ) -> list[BotMessage]:
+        for compactor in self.compactors:
+            messages = compactor.compact(messages, estimator, budget)
+            if budget is not None and estimator.count_messages(messages) <= budget:
+                break
+        return messages
+
+
+def split_turns(messages: list[BotMessage]) -> tuple[list[BotMessage], list[list[BotMessage]]]:
+    """
+    Split messages into the leading system messages and turns, a turn starts at each user prompt.
+    Synthetic user messages, such as retry prompts, stay in the turn of the prompt they follow, as do
+    tool messages with the bot message that requested them.
+    :param messages: Chat history with LLM.
+    """
+    i = 0
+    while i < len(messages) and messages[i].role == BotMessageRole.SYSTEM:
+        i += 1
+    turns: list[list[BotMessage]] = []
+    for m in messages[i:]:
+        if (m.role == BotMessageRole.USER and not m.synthetic) or not turns:
+            turns.append([])
+        turns[-1].append(m)
+    return messages[:i], turns
+
+
+def extractive_summary(messages: list[BotMessage], max_chars: int = 300) -> str:
+    """
+    Summarize messages without a bot by keeping the start of each user message, bot message and tool output.
+    :param messages: Messages to summarize.
+    :param max_chars: Maximum characters kept from each message.
+    """
+    tool_names = {c.id: c.name for m in messages for c in m.tool_calls or []}
+    lines = []
+    for m in messages:
+        content = (m.content or "").strip()
+        if len(content) > max_chars:
+            content = content[:max_chars] + "..."
+        if m.role == BotMessageRole.USER:
+            lines.append(f"User: {content}")
+        elif m.role == BotMessageRole.BOT:
+            if content:
+                lines.append(f"Assistant: {content}")
+            lines.extend(f"Assistant called {c.name} with {c.args}" for c in m.tool_calls or [])
+        elif m.role == BotMessageRole.TOOL:
+            lines.append(f"{tool_names.get(m.tool_call_id or '', 'Tool')} returned: {content}")
+        elif content:
+            lines.append(content)
+    return "\n".join(lines)
+
+
+def chat_summarizer(
+    client: openai.OpenAI, model: str, prompt: str = DEFAULT_SUMMARY_PROMPT
+) -> Callable[[list[BotMessage]], str]:
+    """
+    Summarize messages with an OpenAI compatible chat completion, for use with SummaryCompactor.
+    :param client: OpenAI client.
+    :param model: The model to use, a small fast model is usually enough.
+    :param prompt: Instructions for the summary.
+    """
+
+    def summarize(messages: list[BotMessage]) -> str:
+        completion = client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": prompt.strip()},
+                {"role": "user", "content": extractive_summary(messages, max_chars=4000)},
+            ],
+            temperature=0.2,
+        )
+        return completion.choices[0].message.content or ""
+
+    return summarize
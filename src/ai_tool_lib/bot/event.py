@@ -0,0 +1,80 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+from __future__ import annotations
+
+from typing import Any, Literal, Union
+
+from pydantic import BaseModel
+
+from ai_tool_lib.bot.results import BotResults, BotToolCall
+from ai_tool_lib.bot.tool.response import ToolUserResponse
+
+
+class BotTokenEvent(BaseModel):
+    """Content generated by the bot."""
+
+    type: Literal["token"] = "token"
+    """ Event type name. """
+
+    content: str
+    """ The content delta. """
+
+
+class BotToolCallStartEvent(BaseModel):
+    """The bot requested a tool call and it has been dispatched."""
+
+    type: Literal["tool_call_start"] = "tool_call_start"
+    """ Event type name. """
+
+    id: str
+    """ Tool call request ID. """
+
+    tool: str
+    """ The name of the tool. """
+
+    args: dict[str, Any]
+    """ The args used to call the tool. """
+
+
+class BotToolCallEndEvent(BaseModel):
+    """A tool call finished."""
+
+    type: Literal["tool_call_end"] = "tool_call_end"
+    """ Event type name. """
+
+    id: str
+    """ Tool call request ID. """
+
+    tool_call: BotToolCall
+    """ The tool call and its response. """
+
+
+class BotIterationEvent(BaseModel):
+    """An iteration finished."""
+
+    type: Literal["iteration"] = "iteration"
+    """ Event type name. """
+
+    iteration: int
+    """ The iteration number. """
+
+    results: BotResults
+    """ The results so far. """
+
+
+class BotResponseEvent(BaseModel):
+    """A tool provided the final response for the user."""
+
+    type: Literal["response"] = "response"
+    """ Event type name. """
+
+    response: ToolUserResponse
+    """ The response for the user. """
+
+    results: BotResults
+    """ The final results. """
+
+
+BotEvent = Union[BotTokenEvent, BotToolCallStartEvent, BotToolCallEndEvent, BotIterationEvent, BotResponseEvent]
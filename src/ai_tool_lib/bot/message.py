@@ -1,8 +1,9 @@
 from __future__ import annotations
 
 from enum import StrEnum
+from typing import Any, Callable, Mapping, Self, cast
 
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
 
 
 class BotMessageRole(StrEnum):
@@ -29,7 +30,11 @@ class BotToolMessage(BaseModel):
 
 
 class BotMessage(BaseModel):
-    """A message to send to the bot."""
+    """
+    A message to send to the bot. Its serialized forms and token counts are cached, so treat a message
+    as immutable once it has been sent. Assigning a field or copying with model_copy(update=...) is
+    noticed, changing a field in place, e.g. appending to tool_calls or editing a tool call's args, is not.
+    """
 
     role: BotMessageRole
     """ Message role/sender. """
@@ -42,3 +47,63 @@ class BotMessage(BaseModel):
 
     tool_call_id: str | None = None
     """ Tool call request ID. """
+
+    synthetic: bool = False
+    """ Whether the library wrote the message rather than the user, e.g. the prompt to retry a malformed response. """
+
+    # serialized forms and token counts, allocated on first use as most messages are never sent twice
+    _cache: dict[tuple[str, str], Any] | None = PrivateAttr(None)
+
+    def wire(self, key: str, render: Callable[[BotMessage], Any]) -> Any:
+        """
+        Get the message serialized for a bot API, rendering it only once per API.
+        The result is shared between requests and must not be modified.
+        Assigning the message's fields invalidates it, changing them in place does not.
+        :param key: Identifies the renderer, e.g. the bot client name.
+        :param render: Renders the message.
+        """
+        return self._cached(("wire", key), render)
+
+    def token_count(self, key: str, count: Callable[[BotMessage], int]) -> int:
+        """
+        Get the number of tokens in the message, counting them only once per estimator.
+        :param key: Identifies the estimator.
+        :param count: Counts the tokens in the message.
+        """
+        return self._cached(("tokens", key), count)
+
+    def _cached(self, key: tuple[str, str], make: Callable[[BotMessage], Any]) -> Any:
+        # private attribute access goes through __getattr__, which is slow enough to matter on long histories
+        # always set, the model has a private attribute
+        private = cast("dict[str, Any]", self.__pydantic_private__)
+        cache = private["_cache"]
+        if cache is None:
+            cache = private["_cache"] = {}
+        out = cache.get(key)
+        if out is None:
+            out = cache[key] = make(self)
+        return out
+
+    def __setattr__(self, name: str, value: Any):
+        if name in type(self).model_fields:
+            self._cache = None
+        super().__setattr__(name, value)
+
+    def model_copy(self, *, update: Mapping[str, Any] | None = None, deep: bool = False) -> Self:
+        copied = super().model_copy(update=update, deep=deep)
+        # a shallow copy would share the cache, and updates bypass __setattr__
+        cast("dict[str, Any]", copied.__pydantic_private__)["_cache"] = None
+        return copied
+
+
+class BotCompletion(BaseModel):
+    """A bot message and the token usage of the chat completion that produced it."""
+
+    message: BotMessage
+    """ The bot's message. """
+
+    input_tokens: int = 0
+    """ The number of tokens sent to the bot. """
+
+    output_tokens: int = 0
+    """ The number of tokens the bot generated. """
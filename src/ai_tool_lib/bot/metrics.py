@@ -0,0 +1,256 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from abc import abstractmethod
+from collections import deque
+from contextlib import contextmanager
+from enum import StrEnum
+from typing import Any, Iterator
+
+from pydantic import BaseModel, Field, PrivateAttr
+
+DEFAULT_PERCENTILES = (50, 95, 99)
+
+DEFAULT_MAX_SAMPLES = 10000
+""" Number of most recent durations the histogram keeps per span name. """
+
+
+class BotSpanKind(StrEnum):
+    """What a span measures."""
+
+    RUN = "run"
+    ITERATION = "iteration"
+    REQUEST = "request"
+    RETRY = "retry"
+    HEDGE = "hedge"
+    TOOL = "tool"
+    VALIDATION = "validation"
+    EXECUTION = "execution"
+
+
+class BotSpan(BaseModel):
+    """Timing of one part of a run, with the timings of its parts as children."""
+
+    kind: BotSpanKind
+    """ What the span measures. """
+
+    name: str
+    """ Name of the span, the model for requests and the tool name for tool calls. """
+
+    start: float
+    """ Unix time the span started. """
+
+    duration: float = 0.0
+    """ Seconds the span took, zero while it is running. """
+
+    attributes: dict[str, Any] = Field(default_factory=dict)
+    """ Details of the span, e.g. token counts of a request. """
+
+    error: str | None = None
+    """ Class name of the error that ended the span. """
+
+    children: list[BotSpan] = Field(default_factory=list)
+    """ Spans of the parts of this span in the order they started. """
+
+    _started: float = PrivateAttr(0.0)
+
+    @classmethod
+    def begin(cls, kind: BotSpanKind, name: str, parent: BotSpan | None = None, **attributes) -> BotSpan:
+        """
+        Start a span.
+        :param kind: What the span measures.
+        :param name: Name of the span.
+        :param parent: Span to add this span to as a child.
+        :param attributes: Details of the span.
+        """
+        span = cls(kind=kind, name=name, start=time.time(), attributes=attributes)
+        span._started = time.perf_counter()
+        if parent is not None:
+            # appending is atomic, tool calls on other threads can add their spans concurrently
+            parent.children.append(span)
+        return span
+
+    def end(self, error: BaseException | None = None):
+        """
+        End the span.
+        :param error: The error that ended the span, if any.
+        """
+        self.duration = time.perf_counter() - self._started
+        if error is not None:
+            self.error = error.__class__.__name__
+
+    def walk(self) -> Iterator[BotSpan]:
+        """Iterate over this span and all of its descendants, depth first."""
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def find(self, kind: BotSpanKind, name: str | None = None) -> list[BotSpan]:
+        """
+        Find descendant spans, including this span.
+        :param kind: Kind of span to find.
+        :param name: Only find spans with this name.
+        """
+        return [s for s in self.walk() if s.kind == kind and (name is None or s.name == name)]
+
+
+class BaseMetricsHook:
+    """Receives spans as they end, children before their parents."""
+
+    @abstractmethod
+    def on_span(self, span: BotSpan):
+        """
+        Called when a span ends.
+        :param span: The span.
+        """
+        ...
+
+
+class ChainMetricsHook(BaseMetricsHook):
+    """Passes spans to several metrics hooks."""
+
+    def __init__(self, *hooks: BaseMetricsHook):
+        """
+        :param hooks: Hooks to pass spans to, in order.
+        """
+        self.hooks = hooks
+
+    def on_span(self, span: BotSpan):
+        for hook in self.hooks:
+            hook.on_span(span)
+
+
+class HistogramMetrics(BaseMetricsHook):
+    """In-process latency percentiles per span kind and name, e.g. per tool and per model."""
+
+    def __init__(self, max_samples: int = DEFAULT_MAX_SAMPLES):
+        """
+        :param max_samples: Number of most recent durations to keep per span kind and name.
+        """
+        self.max_samples = max_samples
+        self._samples: dict[tuple[BotSpanKind, str], deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def on_span(self, span: BotSpan):
+        key = (span.kind, span.name)
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.max_samples)
+            samples.append(span.duration)
+
+    def percentiles(
+        self, kind: BotSpanKind, name: str, percentiles: tuple[float, ...] = DEFAULT_PERCENTILES
+    ) -> dict[str, float]:
+        """
+        Duration percentiles of a span kind and name, e.g. {"p50": 0.1, "p95": 0.4, "p99": 0.9}.
+        Empty if nothing was recorded.
+        :param kind: Span kind.
+        :param name: Span name.
+        :param percentiles: Percentiles to compute.
+        """
+        with self._lock:
+            samples = sorted(self._samples.get((kind, name), ()))
+        if not samples:
+            return {}
+        # nearest rank
+        return {f"p{p:g}": samples[max(0, math.ceil(p / 100 * len(samples)) - 1)] for p in percentiles}
+
+    def count(self, kind: BotSpanKind, name: str) -> int:
+        """
+        Number of durations kept for a span kind and name.
+        :param kind: Span kind.
+        :param name: Span name.
+        """
+        with self._lock:
+            return len(self._samples.get((kind, name), ()))
+
+    def summary(self, percentiles: tuple[float, ...] = DEFAULT_PERCENTILES) -> dict[str, dict[str, float]]:
+        """
+        Duration percentiles of every span kind and name, keyed "kind:name".
+        :param percentiles: Percentiles to compute.
+        """
+        with self._lock:
+            keys = list(self._samples)
+        return {f"{kind}:{name}": self.percentiles(kind, name, percentiles) for kind, name in keys}
+
+    def reset(self):
+        """Forget all recorded durations."""
+        with self._lock:
+            self._samples.clear()
+
+
+class OpenTelemetryMetrics(BaseMetricsHook):
+    """Exports each finished run as an OpenTelemetry trace, requires the optional opentelemetry-api package."""
+
+    def __init__(self, tracer: Any = None):
+        """
+        :param tracer: OpenTelemetry tracer, defaults to the global tracer provider's tracer for this library.
+        """
+        # optional dependency, only imported when these metrics are used
+        try:
+            from opentelemetry import trace  # noqa: PLC0415
+        except ImportError as e:
+            err_msg = (
+                "OpenTelemetryMetrics requires the opentelemetry-api package, "
+                "install it with `pip install opentelemetry-api`"
+            )
+            raise ImportError(err_msg) from e
+        self._trace = trace
+        self.tracer = tracer or trace.get_tracer("ai_tool_lib")
+
+    def on_span(self, span: BotSpan):
+        # spans are exported once the whole run is known so they keep their parents
+        if span.kind == BotSpanKind.RUN:
+            self._export(span, None)
+
+    def _export(self, span: BotSpan, parent: Any):
+        start = int(span.start * 1e9)
+        otel_span = self.tracer.start_span(
+            f"{span.kind}:{span.name}",
+            context=self._trace.set_span_in_context(parent) if parent is not None else None,
+            start_time=start,
+            attributes={
+                "ai_tool_lib.kind": str(span.kind),
+                # OpenTelemetry only accepts primitive attribute values
+                **{
+                    f"ai_tool_lib.{k}": v for k, v in span.attributes.items() if isinstance(v, str | bool | int | float)
+                },
+            },
+        )
+        if span.error:
+            otel_span.set_status(self._trace.Status(self._trace.StatusCode.ERROR, span.error))
+        for child in span.children:
+            self._export(child, otel_span)
+        otel_span.end(end_time=start + int(span.duration * 1e9))
+
+
+@contextmanager
+def record_span(
+    parent: BotSpan | None, kind: BotSpanKind, name: str, hook: BaseMetricsHook | None = None, **attributes
+) -> Iterator[BotSpan]:
+    """
+    Time a block as a span.
+    :param parent: Span to add the span to as a child.
+    :param kind: What the span measures.
+    :param name: Name of the span.
+    :param hook: Metrics hook to pass the span to when it ends.
+    :param attributes: Details of the span.
+    """
+    span = BotSpan.begin(kind, name, parent, **attributes)
+    error = None
+    try:
+        yield span
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        span.end(error)
+        if hook:
+            hook.on_span(span)
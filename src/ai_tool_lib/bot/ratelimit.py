@@ -0,0 +1,303 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+import time
+from abc import abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BaseRateLimitStore:
+    """
+    Stores token bucket levels. Taking from a bucket always succeeds, the level may go
+    negative, and the caller waits until the bucket would have refilled. Concurrent callers
+    are therefore queued in the order they reserved rather than racing each other.
+    """
+
+    @abstractmethod
+    def take(self, key: str, capacity: float, rate: float, amount: float) -> float:
+        """
+        Take an amount from a bucket, returns the seconds to wait before using it.
+        :param key: Bucket key.
+        :param capacity: Maximum bucket level.
+        :param rate: Refill rate per second.
+        :param amount: Amount to take, negative to give back.
+        """
+        ...
+
+    @abstractmethod
+    def pause(self, key: str, until: float):
+        """
+        Make every caller of a bucket wait until a time, e.g. when the API responds with Retry-After.
+        :param key: Bucket key.
+        :param until: Unix time to wait until.
+        """
+        ...
+
+    def _refill(
+        self, state: tuple[float, float, float] | None, capacity: float, rate: float, amount: float, now: float
+    ) -> tuple[tuple[float, float, float], float]:
+        level, updated, paused_until = state or (capacity, now, 0.0)
+        level = min(capacity, level + (now - updated) * rate) - amount
+        wait = max(0.0, -level / rate if rate > 0 else 0.0, paused_until - now)
+        return (level, now, paused_until), wait
+
+
+class MemoryRateLimitStore(BaseRateLimitStore):
+    """Bucket levels shared by the threads of one process."""
+
+    def __init__(self):
+        self._buckets: dict[str, tuple[float, float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, capacity: float, rate: float, amount: float) -> float:
+        with self._lock:
+            self._buckets[key], wait = self._refill(self._buckets.get(key), capacity, rate, amount, time.time())
+        return wait
+
+    def pause(self, key: str, until: float):
+        with self._lock:
+            level, updated, paused_until = self._buckets.get(key) or (1e308, time.time(), 0.0)
+            self._buckets[key] = (level, updated, max(paused_until, until))
+
+
+class SQLiteRateLimitStore(BaseRateLimitStore):
+    """Bucket levels in a SQLite database, shared by every process on one host."""
+
+    def __init__(self, path: str | os.PathLike, timeout: float = 30):
+        """
+        :param path: Path of the database file.
+        :param timeout: Seconds to wait for another process to release the database.
+        """
+        self.path = str(path)
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connection().execute(
+            """
+            CREATE TABLE IF NOT EXISTS buckets (
+                key TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL, paused_until REAL NOT NULL
+            ) WITHOUT ROWID
+            """
+        )
+
+    def take(self, key: str, capacity: float, rate: float, amount: float) -> float:
+        conn = self._connection()
+        # take the write lock up front so two processes cannot read the same level
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT level, updated, paused_until FROM buckets WHERE key = ?", (key,)).fetchone()
+            state, wait = self._refill(row, capacity, rate, amount, time.time())
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (key, level, updated, paused_until) VALUES (?, ?, ?, ?)", (key, *state)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def pause(self, key: str, until: float):
+        # a bucket that does not exist yet starts full
+        self._connection().execute(
+            """
+            INSERT INTO buckets (key, level, updated, paused_until) VALUES (?, 1e308, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET paused_until = MAX(paused_until, excluded.paused_until)
+            """,
+            (key, time.time(), until),
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite connections cannot be shared across threads, or inherited by forked worker processes
+        conn, pid = getattr(self._local, "conn", (None, None))
+        if conn is None or pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = (conn, os.getpid())
+        return conn
+
+
+class RateLimiter:
+    """
+    Keeps requests within requests per minute and tokens per minute budgets using token buckets.
+    Tokens are reserved with the estimated prompt size before a request is sent and corrected
+    with the actual usage afterwards.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float | None = None,
+        tokens_per_minute: float | None = None,
+        store: BaseRateLimitStore | None = None,
+        key: str = "default",
+    ):
+        """
+        :param requests_per_minute: Maximum requests per minute, None for no limit.
+        :param tokens_per_minute: Maximum input and output tokens per minute, None for no limit.
+        :param store: Where bucket levels are kept, defaults to this process only. Use a SQLiteRateLimitStore
+            to share the budgets between processes.
+        :param key: Name of the budget in the store, limiters with the same key and store share a budget.
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.store = store or MemoryRateLimitStore()
+        self.key = key
+
+    def reserve(self, tokens: int = 0) -> float:
+        """
+        Reserve a request, returns the seconds to wait before sending it.
+        :param tokens: Estimated tokens the request will use.
+        """
+        wait = 0.0
+        if self.requests_per_minute:
+            wait = self.store.take(f"{self.key}:requests", self.requests_per_minute, self.requests_per_minute / 60, 1)
+        if self.tokens_per_minute:
+            wait = max(
+                wait,
+                self.store.take(f"{self.key}:tokens", self.tokens_per_minute, self.tokens_per_minute / 60, tokens),
+            )
+        return wait
+
+    def acquire(self, tokens: int = 0) -> float:
+        """
+        Reserve a request and wait until it may be sent, returns the seconds waited.
+        :param tokens: Estimated tokens the request will use.
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self, tokens: int = 0) -> float:
+        """
+        Async version of acquire.
+        :param tokens: Estimated tokens the request will use.
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def adjust(self, tokens: int):
+        """
+        Correct a reservation once the actual usage is known.
+        :param tokens: Actual tokens minus the reserved tokens, negative to give tokens back.
+        """
+        if self.tokens_per_minute and tokens:
+            self.store.take(f"{self.key}:tokens", self.tokens_per_minute, self.tokens_per_minute / 60, tokens)
+
+    def pause(self, seconds: float):
+        """
+        Hold every request sharing this budget, e.g. for the Retry-After of a rate limited response.
+        :param seconds: Seconds to hold requests for.
+        """
+        until = time.time() + seconds
+        self.store.pause(f"{self.key}:requests", until)
+        self.store.pause(f"{self.key}:tokens", until)
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter for transient API errors, honoring Retry-After when given."""
+
+    def __init__(self, max_retries: int = 4, base_delay: float = 0.5, max_delay: float = 30.0):
+        """
+        :param max_retries: Number of retries before the error is raised.
+        :param base_delay: Maximum delay before the first retry, doubled for every retry after it.
+        :param max_delay: Maximum delay between retries.
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, retry_after: float | None = None) -> float | None:
+        """
+        Seconds to wait before a retry, None if there are no retries left.
+        :param attempt: Number of retries already made.
+        :param retry_after: Delay requested by the API.
+        """
+        if attempt >= self.max_retries:
+            return None
+        if retry_after is not None:
+            # spread out the callers that were all told the same time
+            return min(retry_after, self.max_delay) + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+class HedgePolicy:
+    """
+    Sends a duplicate of a request that has not been answered within a delay, the first response wins
+    and the other request is cancelled. Cuts the tail latency caused by occasional slow responses, at
+    the cost of the tokens spent on duplicates. Share one policy between clients of the same model so
+    the adaptive delay is learned from all of their requests.
+    """
+
+    def __init__(
+        self,
+        delay: float | None = None,
+        percentile: float = 0.95,
+        min_delay: float = 0.0,
+        window: int = 200,
+        min_samples: int = 20,
+        max_workers: int | None = None,
+    ):
+        """
+        :param delay: Seconds to wait before sending a duplicate. None to wait for the given percentile of
+            recent response latencies instead.
+        :param percentile: Percentile of recent latencies to wait for, from 0 to 1. At 0.95 about one request
+            in twenty is duplicated.
+        :param min_delay: Minimum seconds to wait before sending a duplicate.
+        :param window: Number of recent latencies the percentile is computed over.
+        :param min_samples: Latencies to observe before the adaptive delay is used, requests are not duplicated
+            until then.
+        :param max_workers: Size of the thread pool sync requests are sent from while hedging.
+        """
+        self.fixed_delay = delay
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.max_workers = max_workers
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._executor: ThreadPoolExecutor | None = None
+
+    def delay(self) -> float | None:
+        """Seconds to wait for a response before sending a duplicate, None to not duplicate the request."""
+        if self.fixed_delay is not None:
+            return max(self.fixed_delay, self.min_delay)
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            latencies = sorted(self._latencies)
+        index = min(len(latencies) - 1, int(self.percentile * len(latencies)))
+        return max(latencies[index], self.min_delay)
+
+    def observe(self, latency: float):
+        """
+        Record the latency of a response, requests cancelled before responding are not recorded.
+        :param latency: Seconds from sending the request to its response, the first chunk for streams.
+        """
+        with self._lock:
+            self._latencies.append(latency)
+
+    def executor(self) -> ThreadPoolExecutor:
+        """Thread pool sync requests are sent from while hedging."""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="ai_tool_lib_hedge")
+        return self._executor
+
+    def shutdown(self):
+        """Release the thread pool, requests still being sent finish in the background."""
+        with self._lock:
+            if self._executor:
+                self._executor.shutdown(wait=False)
+                self._executor = None
@@ -5,12 +5,15 @@
 from __future__ import annotations
 
 import datetime
+import time
 from typing import Any, Self
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, PrivateAttr
 
+from ai_tool_lib.bot.metrics import BotSpan, BotSpanKind
 from ai_tool_lib.bot.session import BotSession
 from ai_tool_lib.bot.tool.response import ToolResponse, ToolUserResponse
+from ai_tool_lib.error.bot import BotError
 from ai_tool_lib.utils.uuid import generate_uuid
 
 
@@ -27,6 +30,22 @@ class BotToolCall(BaseModel):
     """ The results of the tool call that is sent to the bot. """
 
 
+class BotModelUsage(BaseModel):
+    """Usage of one model during a run."""
+
+    requests: int = 0
+    """ The number of chat completions the model answered. """
+
+    input_tokens: int = 0
+    """ The number of tokens sent to the model. """
+
+    output_tokens: int = 0
+    """ The number of tokens the model generated. """
+
+    latency: float = 0.0
+    """ Seconds spent waiting for the model's completions. """
+
+
 class BotResults(BaseModel):
     """The results of a bot query."""
 
@@ -51,21 +70,99 @@ class BotResults(BaseModel):
     output_tokens: int = 0
     """ The number of tokens the bot generated. """
 
+    model_usage: dict[str, BotModelUsage] = {}
+    """ Usage of each model that answered a request, by model name. """
+
+    estimated_input_tokens: int = 0
+    """ The number of tokens the token estimator predicted would be sent to the bot, before sending. """
+
+    compacted_messages: int = 0
+    """ The number of messages removed or replaced by compaction, summed over every request. """
+
+    compacted_tokens: int = 0
+    """ The estimated number of tokens removed by compaction, summed over every request. """
+
+    rate_limit_wait: float = 0.0
+    """ Seconds spent waiting for the rate limiter before sending requests. """
+
+    request_retries: int = 0
+    """ The number of requests retried after rate limit, connection or server errors. """
+
+    retry_wait: float = 0.0
+    """ Seconds spent waiting between request retries. """
+
+    hedged_requests: int = 0
+    """ The number of duplicate requests sent because a request was slow to respond. """
+
+    hedge_wins: int = 0
+    """ The number of duplicate requests that responded first. """
+
+    hedge_input_tokens: int = 0
+    """ Input tokens of the responses discarded by hedging, estimated for requests cancelled before responding. """
+
+    hedge_output_tokens: int = 0
+    """ Output tokens of the responses discarded by hedging, unknown and not counted for cancelled requests. """
+
+    cache_hits: int = 0
+    """ The number of chat completions served from the completion cache. """
+
+    cache_misses: int = 0
+    """ The number of chat completions not found in the completion cache. """
+
+    cached_input_tokens: int = 0
+    """ The number of input tokens saved by completion cache hits. """
+
+    cached_output_tokens: int = 0
+    """ The number of output tokens saved by completion cache hits. """
+
+    malformed_responses: int = 0
+    """ The number of malformed responses the bot was asked to correct, or that failed the run. """
+
+    latency_budget: float | None = None
+    """ Seconds the run was allowed to take, None without a latency budget. """
+
+    latency_remaining: float | None = None
+    """ Seconds of the latency budget left when the run ended, negative if it ran over. """
+
+    early_final_answer: bool = False
+    """ Whether the bot was asked for its final answer before the iteration limit to stay within the latency budget. """
+
+    offered_tools: list[list[str]] = []
+    """ Names of the tools offered with each request, when the client's tools are selected per request by a callable. """
+
+    trace: BotSpan | None = None
+    """ Timing of the run, with a child span per iteration and their requests, retries and tool calls. """
+
     session: BotSession
     """ The session that was used to generate the results. """
 
+    _deadline: float | None = PrivateAttr(None)
+
     @classmethod
-    def new(cls, prompt: str = "", session: BotSession | None = None) -> Self:
-        """Create new results."""
+    def new(cls, prompt: str = "", session: BotSession | None = None, latency_budget: float | None = None) -> Self:
+        """
+        Create new results.
+        :param prompt: The user's prompt for the bot.
+        :param session: The session, defaults to a new one.
+        :param latency_budget: Seconds the run may take from now, None for no limit.
+        """
         if not session:
             session = BotSession.new()
-        return cls(
+        results = cls(
             uid=generate_uuid(),
             prompt=prompt,
             tool_calls=[],
             created=datetime.datetime.now(tz=datetime.UTC),
             session=session,
+            latency_budget=latency_budget,
         )
+        if latency_budget is not None:
+            results._deadline = time.monotonic() + latency_budget
+        return results
+
+    def remaining_time(self) -> float | None:
+        """Seconds left in the run's latency budget, negative once it ran over, None without a budget."""
+        return None if self._deadline is None else self._deadline - time.monotonic()
 
     @property
     def response(self) -> ToolUserResponse | None:
@@ -79,3 +176,31 @@ class BotResults(BaseModel):
     def response_data(self) -> dict[str, Any]:
         resp = self.response
         return resp.data if resp and resp.data else {}
+
+    @property
+    def iteration_span(self) -> BotSpan | None:
+        """The span of the latest iteration, None outside of a run."""
+        if not self.trace or not self.trace.children or self.trace.children[-1].kind != BotSpanKind.ITERATION:
+            return None
+        return self.trace.children[-1]
+
+
+class BotBatchItem(BaseModel):
+    """The outcome of a single prompt in a batch run."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    index: int
+    """ Position of the prompt in the batch. """
+
+    prompt: str
+    """ The user's prompt for the bot. """
+
+    results: BotResults | None = None
+    """ The results, if the run succeeded. """
+
+    error: BotError | None = None
+    """ The error, if the run failed. """
+
+    from_checkpoint: bool = False
+    """ Whether the results were loaded from a checkpoint rather than run again. """
@@ -0,0 +1,134 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+from __future__ import annotations
+
+import bisect
+from typing import Callable, Iterable, Sequence
+
+from pydantic import BaseModel
+
+from ai_tool_lib.bot.results import BotResults
+
+
+class RoutingContext(BaseModel):
+    """What a model is picked from, for one request."""
+
+    results: BotResults
+    """ The run's results so far, with its prompt, tool calls and per model usage. """
+
+    estimated_tokens: int
+    """ Estimated input tokens of the request, including tool definitions. """
+
+    tools: list[str]
+    """ Names of the tools offered with the request. """
+
+    iteration: int
+    """ The run's iteration number, starting at 1. """
+
+    malformed_responses: int
+    """ The number of malformed responses earlier in the run. """
+
+    remaining_time: float | None = None
+    """ Seconds left in the run's latency budget, None without a budget. """
+
+
+ModelScorer = Callable[[RoutingContext], float]
+""" Rates how demanding a request is from 0 to 1, demanding requests are sent to stronger models. """
+
+
+class ModelRule(BaseModel):
+    """Routes requests that match every one of its conditions to a model."""
+
+    model: str
+    """ The model to use. """
+
+    min_tokens: int = 0
+    """ Matches requests estimated to have at least this many input tokens. """
+
+    max_tokens: int | None = None
+    """ Matches requests estimated to have at most this many input tokens. """
+
+    tools: list[str] = []
+    """ Matches requests offering any of these tools, empty to match any tools. """
+
+    min_iteration: int = 1
+    """ Matches from this iteration on. """
+
+    max_iteration: int | None = None
+    """ Matches up to this iteration. """
+
+    min_malformed_responses: int = 0
+    """ Matches once the run had at least this many malformed responses. """
+
+    max_remaining_time: float | None = None
+    """ Matches once at most this many seconds of the latency budget are left, e.g. to finish with a fast model. """
+
+    def matches(self, context: RoutingContext) -> bool:
+        """
+        Whether a request matches the rule.
+        :param context: The request's routing context.
+        """
+        return (
+            context.estimated_tokens >= self.min_tokens
+            and (self.max_tokens is None or context.estimated_tokens <= self.max_tokens)
+            and (not self.tools or any(t in context.tools for t in self.tools))
+            and context.iteration >= self.min_iteration
+            and (self.max_iteration is None or context.iteration <= self.max_iteration)
+            and context.malformed_responses >= self.min_malformed_responses
+            and (
+                self.max_remaining_time is None
+                or (context.remaining_time is not None and context.remaining_time <= self.max_remaining_time)
+            )
+        )
+
+
+class ModelRouter:
+    """
+    Picks the model of every request, so simple requests are served by a small fast model and only
+    demanding ones by a large one. The model comes from the scorer if one is set, otherwise from the
+    first matching rule, otherwise it is the weakest model. After malformed responses the run is
+    escalated to stronger models rather than retried with the model that failed.
+    """
+
+    def __init__(
+        self,
+        models: Sequence[str],
+        rules: Iterable[ModelRule] = (),
+        scorer: ModelScorer | None = None,
+        thresholds: Sequence[float] | None = None,
+        escalate_after: int = 1,
+    ):
+        """
+        :param models: Models from weakest to strongest, typically from cheapest and fastest to most expensive.
+        :param rules: Rules tried in order when there is no scorer.
+        :param scorer: Rates each request, the score picks a model with the thresholds.
+        :param thresholds: Scores from which each model after the first is used, defaults to evenly spaced.
+        :param escalate_after: Malformed responses in a run that move it to the next stronger model, 0 to never
+            escalate.
+        """
+        self.models = list(models)
+        if not self.models:
+            err_msg = "model router requires at least one model"
+            raise ValueError(err_msg)
+        self.rules = list(rules)
+        self.scorer = scorer
+        self.thresholds = (
+            list(thresholds) if thresholds is not None else [i / len(self.models) for i in range(1, len(self.models))]
+        )
+        self.escalate_after = escalate_after
+
+    def route(self, context: RoutingContext) -> str:
+        """
+        Pick the model of a request.
+        :param context: The request's routing context.
+        """
+        if self.scorer:
+            model = self.models[min(bisect.bisect_right(self.thresholds, self.scorer(context)), len(self.models) - 1)]
+        else:
+            model = next((r.model for r in self.rules if r.matches(context)), self.models[0])
+        if not self.escalate_after or model not in self.models:
+            return model
+        tier = self.models.index(model) + context.malformed_responses // self.escalate_after
+        return self.models[min(tier, len(self.models) - 1)]
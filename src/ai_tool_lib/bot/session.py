@@ -7,7 +7,7 @@ from __future__ import annotations
 import datetime
 from typing import Self
 
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
 
 from ai_tool_lib.bot.message import BotMessage
 from ai_tool_lib.utils.uuid import generate_uuid
@@ -29,6 +29,17 @@ class BotSession(BaseModel):
     messages: list[BotMessage]
     """ Bot messages from previous sessions. """
 
+    _stored_messages: int = PrivateAttr(0)
+
+    @property
+    def stored_messages(self) -> int:
+        """Number of leading messages already saved to a session store."""
+        return self._stored_messages
+
+    @stored_messages.setter
+    def stored_messages(self, value: int):
+        self._stored_messages = value
+
     @classmethod
     def new(cls) -> Self:
         """Create a new session."""
@@ -0,0 +1,256 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+from __future__ import annotations
+
+import datetime as dt
+import os
+import sqlite3
+import threading
+from abc import abstractmethod
+
+from ai_tool_lib.bot.message import BotMessage, BotMessageRole
+from ai_tool_lib.bot.session import BotSession
+
+
+class BotSessionStore:
+    """
+    Stores sessions as a header and an append-only message log, so saving a session
+    only writes the messages added since it was loaded or last saved.
+    """
+
+    @abstractmethod
+    def load(self, uid: str, last: int | None = None) -> BotSession | None:
+        """
+        Load a session, None if it does not exist.
+        :param uid: The session's unique ID.
+        :param last: Only load the last number of messages, the leading system messages are always loaded.
+        """
+        ...
+
+    @abstractmethod
+    def append(self, session: BotSession, messages: list[BotMessage]):
+        """
+        Append messages to a session's log, creating the session if needed.
+        :param session: The session.
+        :param messages: The messages to append.
+        """
+        ...
+
+    def replace(self, session: BotSession, messages: list[BotMessage]):
+        """
+        Replace a session's whole message log, creating the session if needed.
+        :param session: The session.
+        :param messages: The messages to store.
+        """
+        self.delete(session.uid)
+        self.append(session, messages)
+
+    @abstractmethod
+    def delete(self, uid: str):
+        """
+        Delete a session.
+        :param uid: The session's unique ID.
+        """
+        ...
+
+    @abstractmethod
+    def count(self, uid: str) -> int:
+        """
+        Count the messages stored for a session.
+        :param uid: The session's unique ID.
+        """
+        ...
+
+    def save(self, session: BotSession):
+        """
+        Append the messages added to a session since it was loaded or last saved.
+        Changes to messages that were already stored are not saved. A session that was not loaded from
+        the store replaces the history stored under its uid, if any.
+        :param session: The session.
+        """
+        new_messages = session.messages[session.stored_messages :]
+        if not new_messages and session.stored_messages:
+            return
+        session.updated = dt.datetime.now(tz=dt.UTC)
+        if not session.stored_messages and self.count(session.uid):
+            # appending would store the history twice
+            self.replace(session, session.messages)
+        else:
+            self.append(session, new_messages)
+        session.stored_messages = len(session.messages)
+
+    def _trim(self, messages: list[BotMessage], last: int | None) -> list[BotMessage]:
+        head = 0
+        while head < len(messages) and messages[head].role == BotMessageRole.SYSTEM:
+            head += 1
+        if last is None or len(messages) - head <= last:
+            return messages
+        return messages[:head] + self._drop_orphaned_tool_messages(messages[len(messages) - last :])
+
+    def _drop_orphaned_tool_messages(self, messages: list[BotMessage]) -> list[BotMessage]:
+        # a tool message cannot be sent without the bot message that requested it
+        start = 0
+        while start < len(messages) and messages[start].role == BotMessageRole.TOOL:
+            start += 1
+        return messages[start:]
+
+
+class MemoryBotSessionStore(BotSessionStore):
+    """In-process session store, messages are shared with the loaded sessions rather than copied."""
+
+    def __init__(self):
+        self._sessions: dict[str, tuple[BotSession, list[BotMessage]]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, uid: str, last: int | None = None) -> BotSession | None:
+        with self._lock:
+            entry = self._sessions.get(uid)
+            if not entry:
+                return None
+            header, messages = entry
+            session = header.model_copy(update={"messages": self._trim(messages, last)})
+        session.stored_messages = len(session.messages)
+        return session
+
+    def append(self, session: BotSession, messages: list[BotMessage]):
+        with self._lock:
+            entry = self._sessions.get(session.uid)
+            if not entry:
+                entry = self._sessions[session.uid] = (session.model_copy(update={"messages": []}), [])
+            entry[0].updated = session.updated
+            entry[0].name = session.name
+            entry[1].extend(messages)
+
+    def replace(self, session: BotSession, messages: list[BotMessage]):
+        with self._lock:
+            self._sessions[session.uid] = (session.model_copy(update={"messages": []}), list(messages))
+
+    def delete(self, uid: str):
+        with self._lock:
+            self._sessions.pop(uid, None)
+
+    def count(self, uid: str) -> int:
+        entry = self._sessions.get(uid)
+        return len(entry[1]) if entry else 0
+
+
+class SQLiteBotSessionStore(BotSessionStore):
+    """Session store in a SQLite database, can be written to by multiple processes on one host."""
+
+    def __init__(self, path: str | os.PathLike, timeout: float = 30):
+        """
+        :param path: Path of the database file.
+        :param timeout: Seconds to wait for another writer to release the database.
+        """
+        self.path = str(path)
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connection().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                uid TEXT PRIMARY KEY, created TEXT NOT NULL, updated TEXT NOT NULL, name TEXT
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                session_uid TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, data TEXT NOT NULL,
+                PRIMARY KEY (session_uid, seq)
+            ) WITHOUT ROWID;
+            """
+        )
+
+    def load(self, uid: str, last: int | None = None) -> BotSession | None:
+        conn = self._connection()
+        header = conn.execute("SELECT created, updated, name FROM sessions WHERE uid = ?", (uid,)).fetchone()
+        if not header:
+            return None
+        if last is None:
+            rows = conn.execute("SELECT data FROM messages WHERE session_uid = ? ORDER BY seq", (uid,)).fetchall()
+            messages = [BotMessage.model_validate_json(data) for (data,) in rows]
+        else:
+            head = conn.execute(
+                """
+                SELECT data FROM messages WHERE session_uid = :uid AND seq < COALESCE(
+                    (SELECT MIN(seq) FROM messages WHERE session_uid = :uid AND role != :role), 1 << 62
+                ) ORDER BY seq
+                """,
+                {"uid": uid, "role": BotMessageRole.SYSTEM.value},
+            ).fetchall()
+            # sequence numbers are contiguous from zero so the tail can be found without counting
+            total = conn.execute(
+                "SELECT COALESCE(MAX(seq), -1) + 1 FROM messages WHERE session_uid = ?", (uid,)
+            ).fetchone()[0]
+            start = max(len(head), total - last)
+            tail = conn.execute(
+                "SELECT data FROM messages WHERE session_uid = ? AND seq >= ? ORDER BY seq", (uid, start)
+            ).fetchall()
+            tail_messages = [BotMessage.model_validate_json(data) for (data,) in tail]
+            if start > len(head):
+                tail_messages = self._drop_orphaned_tool_messages(tail_messages)
+            messages = [BotMessage.model_validate_json(data) for (data,) in head] + tail_messages
+        session = BotSession(
+            uid=uid,
+            created=dt.datetime.fromisoformat(header[0]),
+            updated=dt.datetime.fromisoformat(header[1]),
+            name=header[2],
+            messages=messages,
+        )
+        session.stored_messages = len(messages)
+        return session
+
+    def append(self, session: BotSession, messages: list[BotMessage]):
+        self._write(session, messages, replace=False)
+
+    def replace(self, session: BotSession, messages: list[BotMessage]):
+        self._write(session, messages, replace=True)
+
+    def _write(self, session: BotSession, messages: list[BotMessage], *, replace: bool):
+        rows = [(m.role.value, m.model_dump_json()) for m in messages]
+        conn = self._connection()
+        # take the write lock up front so concurrent writers cannot pick the same sequence numbers
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if replace:
+                conn.execute("DELETE FROM messages WHERE session_uid = ?", (session.uid,))
+            conn.execute(
+                """
+                INSERT INTO sessions (uid, created, updated, name) VALUES (?, ?, ?, ?)
+                ON CONFLICT (uid) DO UPDATE SET updated = excluded.updated, name = excluded.name
+                """,
+                (session.uid, session.created.isoformat(), session.updated.isoformat(), session.name),
+            )
+            seq = conn.execute(
+                "SELECT COALESCE(MAX(seq), -1) + 1 FROM messages WHERE session_uid = ?", (session.uid,)
+            ).fetchone()[0]
+            conn.executemany(
+                "INSERT INTO messages (session_uid, seq, role, data) VALUES (?, ?, ?, ?)",
+                [(session.uid, seq + i, role, data) for i, (role, data) in enumerate(rows)],
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, uid: str):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM messages WHERE session_uid = ?", (uid,))
+            conn.execute("DELETE FROM sessions WHERE uid = ?", (uid,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def count(self, uid: str) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM messages WHERE session_uid = ?", (uid,)).fetchone()[0]
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite connections cannot be shared across threads, or inherited by forked worker processes
+        conn, pid = getattr(self._local, "conn", (None, None))
+        if conn is None or pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = (conn, os.getpid())
+        return conn
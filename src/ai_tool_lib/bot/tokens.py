@@ -0,0 +1,110 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+from __future__ import annotations
+
+import json
+import math
+from abc import abstractmethod
+from typing import TYPE_CHECKING, Any, Callable, Iterable
+
+if TYPE_CHECKING:
+    from ai_tool_lib.bot.message import BotMessage
+    from ai_tool_lib.bot.results import BotResults
+
+TokenLimitHook = Callable[[list["BotMessage"], int, "BotResults"], "list[BotMessage] | None"]
+"""
+Called with the messages, the number of tokens they may use and the current results when a request
+would exceed the request token limit. Returns the messages to send instead, or None to refuse the request.
+"""
+
+MESSAGE_OVERHEAD_TOKENS = 4
+""" Tokens used by the role and separators of every message. """
+
+REQUEST_OVERHEAD_TOKENS = 3
+""" Tokens used to prime the bot's reply. """
+
+
+class BaseTokenEstimator:
+    """Estimates prompt sizes locally, before a request is sent."""
+
+    @abstractmethod
+    def name(self) -> str:
+        """Unique name of the estimator and its settings, per message counts are cached under it."""
+        ...
+
+    @abstractmethod
+    def count_text(self, text: str) -> int:
+        """
+        Count the tokens in some text.
+        :param text: The text.
+        """
+        ...
+
+    def count_message(self, message: BotMessage) -> int:
+        """
+        Count the tokens in a message, the count is cached on the message.
+        :param message: The message.
+        """
+        return message.token_count(self.name(), self._count_message)
+
+    def count_messages(self, messages: Iterable[BotMessage]) -> int:
+        """
+        Count the tokens in a request's messages.
+        :param messages: The messages.
+        """
+        return sum(self.count_message(m) for m in messages) + REQUEST_OVERHEAD_TOKENS
+
+    def count_json(self, data: Any) -> int:
+        """
+        Count the tokens in JSON serializable data, e.g. a tool definition.
+        :param data: The data.
+        """
+        return self.count_text(json.dumps(data, separators=(",", ":"), default=str))
+
+    def _count_message(self, message: BotMessage) -> int:
+        count = MESSAGE_OVERHEAD_TOKENS
+        if message.content:
+            count += self.count_text(message.content)
+        for call in message.tool_calls or []:
+            count += self.count_text(call.name) + self.count_text(call.args) + MESSAGE_OVERHEAD_TOKENS
+        return count
+
+
+class HeuristicTokenEstimator(BaseTokenEstimator):
+    """Fast estimator that assumes a fixed number of characters per token, needs no tokenizer."""
+
+    def __init__(self, chars_per_token: float = 4.0):
+        """
+        :param chars_per_token: Average characters per token, lower values give more conservative estimates.
+        """
+        self.chars_per_token = chars_per_token
+
+    def name(self) -> str:
+        return f"heuristic:{self.chars_per_token}"
+
+    def count_text(self, text: str) -> int:
+        return math.ceil(len(text) / self.chars_per_token)
+
+
+class TiktokenTokenEstimator(BaseTokenEstimator):
+    """Exact counts for OpenAI models, requires the optional tiktoken package."""
+
+    def __init__(self, encoding: str = "o200k_base"):
+        """
+        :param encoding: The tiktoken encoding name.
+        """
+        # optional dependency, only imported when this estimator is used
+        try:
+            import tiktoken  # noqa: PLC0415
+        except ImportError as e:
+            err_msg = "TiktokenTokenEstimator requires the tiktoken package, install it with `pip install tiktoken`"
+            raise ImportError(err_msg) from e
+        self.encoding = tiktoken.get_encoding(encoding)
+
+    def name(self) -> str:
+        return f"tiktoken:{self.encoding.name}"
+
+    def count_text(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
@@ -4,10 +4,14 @@
 
 from __future__ import annotations
 
+import inspect
 from abc import abstractmethod
-from typing import TYPE_CHECKING, Iterable
+from typing import TYPE_CHECKING, Awaitable, Iterable
+
+from ai_tool_lib.utils.cache import stable_hash
 
 if TYPE_CHECKING:
+    from ai_tool_lib.bot.tool.execution import BaseExecutionPolicy
     from ai_tool_lib.bot.tool.property import PropertyDefinition
     from ai_tool_lib.bot.tool.response import ToolResponse
 
@@ -29,6 +33,46 @@ class BaseTool:
         ...
 
     @abstractmethod
-    def execute(self, *args, **kwargs) -> ToolResponse:
-        """Executes the tool."""
+    def execute(self, *args, **kwargs) -> ToolResponse | Awaitable[ToolResponse]:
+        """Executes the tool. May be defined with `async def`."""
         ...
+
+    def thread_safe(self) -> bool:
+        """Whether the tool may be executed concurrently with other tool calls."""
+        return True
+
+    def early_dispatch(self) -> bool:
+        """
+        Whether the tool may be executed while the bot's response is still streaming, before the rest of the
+        response is checked. Only for tools without side effects, a call is made again if the response turns
+        out to be malformed and the bot is asked to retry.
+        """
+        return False
+
+    def cacheable(self) -> bool:
+        """Whether responses may be memoized, the tool must return the same response for the same arguments."""
+        return False
+
+    def cache_ttl(self) -> float | None:
+        """Seconds a memoized response stays valid, None to keep it until evicted."""
+        return None
+
+    def cache_max_entries(self) -> int:
+        """Maximum number of memoized responses when the tool has its own in-process cache."""
+        return 1024
+
+    def cache_key(self, args: dict) -> str:
+        """Cache key for the arguments of a call."""
+        return stable_hash(args)
+
+    def execution_policy(self) -> BaseExecutionPolicy | None:
+        """Where the tool is executed, e.g. in a worker process, None for the client's policy."""
+        return None
+
+    def timeout(self) -> float | None:
+        """Seconds the tool may take to execute, None for the execution policy's timeout."""
+        return None
+
+    def is_async(self) -> bool:
+        """Whether execute returns an awaitable that must be run on an event loop."""
+        return inspect.iscoroutinefunction(self.execute)
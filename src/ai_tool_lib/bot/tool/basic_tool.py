@@ -2,11 +2,17 @@
 #
 # SPDX-License-Identifier: MIT
 
-from typing import Callable, Iterable
+from __future__ import annotations
+
+import inspect
+from typing import TYPE_CHECKING, Awaitable, Callable, Iterable
 
 from ai_tool_lib.bot.tool.base_tool import BaseTool
-from ai_tool_lib.bot.tool.property import PropertyDefinition
-from ai_tool_lib.bot.tool.response import ToolResponse
+
+if TYPE_CHECKING:
+    from ai_tool_lib.bot.tool.execution import BaseExecutionPolicy
+    from ai_tool_lib.bot.tool.property import PropertyDefinition
+    from ai_tool_lib.bot.tool.response import ToolResponse
 
 
 class BasicTool(BaseTool):
@@ -17,12 +23,33 @@ class BasicTool(BaseTool):
         name: str,
         description: str,
         properties: Iterable[PropertyDefinition],
-        execute: Callable[..., ToolResponse],
+        execute: Callable[..., ToolResponse | Awaitable[ToolResponse]],
+        *,
+        thread_safe: bool = True,
+        early_dispatch: bool = False,
+        cacheable: bool = False,
+        cache_ttl: float | None = None,
+        cache_max_entries: int = 1024,
+        cache_key: Callable[[dict], str] | None = None,
+        execution_policy: BaseExecutionPolicy | None = None,
+        timeout: float | None = None,
     ):
         self._name = name
         self._description = description
         self._properties = list(properties)
         self._execute = execute
+        self._thread_safe = thread_safe
+        self._early_dispatch = early_dispatch
+        self._cacheable = cacheable
+        self._cache_ttl = cache_ttl
+        self._cache_max_entries = cache_max_entries
+        self._cache_key = cache_key
+        self._execution_policy = execution_policy
+        self._timeout = timeout
+
+    def __getstate__(self):
+        # the execution policy holds threads or processes, a tool being executed by a worker does not need it
+        return {**self.__dict__, "_execution_policy": None}
 
     def name(self):
         return self._name
@@ -35,3 +62,30 @@ class BasicTool(BaseTool):
 
     def execute(self, *args, **kwargs):
         return self._execute(*args, **kwargs)
+
+    def thread_safe(self):
+        return self._thread_safe
+
+    def early_dispatch(self):
+        return self._early_dispatch
+
+    def cacheable(self):
+        return self._cacheable
+
+    def cache_ttl(self):
+        return self._cache_ttl
+
+    def cache_max_entries(self):
+        return self._cache_max_entries
+
+    def cache_key(self, args):
+        return self._cache_key(args) if self._cache_key else super().cache_key(args)
+
+    def execution_policy(self):
+        return self._execution_policy
+
+    def timeout(self):
+        return self._timeout
+
+    def is_async(self):
+        return inspect.iscoroutinefunction(self._execute)
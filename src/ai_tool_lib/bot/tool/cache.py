@@ -0,0 +1,139 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Awaitable, Callable
+
+from pydantic import TypeAdapter
+
+from ai_tool_lib.bot.tool.response import ToolResponse
+from ai_tool_lib.utils.cache import BaseCache, MemoryCache
+
+if TYPE_CHECKING:
+    from ai_tool_lib.bot.tool.base_tool import BaseTool
+
+_response_adapter: TypeAdapter[ToolResponse] = TypeAdapter(ToolResponse)
+
+
+class ToolResultCache:
+    """
+    Memoizes the responses of cacheable tools. Identical calls that are in flight at
+    the same time are coalesced so the tool only executes once.
+    """
+
+    def __init__(self, backend: BaseCache | None = None):
+        """
+        :param backend: Cache shared by all tools, e.g. a SQLiteCache. Defaults to an in-process
+            MemoryCache per tool sized by the tool's cache_max_entries.
+        """
+        self.backend = backend
+        self._tool_caches: dict[str, BaseCache] = {}
+        self._in_flight: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def call(self, tool: BaseTool, args: dict, execute: Callable[[], ToolResponse]) -> ToolResponse:
+        """
+        Get a tool response from the cache or execute the tool.
+        :param tool: The tool.
+        :param args: Arguments the tool is called with.
+        :param execute: Executes the tool.
+        """
+        return self.fetch(tool, args, execute)[0]
+
+    async def acall(self, tool: BaseTool, args: dict, execute: Callable[[], Awaitable[ToolResponse]]) -> ToolResponse:
+        """
+        Async version of call.
+        :param tool: The tool.
+        :param args: Arguments the tool is called with.
+        :param execute: Returns an awaitable that executes the tool.
+        """
+        return (await self.afetch(tool, args, execute))[0]
+
+    def fetch(self, tool: BaseTool, args: dict, execute: Callable[[], ToolResponse]) -> tuple[ToolResponse, bool]:
+        """
+        Like call, also returns whether the response was a hit, that is the tool was not executed for this call.
+        A call coalesced with an identical one in flight is a hit.
+        :param tool: The tool.
+        :param args: Arguments the tool is called with.
+        :param execute: Executes the tool.
+        """
+        key, cache, found, owner = self._begin(tool, args)
+        if not isinstance(found, Future):
+            return found, True
+        future = found
+        if not owner:
+            return future.result(), True
+        try:
+            resp = execute()
+        except BaseException as e:
+            self._end(key, future, exception=e)
+            raise
+        cache.set(key, _response_adapter.dump_json(resp).decode(), tool.cache_ttl())
+        self._end(key, future, resp=resp)
+        return resp, False
+
+    async def afetch(
+        self, tool: BaseTool, args: dict, execute: Callable[[], Awaitable[ToolResponse]]
+    ) -> tuple[ToolResponse, bool]:
+        """
+        Async version of fetch.
+        :param tool: The tool.
+        :param args: Arguments the tool is called with.
+        :param execute: Returns an awaitable that executes the tool.
+        """
+        key, cache, found, owner = self._begin(tool, args)
+        if not isinstance(found, Future):
+            return found, True
+        future = found
+        if not owner:
+            return await asyncio.wrap_future(future), True
+        try:
+            resp = await execute()
+        except BaseException as e:
+            self._end(key, future, exception=e)
+            raise
+        cache.set(key, _response_adapter.dump_json(resp).decode(), tool.cache_ttl())
+        self._end(key, future, resp=resp)
+        return resp, False
+
+    def _begin(self, tool: BaseTool, args: dict) -> tuple[str, BaseCache, ToolResponse | Future, bool]:
+        # returns the cached response, or the future of the call in flight and whether this call owns it
+        key = f"tool:{tool.name()}:{tool.cache_key(args)}"
+        cache = self._get_cache(tool)
+        value = cache.get(key)
+        if value is not None:
+            return key, cache, _response_adapter.validate_json(value), False
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future:
+                return key, cache, future, False
+            # another call may have finished between the lookup and taking the lock
+            value = cache.get(key)
+            if value is not None:
+                return key, cache, _response_adapter.validate_json(value), False
+            future = Future()
+            self._in_flight[key] = future
+            return key, cache, future, True
+
+    def _end(self, key: str, future: Future, resp: ToolResponse | None = None, exception: BaseException | None = None):
+        with self._lock:
+            self._in_flight.pop(key, None)
+        if exception:
+            future.set_exception(exception)
+        else:
+            future.set_result(resp)
+
+    def _get_cache(self, tool: BaseTool) -> BaseCache:
+        # caches are sized, an empty one is falsy
+        if self.backend is not None:
+            return self.backend
+        with self._lock:
+            cache = self._tool_caches.get(tool.name())
+            if cache is None:
+                cache = self._tool_caches[tool.name()] = MemoryCache(max_entries=tool.cache_max_entries())
+            return cache
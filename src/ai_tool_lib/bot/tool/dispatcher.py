@@ -0,0 +1,195 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+from __future__ import annotations
+
+import asyncio
+import json
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, AsyncIterator, Generator, Iterable
+
+from ai_tool_lib.bot.event import BotToolCallEndEvent, BotToolCallStartEvent
+from ai_tool_lib.bot.message import BotMessage, BotMessageRole
+from ai_tool_lib.bot.results import BotToolCall
+from ai_tool_lib.bot.tool.response import ToolBotResponse, ToolUserResponse
+from ai_tool_lib.error.tool import ToolNotDefinedError
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+    from ai_tool_lib.bot.event import BotEvent
+    from ai_tool_lib.bot.message import BotToolMessage
+    from ai_tool_lib.bot.results import BotResults
+    from ai_tool_lib.bot.tool.handler import ToolHandler
+    from ai_tool_lib.bot.tool.response import ToolResponse
+
+
+class ToolCallDispatcher:
+    """
+    Dispatches the tool calls from a single bot response as they become available
+    and records their responses in call order.
+    """
+
+    def __init__(
+        self,
+        tool_handler: ToolHandler,
+        results: BotResults,
+        executor: Executor | None = None,
+        *,
+        parallel: bool = False,
+    ):
+        """
+        :param tool_handler: Tool handler for the current iteration.
+        :param results: Current results, tool calls are appended to it.
+        :param executor: Executor used for parallel tool calls and for sync tools called from async code.
+        :param parallel: Run thread safe tools concurrently on the executor. They are submitted as soon as they are
+            dispatched, so when an earlier call gives a user response they may already have run. Their responses
+            are discarded and they are not recorded. Tools that are not thread safe run in order and never after a
+            user response.
+        """
+        self.tool_handler = tool_handler
+        self.results = results
+        self.executor = executor
+        self.parallel = parallel and executor is not None
+        self.messages: list[BotMessage] = []
+        """ Tool messages to send back to the bot. """
+        self.done = False
+        """ Whether a tool provided a user response, no further tool calls are made once set. """
+        self._pending: list[tuple[BotToolMessage, dict, Future | asyncio.Future | None]] = []
+        self._span = results.iteration_span
+
+    def validate(self, calls: Iterable[BotToolMessage]):
+        """
+        Check tool calls before any of them is executed, so a malformed call does not leave the calls before it
+        executed when the bot is asked to retry.
+        :param calls: Tool call requests from the bot.
+        """
+        for call in calls:
+            self.tool_handler.validate(call.name, json.loads(call.args))
+
+    def can_dispatch_early(self, call: BotToolMessage) -> bool:
+        """
+        Whether a tool call may be dispatched while the response is still streaming, see BaseTool.early_dispatch.
+        :param call: Tool call request from the bot.
+        """
+        tool = self.tool_handler.registry.get(call.name)
+        return tool is not None and tool.early_dispatch()
+
+    def dispatch(self, call: BotToolMessage) -> Generator[BotEvent, None, None]:
+        """
+        Dispatch a tool call. In sequential mode the tool is executed immediately,
+        in parallel mode it is submitted to the executor.
+        :param call: Tool call request from the bot.
+        """
+        if self.done:
+            return
+        args = json.loads(call.args)
+        yield BotToolCallStartEvent(id=call.id, tool=call.name, args=args)
+        if not self.parallel:
+            resp = self.tool_handler.call(call.name, args, self._span, self.results.remaining_time())
+            yield from self._record(call, args, resp)
+            return
+        future = None
+        executor = self.executor
+        if executor is not None and self._can_run_parallel(call):
+            future = executor.submit(self.tool_handler.call, call.name, args, self._span, self.results.remaining_time())
+        self._pending.append((call, args, future))
+        yield from self._flush(block=False)
+
+    def finish(self) -> Generator[BotEvent, None, list[BotMessage]]:
+        """Wait for all dispatched tool calls and return the tool messages for the bot."""
+        try:
+            yield from self._flush(block=True)
+        finally:
+            self._cancel()
+        return self.messages
+
+    async def adispatch(self, call: BotToolMessage) -> AsyncIterator[BotEvent]:
+        """
+        Async version of dispatch.
+        :param call: Tool call request from the bot.
+        """
+        if self.done:
+            return
+        args = json.loads(call.args)
+        yield BotToolCallStartEvent(id=call.id, tool=call.name, args=args)
+        if not self.parallel:
+            resp = await self.tool_handler.acall(
+                call.name, args, self.executor, self._span, self.results.remaining_time()
+            )
+            for event in self._record(call, args, resp):
+                yield event
+            return
+        task = None
+        if self._can_run_parallel(call):
+            task = asyncio.ensure_future(
+                self.tool_handler.acall(call.name, args, self.executor, self._span, self.results.remaining_time())
+            )
+        self._pending.append((call, args, task))
+        async for event in self._aflush(block=False):
+            yield event
+
+    async def afinish(self) -> AsyncIterator[BotEvent]:
+        """Async version of finish, the tool messages are available from `messages` once exhausted."""
+        try:
+            async for event in self._aflush(block=True):
+                yield event
+        finally:
+            self._cancel()
+
+    def _flush(self, *, block: bool) -> Generator[BotEvent, None, None]:
+        # record finished calls in order, stopping at the first one still running unless blocking
+        while self._pending and not self.done:
+            call, args, future = self._pending[0]
+            if not block and (future is None or not future.done()):
+                return
+            self._pending.pop(0)
+            resp = (
+                future.result()
+                if future
+                else self.tool_handler.call(call.name, args, self._span, self.results.remaining_time())
+            )
+            yield from self._record(call, args, resp)
+
+    async def _aflush(self, *, block: bool) -> AsyncIterator[BotEvent]:
+        while self._pending and not self.done:
+            call, args, task = self._pending[0]
+            if not block and (task is None or not task.done()):
+                return
+            self._pending.pop(0)
+            resp = (
+                # sync tools wrap a concurrent future, which can't be awaited directly
+                await (asyncio.wrap_future(task) if isinstance(task, Future) else task)
+                if task
+                else await self.tool_handler.acall(
+                    call.name, args, self.executor, self._span, self.results.remaining_time()
+                )
+            )
+            for event in self._record(call, args, resp):
+                yield event
+
+    def _record(self, call: BotToolMessage, args: dict, resp: ToolResponse) -> Generator[BotEvent, None, None]:
+        tool_call = BotToolCall(tool=call.name, args=args, response=resp)
+        self.results.tool_calls.append(tool_call)
+        # tool provided a user answer
+        if isinstance(resp, ToolUserResponse):
+            self.messages.append(BotMessage(role=BotMessageRole.TOOL, content="(done)", tool_call_id=call.id))
+            self.done = True
+        # tool provided a response for the bot to read
+        elif isinstance(resp, ToolBotResponse):
+            self.messages.append(BotMessage(role=BotMessageRole.TOOL, content=resp.content, tool_call_id=call.id))
+        yield BotToolCallEndEvent(id=call.id, tool_call=tool_call)
+
+    def _can_run_parallel(self, call: BotToolMessage) -> bool:
+        try:
+            return self.tool_handler.get_tool(call.name).thread_safe()
+        except ToolNotDefinedError:
+            # let the error surface in call order
+            return False
+
+    def _cancel(self):
+        for _, _, future in self._pending:
+            if future:
+                future.cancel()
+        self._pending = []
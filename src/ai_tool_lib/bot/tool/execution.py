@@ -0,0 +1,360 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import importlib
+import inspect
+import itertools
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
+import traceback
+import weakref
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Any, Iterable
+
+from ai_tool_lib.error.tool import ToolTimeoutError, ToolWorkerError
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+    from multiprocessing.connection import Connection
+
+    from ai_tool_lib.bot.tool.base_tool import BaseTool
+    from ai_tool_lib.bot.tool.response import ToolResponse
+
+
+class BaseExecutionPolicy:
+    """Decides where tools are executed and how long they may take."""
+
+    def __init__(self, timeout: float | None = None, *, timeout_response: bool = True):
+        """
+        :param timeout: Seconds a tool may take, tools can set their own. None for no deadline.
+        :param timeout_response: Tell the bot a tool timed out so it can react, instead of raising ToolTimeoutError.
+        """
+        self.timeout = timeout
+        self.timeout_response = timeout_response
+
+    @staticmethod
+    def name() -> str:
+        return "base"
+
+    def get_timeout(self, tool: BaseTool, limit: float | None = None) -> float | None:
+        """
+        The deadline of a tool, its own timeout or the policy's.
+        :param tool: The tool.
+        :param limit: Seconds the caller can wait at most, e.g. what is left of the run's latency budget.
+        """
+        timeout = tool.timeout()
+        if timeout is None:
+            timeout = self.timeout
+        if limit is None:
+            return timeout
+        limit = max(limit, 0.0)
+        return limit if timeout is None else min(timeout, limit)
+
+    def execute(self, tool: BaseTool, args: dict, timeout: float | None = None) -> ToolResponse:  # noqa: ARG002
+        """
+        Execute a tool, raises ToolTimeoutError if it misses its deadline.
+        :param tool: The tool.
+        :param args: Validated arguments for the tool.
+        :param timeout: Seconds the tool may take, see get_timeout.
+        """
+        return _run_tool(tool, args)
+
+    async def aexecute(
+        self, tool: BaseTool, args: dict, timeout: float | None = None, executor: Executor | None = None
+    ) -> ToolResponse:
+        """
+        Execute a tool without blocking the event loop, raises ToolTimeoutError if it misses its deadline.
+        :param tool: The tool.
+        :param args: Validated arguments for the tool.
+        :param timeout: Seconds the tool may take, see get_timeout.
+        :param executor: Executor the caller runs sync work on, defaults to the event loop's default executor.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(self.execute, tool, args, timeout))
+
+    def shutdown(self):
+        """Release the policy's threads or processes."""
+
+
+class InlineExecutionPolicy(BaseExecutionPolicy):
+    """
+    Executes sync tools on the calling thread and async tools on the calling event loop. Async tools are
+    cancelled at their deadline, a sync tool cannot be interrupted so its deadline only applies when it is
+    called from async code, where it runs on the caller's executor and is abandoned at the deadline.
+    """
+
+    @staticmethod
+    def name() -> str:
+        return "inline"
+
+    def execute(self, tool: BaseTool, args: dict, timeout: float | None = None) -> ToolResponse:
+        resp = tool.execute(**args)
+        # async tool called from sync code, run it to completion on its own loop
+        if inspect.isawaitable(resp):
+            resp = asyncio.run(_wait_for(resp, timeout, tool))
+        return resp
+
+    async def aexecute(
+        self, tool: BaseTool, args: dict, timeout: float | None = None, executor: Executor | None = None
+    ) -> ToolResponse:
+        if tool.is_async():
+            return await _wait_for(tool.execute(**args), timeout, tool)
+        loop = asyncio.get_running_loop()
+        resp = await _wait_for(loop.run_in_executor(executor, functools.partial(tool.execute, **args)), timeout, tool)
+        if inspect.isawaitable(resp):
+            resp = await _wait_for(resp, timeout, tool)
+        return resp
+
+
+class ThreadExecutionPolicy(BaseExecutionPolicy):
+    """
+    Executes tools on the policy's own thread pool, so the caller stops waiting at the deadline. A timed out
+    thread cannot be stopped and keeps its worker until the tool returns, use ProcessExecutionPolicy for
+    tools that may hang.
+    """
+
+    def __init__(self, max_workers: int | None = None, **kwargs):
+        """
+        :param max_workers: Size of the thread pool, defaults to the ThreadPoolExecutor default.
+        """
+        super().__init__(**kwargs)
+        self.max_workers = max_workers
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def name() -> str:
+        return "thread"
+
+    def execute(self, tool: BaseTool, args: dict, timeout: float | None = None) -> ToolResponse:
+        future = self._get_executor().submit(_run_tool, tool, args)
+        # wait rather than future.result(timeout), a TimeoutError raised by the tool itself is not a missed deadline
+        if timeout is not None and not wait([future], timeout).done:
+            future.cancel()
+            raise ToolTimeoutError(tool.name(), timeout)
+        return future.result()
+
+    async def aexecute(
+        self,
+        tool: BaseTool,
+        args: dict,
+        timeout: float | None = None,
+        executor: Executor | None = None,  # noqa: ARG002
+    ) -> ToolResponse:
+        loop = asyncio.get_running_loop()
+        return await _wait_for(loop.run_in_executor(self._get_executor(), _run_tool, tool, args), timeout, tool)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="ai_tool_lib_tool")
+        return self._executor
+
+
+class ProcessExecutionPolicy(BaseExecutionPolicy):
+    """
+    Executes tools in a pool of warm worker processes, for CPU heavy tools that would hold the GIL against
+    other sessions and for tools that may hang. A worker that misses a deadline is killed and replaced.
+
+    Tools are pickled once and sent to each worker the first time it executes them, arguments and responses
+    are pickled with the highest protocol. Tools must be picklable, e.g. BasicTools executing module level
+    functions. With the default "spawn" start method the worker imports the tool's module, so scripts must
+    guard their entry point with `if __name__ == "__main__":`.
+    """
+
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        start_method: str | None = "spawn",
+        preload: Iterable[str] = (),
+        **kwargs,
+    ):
+        """
+        :param max_workers: Number of worker processes, defaults to the number of CPUs.
+        :param start_method: Multiprocessing start method, None for the platform default.
+        :param preload: Modules every worker imports when it starts, so the first tool calls do not pay for them.
+        """
+        super().__init__(**kwargs)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.preload = list(preload)
+        self._context = multiprocessing.get_context(start_method)
+        self._payloads: weakref.WeakKeyDictionary[BaseTool, tuple[int, bytes]] = weakref.WeakKeyDictionary()
+        self._keys = itertools.count()
+        self._lock = threading.Lock()
+        # idle workers, None stands for a worker that is not started yet
+        self._idle: queue.LifoQueue[_Worker | None] = queue.LifoQueue()
+        for _ in range(self.max_workers):
+            self._idle.put(None)
+
+    @staticmethod
+    def name() -> str:
+        return "process"
+
+    def start(self):
+        """Start every worker now rather than when they are first needed, returns once they are ready."""
+        workers = [self._idle.get() for _ in range(self.max_workers)]
+        try:
+            workers = [worker or _Worker(self._context, self.preload) for worker in workers]
+            for worker in workers:
+                worker.load(None, None)
+        finally:
+            for worker in workers:
+                self._idle.put(worker)
+
+    def execute(self, tool: BaseTool, args: dict, timeout: float | None = None) -> ToolResponse:
+        key, payload = self._get_payload(tool)
+        if timeout is None:
+            worker = self._idle.get()
+        else:
+            try:
+                worker = self._idle.get(timeout=timeout)
+            except queue.Empty:
+                raise ToolTimeoutError(tool.name(), timeout) from None
+        try:
+            worker = worker or _Worker(self._context, self.preload)
+            resp, error = self._call(worker, tool, key, payload, args, timeout)
+        except BaseException:
+            # the worker may still be executing the tool, its response must not be read by the next call
+            if worker is not None and worker.busy:
+                worker.kill()
+                worker = None
+            raise
+        finally:
+            self._idle.put(worker)
+        if error is not None:
+            raise error
+        return resp
+
+    def shutdown(self):
+        workers = []
+        while True:
+            try:
+                workers.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        for worker in workers:
+            if worker:
+                worker.kill()
+            self._idle.put(None)
+
+    @staticmethod
+    def _call(
+        worker: _Worker, tool: BaseTool, key: int, payload: bytes, args: dict, timeout: float | None
+    ) -> tuple[Any, BaseException | None]:
+        try:
+            # starting the worker and loading the tool do not count against the deadline
+            worker.load(key, payload)
+            worker.send(key, None, args)
+            if timeout is None or worker.conn.poll(timeout):
+                return worker.receive()
+        except (EOFError, OSError):
+            raise ToolWorkerError(tool.name(), worker.kill()) from None
+        raise ToolTimeoutError(tool.name(), timeout)
+
+    def _get_payload(self, tool: BaseTool) -> tuple[int, bytes]:
+        payload = self._payloads.get(tool)
+        if payload is None:
+            with self._lock:
+                payload = self._payloads.get(tool)
+                if payload is None:
+                    payload = self._payloads[tool] = (next(self._keys), pickle.dumps(tool, pickle.HIGHEST_PROTOCOL))
+        return payload
+
+
+class _Worker:
+    """A worker process and the keys of the tools it has loaded."""
+
+    def __init__(self, context: Any, preload: list[str]):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child, preload), daemon=True)
+        self.process.start()
+        child.close()
+        self.tools: set[int] = set()
+        self.busy = False
+
+    def load(self, key: int | None, payload: bytes | None):
+        """Wait for the worker to start and load a tool if it has not yet."""
+        if key is not None and key in self.tools:
+            return
+        self.send(key, payload, None)
+        _, error = self.receive()
+        if error is not None:
+            raise error
+        if key is not None:
+            self.tools.add(key)
+
+    def send(self, key: int | None, payload: bytes | None, args: dict | None):
+        message = pickle.dumps((key, payload, args), pickle.HIGHEST_PROTOCOL)
+        self.busy = True
+        self.conn.send_bytes(message)
+
+    def receive(self) -> tuple[Any, BaseException | None]:
+        """The response of the tool, or the error it raised."""
+        message = self.conn.recv_bytes()
+        self.busy = False
+        return pickle.loads(message)  # noqa: S301
+
+    def kill(self) -> int | None:
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+        return self.process.exitcode
+
+
+def _worker_main(conn: Connection, preload: list[str]):
+    for module in preload:
+        importlib.import_module(module)
+    tools: dict[int, BaseTool] = {}
+    while True:
+        try:
+            key, payload, args = pickle.loads(conn.recv_bytes())  # noqa: S301
+        except EOFError:
+            return
+        try:
+            # a payload loads a tool, arguments execute a loaded one
+            if payload is not None:
+                tools[key] = pickle.loads(payload)  # noqa: S301
+            resp = None if args is None else _run_tool(tools[key], args)
+            message = pickle.dumps((resp, None), pickle.HIGHEST_PROTOCOL)
+        # whatever the tool raises is sent back and raised by the caller
+        except Exception as e:  # noqa: BLE001
+            e.add_note("".join(traceback.format_exception(e)).rstrip())
+            try:
+                message = pickle.dumps((None, e), pickle.HIGHEST_PROTOCOL)
+            # pickling runs the exception's own code, which can raise anything
+            except Exception:  # noqa: BLE001
+                # the exception itself cannot be pickled, send its description
+                message = pickle.dumps((None, RuntimeError(repr(e))), pickle.HIGHEST_PROTOCOL)
+        conn.send_bytes(message)
+
+
+def _run_tool(tool: BaseTool, args: dict) -> ToolResponse:
+    resp = tool.execute(**args)
+    if inspect.isawaitable(resp):
+        resp = asyncio.run(_wait_for(resp, None, tool))
+    return resp
+
+
+async def _wait_for(awaitable: Any, timeout: float | None, tool: BaseTool) -> Any:
+    task = asyncio.ensure_future(awaitable)
+    # asyncio.wait rather than wait_for, a TimeoutError raised by the tool itself is not a missed deadline
+    done, _ = await asyncio.wait({task}, timeout=timeout)
+    if timeout is not None and not done:
+        task.cancel()
+        raise ToolTimeoutError(tool.name(), timeout)
+    return task.result()
@@ -4,69 +4,217 @@
 
 from __future__ import annotations
 
+import functools
 import logging
-from typing import TYPE_CHECKING, Iterable
+from typing import TYPE_CHECKING, ContextManager, Iterable
 
-from ai_tool_lib.error.tool import ToolListEmptyError, ToolNotDefinedError
+from ai_tool_lib.bot.metrics import BotSpanKind, record_span
+from ai_tool_lib.bot.tool.execution import InlineExecutionPolicy
+from ai_tool_lib.bot.tool.registry import ToolRegistry
+from ai_tool_lib.bot.tool.response import ToolBotResponse
+from ai_tool_lib.bot.tool.validator import compile_validator
+from ai_tool_lib.error.tool import ToolListEmptyError, ToolNotDefinedError, ToolTimeoutError
 
 if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+    from ai_tool_lib.bot.metrics import BaseMetricsHook, BotSpan
     from ai_tool_lib.bot.tool.base_tool import BaseTool
+    from ai_tool_lib.bot.tool.cache import ToolResultCache
+    from ai_tool_lib.bot.tool.execution import BaseExecutionPolicy
     from ai_tool_lib.bot.tool.response import ToolResponse
 
 
 class ToolHandler:
     """Handles tool calls."""
 
-    def __init__(self, tools: Iterable[BaseTool], logger: logging.Logger | None = None):
-        self.tools = list(tools)
+    def __init__(
+        self,
+        tools: Iterable[BaseTool] | ToolRegistry,
+        logger: logging.Logger | None = None,
+        cache: ToolResultCache | None = None,
+        metrics: BaseMetricsHook | None = None,
+        execution_policy: BaseExecutionPolicy | None = None,
+    ):
+        """
+        :param tools: The tools that can be called, a registry is used as is without validating its tools again.
+        :param logger: Optional logger.
+        :param cache: Memoizes the responses of cacheable tools.
+        :param metrics: Receives the timing spans of tool calls as they end.
+        :param execution_policy: Where tools are executed and their deadline, unless a tool has its own policy.
+            Defaults to executing tools inline.
+        """
+        self.registry = tools if isinstance(tools, ToolRegistry) else ToolRegistry(tools)
         self.logger = logger
+        self.cache = cache
+        self.metrics = metrics
+        self.execution_policy = execution_policy or InlineExecutionPolicy()
         self._log("Init tool handler.", tool_names=[t.name() for t in self.tools])
-        if not self.tools:
+        if not len(self.registry):
             err_msg = "tool handler requires at least one tool"
             raise ToolListEmptyError(err_msg)
-        for tool in self.tools:
-            for prop in tool.properties():
-                prop.validate_property()
 
-    def call(self, name: str, args: dict) -> ToolResponse:
+    @property
+    def tools(self) -> list[BaseTool]:
+        return self.registry.tools
+
+    def get_tool(self, name: str) -> BaseTool:
+        """
+        Find a tool from its name.
+        :param name: The tool name.
+        """
+        tool = self.registry.get(name)
+        if not tool:
+            raise ToolNotDefinedError(name)
+        return tool
+
+    def validate(self, name: str, args: dict):
+        """
+        Check a tool call without executing it, raises a MalformedBotResponseError if the tool is not defined
+        or the arguments are invalid.
+        :param name: The tool name.
+        :param args: Arguments to pass in to the tool.
+        """
+        try:
+            self._validate_args(self.get_tool(name), name, args)
+        except Exception as e:
+            self._log_error(name, args, e)
+            raise
+
+    def call(self, name: str, args: dict, span: BotSpan | None = None, limit: float | None = None) -> ToolResponse:
         """
         Find and execute a tool from its name.
         :param name: The tool name.
         :param args: Arguments to pass in to the tool, should match the tool's properties.
+        :param span: Span to add the tool call's span to, e.g. the current iteration's.
+        :param limit: Seconds the caller can wait at most, it caps the tool's deadline.
         """
+        self._log_call(name, args)
+        with self._span(span, BotSpanKind.TOOL, name) as tool_span:
+            tool = self.get_tool(name)
+            cached = False
+            try:
+                with self._span(tool_span, BotSpanKind.VALIDATION, name):
+                    self._validate_args(tool, name, args)
+                if self.cache and tool.cacheable():
+                    resp, cached = self.cache.fetch(
+                        tool, args, functools.partial(self._execute, tool, args, tool_span, limit)
+                    )
+                else:
+                    resp = self._execute(tool, args, tool_span, limit)
+            except ToolTimeoutError as e:
+                resp = self._timed_out(tool, args, e, tool_span)
+            except Exception as e:
+                self._log_error(name, args, e)
+                raise
+            tool_span.attributes["cached"] = cached
+        self._log_response(tool, name, args, resp)
+        return resp
+
+    async def acall(
+        self,
+        name: str,
+        args: dict,
+        executor: Executor | None = None,
+        span: BotSpan | None = None,
+        limit: float | None = None,
+    ) -> ToolResponse:
+        """
+        Find and execute a tool from its name without blocking the event loop.
+        Async tools are awaited, sync tools are offloaded to an executor.
+        :param name: The tool name.
+        :param args: Arguments to pass in to the tool, should match the tool's properties.
+        :param executor: Executor used to run sync tools, defaults to the event loop's default executor.
+        :param span: Span to add the tool call's span to, e.g. the current iteration's.
+        :param limit: Seconds the caller can wait at most, it caps the tool's deadline.
+        """
+        self._log_call(name, args)
+        with self._span(span, BotSpanKind.TOOL, name) as tool_span:
+            tool = self.get_tool(name)
+            cached = False
+            try:
+                with self._span(tool_span, BotSpanKind.VALIDATION, name):
+                    self._validate_args(tool, name, args)
+                if self.cache and tool.cacheable():
+                    resp, cached = await self.cache.afetch(
+                        tool, args, functools.partial(self._aexecute, tool, args, executor, tool_span, limit)
+                    )
+                else:
+                    resp = await self._aexecute(tool, args, executor, tool_span, limit)
+            except ToolTimeoutError as e:
+                resp = self._timed_out(tool, args, e, tool_span)
+            except Exception as e:
+                self._log_error(name, args, e)
+                raise
+            tool_span.attributes["cached"] = cached
+        self._log_response(tool, name, args, resp)
+        return resp
+
+    def _execute(
+        self, tool: BaseTool, args: dict, span: BotSpan | None = None, limit: float | None = None
+    ) -> ToolResponse:
+        policy = self._get_execution_policy(tool)
+        with self._span(span, BotSpanKind.EXECUTION, tool.name()):
+            return policy.execute(tool, args, policy.get_timeout(tool, limit))
+
+    async def _aexecute(
+        self,
+        tool: BaseTool,
+        args: dict,
+        executor: Executor | None,
+        span: BotSpan | None = None,
+        limit: float | None = None,
+    ) -> ToolResponse:
+        policy = self._get_execution_policy(tool)
+        with self._span(span, BotSpanKind.EXECUTION, tool.name()):
+            return await policy.aexecute(tool, args, policy.get_timeout(tool, limit), executor)
+
+    def _get_execution_policy(self, tool: BaseTool) -> BaseExecutionPolicy:
+        return tool.execution_policy() or self.execution_policy
+
+    def _timed_out(self, tool: BaseTool, args: dict, e: ToolTimeoutError, span: BotSpan) -> ToolResponse:
+        self._log_error(tool.name(), args, e)
+        span.attributes["timed_out"] = True
+        if not self._get_execution_policy(tool).timeout_response:
+            raise e
+        # responded outside of the cache so the timeout is not memoized
+        return ToolBotResponse(content=e.bot_message())
+
+    def _span(self, parent: BotSpan | None, kind: BotSpanKind, name: str) -> ContextManager[BotSpan]:
+        return record_span(parent, kind, name, self.metrics)
+
+    def _validate_args(self, tool: BaseTool, name: str, args: dict):
+        validator = self.registry.validator(name)
+        if validator is None:
+            validator = compile_validator(name, tool.properties())
+        validator(args)
+
+    def _log_call(self, name: str, args: dict):
         self._log(
             message=f"Call tool '{name!s}'.", action="call", object=f"tool '{name!s}'", tool_name=name, tool_args=args
         )
-        try:
-            for tool in self.tools:
-                if tool.name() == name:
-                    # check properties
-                    for prop in tool.properties():
-                        prop.validate_property_value(args.get(prop.name), name)
-                    # call tool
-                    resp = tool.execute(**args)
-                    self._log(
-                        message=f"Tool '{name!s}' response.",
-                        action="response",
-                        object=tool,
-                        tool_name=name,
-                        tool_args=args,
-                        tool_response=resp,
-                    )
-                    return resp
-        except Exception as e:
-            self._log(
-                message=f"Tool '{name!s}' error.",
-                level=logging.ERROR,
-                action="error",
-                object=f"tool '{name!s}'",
-                tool_name=name,
-                tool_args=args,
-                error_class=e.__class__.__name__,
-                error=str(e),
-            )
-            raise
-        raise ToolNotDefinedError(name)
+
+    def _log_response(self, tool: BaseTool, name: str, args: dict, resp: ToolResponse):
+        self._log(
+            message=f"Tool '{name!s}' response.",
+            action="response",
+            object=tool,
+            tool_name=name,
+            tool_args=args,
+            tool_response=resp,
+        )
+
+    def _log_error(self, name: str, args: dict, e: Exception):
+        self._log(
+            message=f"Tool '{name!s}' error.",
+            level=logging.ERROR,
+            action="error",
+            object=f"tool '{name!s}'",
+            tool_name=name,
+            tool_args=args,
+            error_class=e.__class__.__name__,
+            error=str(e),
+        )
 
     def _log(self, message: str = "", level: int = logging.INFO, **kwargs):
         if self.logger:
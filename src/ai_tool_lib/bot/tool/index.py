@@ -0,0 +1,204 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+from __future__ import annotations
+
+import heapq
+import math
+import re
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Sequence
+
+from ai_tool_lib.bot.tool.registry import ToolRegistry
+
+if TYPE_CHECKING:
+    from ai_tool_lib.bot.results import BotResults
+    from ai_tool_lib.bot.tool.base_tool import BaseTool
+
+EmbedFunction = Callable[[list[str]], Sequence[Sequence[float]]]
+""" Returns an embedding vector for each of the given texts. """
+
+_WORD = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+")
+
+# a word list reads better as one string
+STOPWORDS = frozenset(
+    "a an and are as at be by can do for from how i in is it me my of on or so that the this to "  # noqa: SIM905
+    "was what when where which who will with you your".split()
+)
+""" Words too common to tell tools apart, they are not indexed. """
+
+MAX_QUERY_MESSAGE_LENGTH = 2000
+""" Characters of each message used to rank tools, long tool outputs are cut. """
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Split text into lowercase words without stopwords, snake_case and camelCase names are split into their words.
+    :param text: The text.
+    """
+    return [w for w in map(str.lower, _WORD.findall(text)) if w not in STOPWORDS]
+
+
+class ToolIndex:
+    """
+    Offers the bot only the tools most relevant to the conversation, for tool catalogs too large to
+    send with every request. Tools are ranked with BM25 over their names, descriptions and property
+    descriptions, optionally blended with the cosine similarity of embeddings.
+
+    Pass the index as a client's tools, it is called with the run's results before every request.
+    Selected tools keep their catalog order so the same selection renders the same request.
+    """
+
+    def __init__(
+        self,
+        tools: Iterable[BaseTool] | ToolRegistry,
+        *,
+        top_k: int = 8,
+        pinned: Iterable[str] = (),
+        embed: EmbedFunction | None = None,
+        semantic_weight: float = 0.5,
+        query_messages: int = 4,
+        keep_called: bool = True,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        """
+        :param tools: The tool catalog, a registry is re-indexed whenever its tool set changes.
+        :param top_k: Number of ranked tools to offer, in addition to pinned and kept tools.
+        :param pinned: Names of tools that are always offered, e.g. the tool that responds to the user.
+        :param embed: Optional embedding function, tool embeddings are computed once when the catalog is indexed.
+            Requires the numpy package.
+        :param semantic_weight: Weight of the embedding similarity against the BM25 score, from 0 to 1.
+        :param query_messages: Number of latest session messages ranked against, along with the prompt.
+        :param keep_called: Keep offering tools the bot already called during the run.
+        :param k1: BM25 term frequency saturation.
+        :param b: BM25 document length normalization.
+        """
+        self.registry = tools if isinstance(tools, ToolRegistry) else ToolRegistry(tools)
+        self.top_k = top_k
+        self.pinned = set(pinned)
+        self.embed = embed
+        self.semantic_weight = semantic_weight
+        self.query_messages = query_messages
+        self.keep_called = keep_called
+        self.k1 = k1
+        self.b = b
+        self._np: Any = None
+        if embed:
+            # optional dependency, only imported when embeddings are used
+            try:
+                import numpy as np  # noqa: PLC0415
+            except ImportError as e:
+                err_msg = "ToolIndex embeddings require the numpy package, install it with `pip install numpy`"
+                raise ImportError(err_msg) from e
+            self._np = np
+        self._index: _Index | None = None
+        self._lock = threading.Lock()
+
+    def __call__(self, results: BotResults) -> list[BaseTool]:
+        keep = {c.tool for c in results.tool_calls} if self.keep_called else set()
+        return self.select(self.query(results), keep)
+
+    def query(self, results: BotResults) -> str:
+        """
+        Text the tools are ranked against, the prompt and the latest messages of the session.
+        :param results: The run's results.
+        """
+        messages = results.session.messages[-self.query_messages :] if self.query_messages else []
+        return "\n".join([results.prompt, *(m.content[:MAX_QUERY_MESSAGE_LENGTH] for m in messages if m.content)])
+
+    def search(self, query: str, top_k: int | None = None) -> list[tuple[BaseTool, float]]:
+        """
+        Rank the tools against a query, returns the matching tools and their scores, best first.
+        :param query: The query.
+        :param top_k: Maximum number of tools to return, defaults to the index's top_k.
+        """
+        index = self._get_index()
+        scores = self._score(index, query)
+        matches = [i for i in range(len(index.tools)) if scores[i] > 0]
+        best = heapq.nlargest(self.top_k if top_k is None else top_k, matches, key=scores.__getitem__)
+        return [(index.tools[i], float(scores[i])) for i in best]
+
+    def select(self, query: str, keep: Iterable[str] = ()) -> list[BaseTool]:
+        """
+        Select the tools to offer for a query, the best ranked ones and the pinned and kept ones, in catalog order.
+        When no tool matches the query at all the first top_k tools of the catalog are offered.
+        :param query: The query.
+        :param keep: Names of other tools to offer.
+        """
+        index = self._get_index()
+        names = self.pinned | set(keep)
+        ranked = self.search(query)
+        names.update(t.name() for t, _ in ranked)
+        if not ranked:
+            names.update(t.name() for t in index.tools[: self.top_k])
+        return [t for t in index.tools if t.name() in names]
+
+    def _score(self, index: _Index, query: str) -> Any:
+        scores = [0.0] * len(index.tools)
+        count = len(index.tools)
+        for term in set(tokenize(query)):
+            postings = index.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * index.lengths[doc] / index.average_length)
+                scores[doc] += idf * tf * (self.k1 + 1) / (tf + norm)
+        embed = self.embed
+        if not embed:
+            return scores
+        np = self._np
+        vector = np.asarray(embed([query])[0], dtype=float)
+        vector /= np.linalg.norm(vector) or 1.0
+        # BM25 scores are unbounded, scale them to the range of cosine similarities before blending
+        bm25 = np.asarray(scores)
+        bm25 /= bm25.max() or 1.0
+        return (1 - self.semantic_weight) * bm25 + self.semantic_weight * (self._get_vectors(index, embed) @ vector)
+
+    def _get_index(self) -> _Index:
+        index = self._index
+        if index is None or index.version != self.registry.version:
+            with self._lock:
+                index = self._index
+                if index is None or index.version != self.registry.version:
+                    index = self._index = _Index(self.registry.version, self.registry.tools)
+        return index
+
+    def _get_vectors(self, index: _Index, embed: EmbedFunction) -> Any:
+        if index.vectors is None:
+            with self._lock:
+                if index.vectors is None:
+                    np = self._np
+                    vectors = np.asarray(embed(index.texts), dtype=float)
+                    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+                    norms[norms == 0] = 1.0
+                    index.vectors = vectors / norms
+        return index.vectors
+
+
+class _Index:
+    """Inverted index of a tool set."""
+
+    def __init__(self, version: int, tools: list[BaseTool]):
+        self.version = version
+        self.tools = tools
+        self.texts: list[str] = []
+        self.postings: dict[str, list[tuple[int, int]]] = {}
+        self.lengths: list[int] = []
+        self.vectors: Any = None
+        for i, tool in enumerate(tools):
+            text = " ".join(
+                [tool.name(), tool.description(), *(f"{p.name} {p.description}" for p in tool.properties())]
+            )
+            self.texts.append(text)
+            # the name is the strongest signal of what a tool does, count its words twice
+            words = tokenize(tool.name()) + tokenize(text)
+            self.lengths.append(len(words))
+            counts: dict[str, int] = {}
+            for word in words:
+                counts[word] = counts.get(word, 0) + 1
+            for word, tf in counts.items():
+                self.postings.setdefault(word, []).append((i, tf))
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 1.0
@@ -4,16 +4,12 @@
 
 from __future__ import annotations
 
-from typing import Any, Self, TypeVar
+import re
+from typing import Any, Callable, Self, TypeVar
 
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
 
-from ai_tool_lib.error.tool import (
-    ToolPropertyChoiceTypeError,
-    ToolPropertyInvalidError,
-    ToolPropertyMissingError,
-    ToolPropertyTypeError,
-)
+from ai_tool_lib.error.tool import ToolPropertyChoiceTypeError, ToolPropertyTypeError
 
 T = TypeVar("T", bound=type)
 
@@ -32,30 +28,69 @@ class PropertyDefinition(BaseModel):
     description: str
     """ Description of property. """
 
-    range_min: int | None = 0
+    range_min: int | float | None = 0
     """ Minimum value for numeric property type. """
 
-    range_max: int | None = 0
+    range_max: int | float | None = 0
     """ Maximum value for numeric property type. """
 
+    min_length: int | None = None
+    """ Minimum length of a string, or number of items in an array. """
+
+    max_length: int | None = None
+    """ Maximum length of a string, or number of items in an array. """
+
+    pattern: str | None = None
+    """ Regular expression a string value must match. """
+
+    items: PropertyDefinition | None = None
+    """ Definition of the items of an array, defaults to strings. """
+
+    properties: list[PropertyDefinition] | None = None
+    """ Definitions of the properties of an object. """
+
     choices: list | None = None
     """ List of allowed property values. """
 
     required: bool = False
     """ Whether property is required. """
 
+    _check: Callable[[dict], list[tuple[str, str]]] | None = PrivateAttr(None)
+
+    def __getstate__(self) -> dict[Any, Any]:
+        # the compiled check is a closure that cannot be pickled, it is compiled again when needed
+        state = super().__getstate__()
+        return {**state, "__pydantic_private__": {**(state["__pydantic_private__"] or {}), "_check": None}}
+
     @classmethod
-    def from_json_schema(cls, data: dict[str, dict]) -> list[Self]:
+    def from_json_schema(cls, data: dict[str, dict], required: list[str] | None = None) -> list[Self]:
         out = []
         for k, v in data.items():
-            if "type" in v and isinstance(v["type"], str):
-                for property_type, name in PROPERTY_TYPE_NAMES.items():
-                    if name == v["type"]:
-                        v["property_type"] = property_type
-                        break
-            out.append(cls(name=k, **v))
+            out.append(cls._from_json_schema_property(k, v, required=k in (required or [])))
         return out
 
+    @classmethod
+    def _from_json_schema_property(cls, name: str, schema: dict, *, required: bool) -> Self:
+        property_type = next((t for t, n in PROPERTY_TYPE_NAMES.items() if n == schema.get("type")), str)
+        return cls(
+            name=name,
+            type=property_type,
+            description=schema.get("description", ""),
+            range_min=schema.get("minimum", 0),
+            range_max=schema.get("maximum", 0),
+            min_length=schema.get("minLength", schema.get("minItems")),
+            max_length=schema.get("maxLength", schema.get("maxItems")),
+            pattern=schema.get("pattern"),
+            items=cls._from_json_schema_property("items", schema["items"], required=False)
+            if "items" in schema
+            else None,
+            properties=list(cls.from_json_schema(schema["properties"], schema.get("required")))
+            if "properties" in schema
+            else None,
+            choices=schema.get("enum"),
+            required=required,
+        )
+
     def to_json_schema(self) -> dict:
         out: dict[str, object] = {
             "type": PROPERTY_TYPE_NAMES[self.type],
@@ -66,9 +101,22 @@ class PropertyDefinition(BaseModel):
                 out["minimum"] = self.range_min
             if self.range_max:
                 out["maximum"] = self.range_max
+        elif issubclass(self.type, str):
+            if self.min_length is not None:
+                out["minLength"] = self.min_length
+            if self.max_length is not None:
+                out["maxLength"] = self.max_length
+            if self.pattern:
+                out["pattern"] = self.pattern
         elif issubclass(self.type, list):
-            # TODO: allow list of other types
-            out["items"] = {"type": "string"}
+            out["items"] = self.items.to_json_schema() if self.items else {"type": "string"}
+            if self.min_length is not None:
+                out["minItems"] = self.min_length
+            if self.max_length is not None:
+                out["maxItems"] = self.max_length
+        elif issubclass(self.type, dict) and self.properties:
+            out["properties"] = {p.name: p.to_json_schema() for p in self.properties}
+            out["required"] = [p.name for p in self.properties if p.required]
         if self.choices:
             out["enum"] = self.choices
         return out
@@ -78,31 +126,43 @@ class PropertyDefinition(BaseModel):
             err_msg = f"type {self.type!s} is not a valid property type for property definition"
             raise ToolPropertyTypeError(err_msg)
         if self.choices:
+            # integers are valid numbers
+            choice_types = (int, float) if self.type is float else self.type
             for i, choice in enumerate(self.choices):
-                if not isinstance(choice, self.type):
+                if not isinstance(choice, choice_types):
                     err_msg = f"property definition choice at index {i} is invalid type"
                     raise ToolPropertyChoiceTypeError(err_msg)
+        if self.pattern:
+            try:
+                re.compile(self.pattern)
+            except re.error as e:
+                err_msg = f"property definition pattern is not a valid regular expression: {e!s}"
+                raise ToolPropertyTypeError(err_msg) from e
+        if self.items:
+            if self.type is not list:
+                err_msg = "property definition items are only valid for array properties"
+                raise ToolPropertyTypeError(err_msg)
+            self.items.validate_property()
+        if self.properties:
+            if self.type is not dict:
+                err_msg = "property definition properties are only valid for object properties"
+                raise ToolPropertyTypeError(err_msg)
+            for prop in self.properties:
+                prop.validate_property()
 
     def validate_property_value(self, value: Any | None, tool_name: str = "(unknown tool)"):
-        if self.required and value is None:
-            raise ToolPropertyMissingError(tool_name=tool_name, property_name=self.name)
-        if value is not None:
-            if not isinstance(value, self.type):
-                raise ToolPropertyInvalidError(
-                    tool_name=tool_name,
-                    property_name=self.name,
-                    why=f"Value the wrong type, expected {PROPERTY_TYPE_NAMES[self.type]}.",
-                )
-            if isinstance(value, (int, float)) and (
-                self.range_max and value > self.range_max or self.range_min and value < self.range_min
-            ):
-                raise ToolPropertyInvalidError(
-                    tool_name=tool_name, property_name=self.name, why="Value is out of range."
-                )
-            if self.choices and value not in self.choices:
-                valid_choices = ",".join([str(c) for c in self.choices])
-                raise ToolPropertyInvalidError(
-                    tool_name=tool_name,
-                    property_name=self.name,
-                    why=f"Value is not a valid choice. [Valid choices are: {valid_choices}]",
-                )
+        """
+        Validate a single property value. Validating a whole tool call at once with
+        ai_tool_lib.bot.tool.validator.compile_validator is faster and reports every violation.
+        """
+        # the check is cached per property and the error made per call, the property may be shared between tools
+        if self._check is None:
+            # the validator imports this module
+            from ai_tool_lib.bot.tool.validator import compile_check  # noqa: PLC0415
+
+            self._check = compile_check([self])
+        violations = self._check({self.name: value})
+        if violations:
+            from ai_tool_lib.bot.tool.validator import violation_error  # noqa: PLC0415
+
+            raise violation_error(tool_name, violations)
@@ -0,0 +1,163 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+from __future__ import annotations
+
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator
+
+from ai_tool_lib.bot.tool.validator import compile_validator
+from ai_tool_lib.error.tool import ToolNameConflictError
+
+if TYPE_CHECKING:
+    from ai_tool_lib.bot.tool.base_tool import BaseTool
+
+
+class ToolRegistry:
+    """
+    Long lived index of tools by name. Tool properties are validated, and their argument
+    validators compiled, once when a tool is added and rendered tool definitions are cached until the tool set changes.
+    Tools are expected not to change their name, description or properties once added, and two different
+    tools given together may not share a name.
+    """
+
+    def __init__(self, tools: Iterable[BaseTool] = ()):
+        """
+        :param tools: The initial tools.
+        """
+        self._tools: dict[str, BaseTool] = {}
+        self._definitions: dict[str, list[Any]] = {}
+        self._validators: dict[str, Callable[[dict], None]] = {}
+        self._lock = threading.RLock()
+        self.version = 0
+        """ Incremented every time the tool set changes. """
+        self.update(tools)
+
+    @property
+    def tools(self) -> list[BaseTool]:
+        return list(self._tools.values())
+
+    def get(self, name: str) -> BaseTool | None:
+        """
+        Find a tool from its name.
+        :param name: The tool name.
+        """
+        return self._tools.get(name)
+
+    def add(self, tool: BaseTool):
+        """
+        Add a tool, replacing any tool with the same name.
+        :param tool: The tool.
+        """
+        with self._lock:
+            if self._tools.get(tool.name()) is tool:
+                return
+            self._validators[tool.name()] = self._validate(tool)
+            self._tools[tool.name()] = tool
+            self._changed()
+
+    def remove(self, name: str):
+        """
+        Remove a tool.
+        :param name: The tool name.
+        """
+        with self._lock:
+            if self._tools.pop(name, None):
+                self._validators.pop(name, None)
+                self._changed()
+
+    def update(self, tools: Iterable[BaseTool]) -> bool:
+        """
+        Replace the tool set, only tools that were not already registered are validated.
+        Returns whether the tool set changed.
+        :param tools: The new tool set.
+        """
+        tools = _unique(tools)
+        with self._lock:
+            if len(tools) == len(self._tools) and all(self._tools.get(t.name()) is t for t in tools):
+                return False
+            new_tools = {}
+            new_validators = {}
+            for tool in tools:
+                if self._tools.get(tool.name()) is tool:
+                    new_validators[tool.name()] = self._validators[tool.name()]
+                else:
+                    new_validators[tool.name()] = self._validate(tool)
+                new_tools[tool.name()] = tool
+            self._tools = new_tools
+            self._validators = new_validators
+            self._changed()
+            return True
+
+    def merge(self, tools: Iterable[BaseTool]) -> list[str]:
+        """
+        Add tools that are not registered yet, replacing any tool with the same name, and keep the others.
+        Returns the names of the given tools.
+        :param tools: The tools.
+        """
+        tools = _unique(tools)
+        for tool in tools:
+            if self._tools.get(tool.name()) is not tool:
+                self.add(tool)
+        return [t.name() for t in tools]
+
+    def subset(self, names: Iterable[str]) -> ToolRegistry:
+        """
+        A registry of some of the tools that shares their validators, so none are validated again.
+        It does not follow later changes to this registry.
+        :param names: Names of registered tools, in the order they are offered.
+        """
+        subset = ToolRegistry()
+        with self._lock:
+            subset._tools = {n: self._tools[n] for n in names}
+            subset._validators = {n: self._validators[n] for n in subset._tools}
+        return subset
+
+    def definitions(self, key: str, render: Callable[[BaseTool], Any]) -> list[Any]:
+        """
+        Get the rendered tool definitions, rendering them only if the tool set changed.
+        :param key: Identifies the renderer, e.g. the bot client name.
+        :param render: Renders the definition of a single tool.
+        """
+        definitions = self._definitions.get(key)
+        if definitions is None:
+            with self._lock:
+                definitions = self._definitions.get(key)
+                if definitions is None:
+                    definitions = self._definitions[key] = [render(t) for t in self._tools.values()]
+        return definitions
+
+    def validator(self, name: str) -> Callable[[dict], None] | None:
+        """
+        Get the compiled argument validator of a tool.
+        :param name: The tool name.
+        """
+        return self._validators.get(name)
+
+    def _validate(self, tool: BaseTool) -> Callable[[dict], None]:
+        properties = tool.properties()
+        for prop in properties:
+            prop.validate_property()
+        return compile_validator(tool.name(), properties)
+
+    def _changed(self):
+        self.version += 1
+        self._definitions = {}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def __iter__(self) -> Iterator[BaseTool]:
+        return iter(self.tools)
+
+    def __len__(self) -> int:
+        return len(self._tools)
+
+
+def _unique(tools: Iterable[BaseTool]) -> list[BaseTool]:
+    unique: dict[str, BaseTool] = {}
+    for tool in tools:
+        if unique.setdefault(tool.name(), tool) is not tool:
+            raise ToolNameConflictError(tool.name())
+    return list(unique.values())
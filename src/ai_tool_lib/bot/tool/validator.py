@@ -0,0 +1,155 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+from __future__ import annotations
+
+import re
+from typing import Any, Callable, Iterable
+
+from ai_tool_lib.bot.tool.property import PROPERTY_TYPE_NAMES, PropertyDefinition
+from ai_tool_lib.error.tool import ToolPropertyInvalidError, ToolPropertyMissingError
+
+Violations = list[tuple[str, str]]
+""" Violations found so far as (property path, why) pairs. """
+
+ValueCheck = Callable[[Any, str, Violations], None]
+
+MISSING_PROPERTY = "A required property is missing."
+
+_TYPE_CHECKS: dict[type, Callable[[Any], bool]] = {
+    str: lambda v: isinstance(v, str),
+    # bool is a subclass of int but not a JSON integer
+    int: lambda v: isinstance(v, int) and not isinstance(v, bool),
+    float: lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    dict: lambda v: isinstance(v, dict),
+    list: lambda v: isinstance(v, list),
+    bool: lambda v: isinstance(v, bool),
+}
+
+
+def compile_validator(tool_name: str, properties: Iterable[PropertyDefinition]) -> Callable[[dict], None]:
+    """
+    Compile the properties of a tool into a single function that validates call arguments.
+    Every violation is collected before raising so the bot can fix them all in one retry.
+    :param tool_name: The tool name, used in error messages.
+    :param properties: The tool's properties.
+    """
+    check = compile_check(properties)
+
+    def validate(args: dict):
+        violations = check(args)
+        if violations:
+            raise violation_error(tool_name, violations)
+
+    return validate
+
+
+def compile_check(properties: Iterable[PropertyDefinition]) -> Callable[[dict], Violations]:
+    """
+    Compile properties into a single function that returns every violation in call arguments.
+    Unlike a validator it is not tied to a tool, so it can be shared by tools with the same properties.
+    :param properties: The properties.
+    """
+    check_object = _compile_object(list(properties))
+
+    def check(args: dict) -> Violations:
+        violations: Violations = []
+        check_object(args, "", violations)
+        return violations
+
+    return check
+
+
+def violation_error(tool_name: str, violations: Violations) -> ToolPropertyInvalidError | ToolPropertyMissingError:
+    """
+    The error for violations found in a call to a tool.
+    :param tool_name: The tool name.
+    :param violations: The violations, there must be at least one.
+    """
+    if len(violations) == 1 and violations[0][1] == MISSING_PROPERTY:
+        return ToolPropertyMissingError(tool_name=tool_name, property_name=violations[0][0])
+    return ToolPropertyInvalidError.from_violations(tool_name, violations)
+
+
+def _compile_object(properties: list[PropertyDefinition]) -> ValueCheck:
+    entries = [(p.name, p.required, _compile_value(p)) for p in properties]
+
+    def check(obj: dict, path: str, violations: Violations):
+        for name, required, check_value in entries:
+            value = obj.get(name)
+            prop_path = f"{path}.{name}" if path else name
+            if value is None:
+                if required:
+                    violations.append((prop_path, MISSING_PROPERTY))
+                continue
+            check_value(value, prop_path, violations)
+
+    return check
+
+
+def _compile_value(prop: PropertyDefinition) -> ValueCheck:
+    is_type = _TYPE_CHECKS[prop.type]
+    wrong_type = f"Value the wrong type, expected {PROPERTY_TYPE_NAMES[prop.type]}."
+    checks: list[ValueCheck] = []
+
+    if prop.type in (int, float) and (prop.range_min or prop.range_max):
+        range_min, range_max = prop.range_min, prop.range_max
+
+        def check_range(value, path, violations):
+            if (range_max and value > range_max) or (range_min and value < range_min):
+                violations.append((path, "Value is out of range."))
+
+        checks.append(check_range)
+
+    if prop.type in (str, list) and (prop.min_length is not None or prop.max_length is not None):
+        min_length, max_length = prop.min_length, prop.max_length
+        unit = "characters" if prop.type is str else "items"
+
+        def check_length(value, path, violations):
+            if min_length is not None and len(value) < min_length:
+                violations.append((path, f"Value is too short, it must have at least {min_length} {unit}."))
+            elif max_length is not None and len(value) > max_length:
+                violations.append((path, f"Value is too long, it must have at most {max_length} {unit}."))
+
+        checks.append(check_length)
+
+    if prop.type is str and prop.pattern:
+        pattern = re.compile(prop.pattern)
+
+        def check_pattern(value, path, violations):
+            if not pattern.search(value):
+                violations.append((path, f"Value does not match the pattern '{pattern.pattern}'."))
+
+        checks.append(check_pattern)
+
+    if prop.choices:
+        choices = prop.choices
+        valid_choices = ",".join([str(c) for c in choices])
+
+        def check_choices(value, path, violations):
+            if value not in choices:
+                violations.append((path, f"Value is not a valid choice. [Valid choices are: {valid_choices}]"))
+
+        checks.append(check_choices)
+
+    if prop.type is list and prop.items:
+        check_item = _compile_value(prop.items)
+
+        def check_items(value, path, violations):
+            for i, item in enumerate(value):
+                check_item(item, f"{path}[{i}]", violations)
+
+        checks.append(check_items)
+
+    if prop.type is dict and prop.properties:
+        checks.append(_compile_object(prop.properties))
+
+    def check(value, path, violations):
+        if not is_type(value):
+            violations.append((path, wrong_type))
+            return
+        for c in checks:
+            c(value, path, violations)
+
+    return check
@@ -61,8 +61,19 @@ class BotNoToolCallError(MalformedBotResponseError):
         return "You must respond with one or more tool calls. Please try again."
 
 
+class BotReplayMissError(BotError):
+    """The replay client's cassette has no completion recorded for a request."""
+
+
 class BotTokenLimitError(BotError, UserFriendlyError):
     """Bot reached max token limit for the session."""
 
     def user_friendly_message(self) -> str:
         return "Bot reached token limit."
+
+
+class BotDeadlineError(BotError, UserFriendlyError):
+    """The run used up its latency budget without providing a user response."""
+
+    def user_friendly_message(self) -> str:
+        return "Bot took too long to respond."
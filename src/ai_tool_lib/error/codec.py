@@ -0,0 +1,9 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+from __future__ import annotations
+
+
+class CodecError(ValueError):
+    """Data could not be decoded, it is corrupt, truncated or from an unsupported codec version."""
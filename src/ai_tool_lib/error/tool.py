@@ -29,16 +29,56 @@ class ToolListEmptyError(Exception, UserFriendlyError):
         return "No tools have been provided."
 
 
-class ToolPropertyInvalidError(ValueError, MalformedBotResponseError, UserFriendlyError):
-    """A tool property failed to pass contraint validation."""
+class ToolNameConflictError(ValueError, UserFriendlyError):
+    """Two different tools were given the same name."""
+
+    def __init__(self, tool_name: str) -> None:
+        """
+        :param tool_name: The shared tool name.
+        """
+        self.tool_name = tool_name
+        super().__init__(f"more than one tool is named '{self.tool_name!s}'")
+
+    def user_friendly_message(self) -> str:
+        return "One or more tools are improperly configured."
+
 
-    def __init__(self, tool_name: str, property_name: str, why: str | None = None) -> None:
+class ToolPropertyInvalidError(ValueError, MalformedBotResponseError, UserFriendlyError):
+    """One or more tool properties failed to pass contraint validation."""
+
+    def __init__(
+        self,
+        tool_name: str,
+        property_name: str,
+        why: str | None = None,
+        violations: list[tuple[str, str]] | None = None,
+    ) -> None:
+        """
+        :param tool_name: The tool name.
+        :param property_name: The invalid property, or a list of them when there are multiple violations.
+        :param why: Why the property is invalid.
+        :param violations: Every violation found as (property path, why) pairs.
+        """
         self.tool_name = tool_name
         self.property_name = property_name
         self.why = why
+        self.violations = violations or [(property_name, why or "")]
         super().__init__(f"property '{self.property_name!s}' is invalid for tool '{self.tool_name!s}'")
 
+    @classmethod
+    def from_violations(cls, tool_name: str, violations: list[tuple[str, str]]) -> ToolPropertyInvalidError:
+        if len(violations) == 1:
+            return cls(tool_name=tool_name, property_name=violations[0][0], why=violations[0][1])
+        return cls(
+            tool_name=tool_name,
+            property_name=", ".join(dict.fromkeys(name for name, _ in violations)),
+            violations=violations,
+        )
+
     def retry_message(self):
+        if len(self.violations) > 1:
+            lines = "\n".join(f"- Property '{name!s}': {why}" for name, why in self.violations)
+            return f"Your call to the '{self.tool_name!s}' tool had {len(self.violations)} problems:\n{lines}\nPlease fix all of them and try again."
         return f"Property '{self.property_name!s}' was invalid in your call to the '{self.tool_name!s}' tool. {(self.why + " ") if self.why else ""}Please try again."
 
     def user_friendly_message(self) -> str:
@@ -72,3 +112,42 @@ class ToolNotDefinedError(MalformedBotResponseError, UserFriendlyError):
 
     def user_friendly_message(self) -> str:
         return "Bot tried to call an undefined tool."
+
+
+class ToolTimeoutError(TimeoutError, UserFriendlyError):
+    """A tool did not respond before its execution deadline."""
+
+    def __init__(self, tool_name: str, timeout: float) -> None:
+        """
+        :param tool_name: The tool name.
+        :param timeout: The deadline in seconds.
+        """
+        self.tool_name = tool_name
+        self.timeout = timeout
+        super().__init__(f"tool '{self.tool_name!s}' did not respond within {self.timeout:g} seconds")
+
+    def bot_message(self) -> str:
+        """Tool response sent to the bot in place of the tool's own."""
+        return (
+            f"The '{self.tool_name!s}' tool did not respond within {self.timeout:g} seconds and was stopped. "
+            "Try different arguments or another approach."
+        )
+
+    def user_friendly_message(self) -> str:
+        return "A tool took too long to respond."
+
+
+class ToolWorkerError(RuntimeError, UserFriendlyError):
+    """The worker process executing a tool exited before responding."""
+
+    def __init__(self, tool_name: str, exitcode: int | None) -> None:
+        """
+        :param tool_name: The tool name.
+        :param exitcode: Exit code of the worker process.
+        """
+        self.tool_name = tool_name
+        self.exitcode = exitcode
+        super().__init__(f"worker process exited with code {self.exitcode} while executing tool '{self.tool_name!s}'")
+
+    def user_friendly_message(self) -> str:
+        return "A tool failed unexpectedly."
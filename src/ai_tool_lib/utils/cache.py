@@ -0,0 +1,189 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from abc import abstractmethod
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    import os
+
+
+def stable_hash(data: Any) -> str:
+    """Hash JSON serializable data, independent of dict key order."""
+    dump = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(dump.encode()).hexdigest()
+
+
+class BaseCache:
+    """Key value cache for serialized values."""
+
+    @abstractmethod
+    def get(self, key: str) -> str | None:
+        """
+        Get a value, None if missing or expired.
+        :param key: Cache key.
+        """
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: str, ttl: float | None = None):
+        """
+        Set a value.
+        :param key: Cache key.
+        :param value: Serialized value.
+        :param ttl: Seconds until the value expires, falls back to the cache's default.
+        """
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        """
+        Delete a value.
+        :param key: Cache key.
+        """
+        ...
+
+    @abstractmethod
+    def clear(self):
+        """Delete all values."""
+        ...
+
+
+class MemoryCache(BaseCache):
+    """In-process least recently used cache."""
+
+    def __init__(self, max_entries: int = 1024, ttl: float | None = None):
+        """
+        :param max_entries: Maximum number of values, the least recently used are evicted first.
+        :param ttl: Default seconds until a value expires, None to never expire.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float | None, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry:
+                return None
+            expires, value = entry
+            if expires is not None and expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: float | None = None):
+        ttl = ttl if ttl is not None else self.ttl
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl if ttl is not None else None, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache(BaseCache):
+    """Cache stored in a SQLite database, can be shared by multiple processes on one host."""
+
+    def __init__(self, path: str | os.PathLike, table: str = "cache", ttl: float | None = None):
+        """
+        :param path: Path of the database file.
+        :param table: Name of the table to store values in.
+        :param ttl: Default seconds until a value expires, None to never expire.
+        """
+        self.path = str(path)
+        self.table = table
+        self.ttl = ttl
+        self._local = threading.local()
+        self._connection().execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL)"
+        )
+
+    def get(self, key: str) -> str | None:
+        row = self._connection().execute(f"SELECT value, expires FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        if not row:
+            return None
+        value, expires = row
+        if expires is not None and expires < time.time():
+            self.delete(key)
+            return None
+        return value
+
+    def set(self, key: str, value: str, ttl: float | None = None):
+        ttl = ttl if ttl is not None else self.ttl
+        self._connection().execute(
+            f"INSERT OR REPLACE INTO {self.table} (key, value, expires) VALUES (?, ?, ?)",
+            (key, value, time.time() + ttl if ttl is not None else None),
+        )
+
+    def delete(self, key: str):
+        self._connection().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def clear(self):
+        self._connection().execute(f"DELETE FROM {self.table}")
+
+    def prune(self):
+        """Delete expired values."""
+        self._connection().execute(f"DELETE FROM {self.table} WHERE expires < ?", (time.time(),))
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite connections cannot be shared across threads, keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+
+class TieredCache(BaseCache):
+    """Checks each cache in order, values found in a later tier are copied to the earlier ones."""
+
+    def __init__(self, *tiers: BaseCache):
+        """
+        :param tiers: Caches from fastest to slowest, e.g. MemoryCache then SQLiteCache.
+        """
+        self.tiers = list(tiers)
+
+    def get(self, key: str) -> str | None:
+        for i, tier in enumerate(self.tiers):
+            value = tier.get(key)
+            if value is not None:
+                for earlier in self.tiers[:i]:
+                    earlier.set(key, value)
+                return value
+        return None
+
+    def set(self, key: str, value: str, ttl: float | None = None):
+        for tier in self.tiers:
+            tier.set(key, value, ttl)
+
+    def delete(self, key: str):
+        for tier in self.tiers:
+            tier.delete(key)
+
+    def clear(self):
+        for tier in self.tiers:
+            tier.clear()
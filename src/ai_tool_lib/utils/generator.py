@@ -0,0 +1,24 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+from __future__ import annotations
+
+from typing import Any, AsyncIterator, Generator, TypeVar
+
+T = TypeVar("T")
+
+
+def drain(generator: Generator[Any, Any, T]) -> T:
+    """Exhaust a generator, discarding what it yields, and return its return value."""
+    while True:
+        try:
+            next(generator)
+        except StopIteration as e:
+            return e.value
+
+
+async def adrain(iterator: AsyncIterator[Any]) -> None:
+    """Exhaust an async iterator, discarding what it yields."""
+    async for _ in iterator:
+        pass
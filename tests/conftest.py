@@ -0,0 +1,34 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+import pytest
+
+from ai_tool_lib import BasicTool, get_bot_client
+from ai_tool_lib.bot.tool.property import PropertyDefinition
+from ai_tool_lib.bot.tool.response import ToolUserResponse
+from benchmarks.stub_server import StubChatCompletionServer, echo_script
+
+
+@pytest.fixture(scope="module")
+def server():
+    with StubChatCompletionServer(script=echo_script) as server:
+        yield server
+
+
+@pytest.fixture
+def client(server):
+    return get_bot_client(
+        "openai",
+        api_key="_",
+        base_url=server.url,
+        model="stub",
+        tools=[
+            BasicTool(
+                "done",
+                "Respond to the user.",
+                properties=[PropertyDefinition(name="message", type=str, description="Your response to the user.")],
+                execute=lambda message: ToolUserResponse(data={"message": message}),
+            )
+        ],
+    )
@@ -0,0 +1,47 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+import time
+
+from ai_tool_lib.bot.client.balancer import EndpointBalancer, EndpointState
+
+""" Test the endpoint balancer's circuit breaker. """
+
+
+def test_half_open_trial():
+    balancer = EndpointBalancer(
+        ["http://127.0.0.1:9/v1", "http://127.0.0.1:10/v1"],
+        failure_threshold=1,
+        ejection_time=0.05,
+        probe_interval=None,
+        is_failure=lambda _: True,
+    )
+    good, bad = balancer.endpoints
+    # keep the good endpoint busy so the bad one is picked whenever it is available
+    good.outstanding = 5
+
+    balancer.acquire().release(RuntimeError("down"))
+    assert [s.state for s in balancer.stats()] == [EndpointState.HEALTHY, EndpointState.EJECTED]
+    assert balancer.acquire().endpoint is good
+
+    time.sleep(0.05)
+    assert balancer.stats()[1].state == EndpointState.HALF_OPEN
+    trial = balancer.acquire()
+    assert trial.endpoint is bad
+    assert trial.trial
+    # only one trial request at a time
+    assert balancer.acquire().endpoint is good
+    # a failed trial ejects the endpoint again
+    trial.release(RuntimeError("still down"))
+    assert balancer.stats()[1].state == EndpointState.EJECTED
+    assert bad.ejections == 2
+
+    time.sleep(0.05)
+    trial = balancer.acquire()
+    assert trial.endpoint is bad
+    assert trial.trial
+    trial.release()
+    assert balancer.stats()[1].state == EndpointState.HEALTHY
+    assert bad.consecutive_failures == 0
+    assert not balancer.acquire().trial
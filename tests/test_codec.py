@@ -0,0 +1,62 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+import pytest
+
+from ai_tool_lib.bot.codec import BotResultsView, decode_results, decode_session, encode_results, encode_session
+from ai_tool_lib.bot.message import BotMessage, BotMessageRole, BotToolMessage
+from ai_tool_lib.bot.results import BotResults, BotToolCall
+from ai_tool_lib.bot.session import BotSession
+from ai_tool_lib.bot.tool.response import ToolBotResponse, ToolUserResponse
+from ai_tool_lib.error.codec import CodecError
+
+""" Test the binary codec round trips sessions and results. """
+
+
+@pytest.fixture
+def results():
+    session = BotSession.new()
+    session.messages = [BotMessage(role=BotMessageRole.SYSTEM, content="system")]
+    for i in range(3):
+        session.messages += [
+            BotMessage(role=BotMessageRole.USER, content=f"question {i} ✓"),
+            BotMessage(
+                role=BotMessageRole.BOT, content="", tool_calls=[BotToolMessage(id=f"{i}", name="t", args="{}")]
+            ),
+            BotMessage(role=BotMessageRole.TOOL, content=None, tool_call_id=f"{i}"),
+        ]
+    results = BotResults.new(prompt="question", session=session)
+    results.input_tokens = 10
+    results.tool_calls = [
+        BotToolCall(tool="t", args={"a": [1, 2.5, None]}, response=ToolBotResponse(content="x", data={"b": True})),
+        BotToolCall(tool="done", args={}, response=ToolUserResponse(data={"message": "answer"})),
+    ]
+    return results
+
+
+def test_round_trip(results):
+    results.session.messages[4].synthetic = True
+    assert decode_results(encode_results(results)) == results
+    assert decode_session(encode_session(results.session)) == results.session
+
+
+def test_lazy_decode(results):
+    view = BotResultsView(encode_results(results))
+    assert view.response_data == {"message": "answer"}
+    assert view.meta["input_tokens"] == 10
+    # leading system messages are always kept
+    roles = [m.role for m in view.session(last=2).messages]
+    assert roles == [BotMessageRole.SYSTEM, BotMessageRole.BOT, BotMessageRole.TOOL]
+    # a tool message is dropped when the bot message that requested it is cut off
+    assert [m.role for m in view.session(last=1).messages] == [BotMessageRole.SYSTEM]
+
+
+def test_malformed(results):
+    data = encode_results(results)
+    with pytest.raises(CodecError):
+        decode_results(data[: len(data) // 2])
+    with pytest.raises(CodecError):
+        decode_results(data[:4] + bytes([99]) + data[5:])
+    with pytest.raises(CodecError):
+        decode_session(data)
@@ -0,0 +1,67 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+import time
+
+from ai_tool_lib import get_bot_client
+from ai_tool_lib.utils.cache import MemoryCache, SQLiteCache, TieredCache
+from benchmarks.stub_server import StubChatCompletionServer, echo_script
+
+""" Test chat completions are served from the completion cache. """
+
+
+def test_completion_cache(client, server):
+    cache = MemoryCache()
+    cached = get_bot_client("openai", api_key="_", base_url=server.url, model="stub", tools=client.tools, cache=cache)
+    count = server.request_count
+    results = cached.run("hello")
+    assert server.request_count == count + 1
+    assert (results.cache_hits, results.cache_misses) == (0, 1)
+    assert len(cache) == 1
+
+    # a second identical run sends no request
+    results = cached.run("hello")
+    assert server.request_count == count + 1
+    assert results.response_data["message"] == "hello"
+    assert (results.cache_hits, results.cache_misses) == (1, 0)
+    assert (results.cached_input_tokens, results.cached_output_tokens) == (10, 5)
+
+    # streamed requests share the entries of non streamed ones
+    streaming = get_bot_client(
+        "openai", api_key="_", base_url=server.url, model="stub", tools=client.tools, cache=cache, stream=True
+    )
+    results = streaming.run("hello")
+    assert server.request_count == count + 1
+    assert results.cache_hits == 1
+
+    results = streaming.run("goodbye")
+    assert server.request_count == count + 2
+    assert (results.cache_hits, results.cache_misses) == (0, 1)
+    assert cached.run("goodbye").cache_hits == 1
+
+    # the same model on another endpoint may answer differently
+    with StubChatCompletionServer(script=echo_script) as other:
+        moved = get_bot_client("openai", api_key="_", base_url=other.url, model="stub", tools=client.tools, cache=cache)
+        results = moved.run("hello")
+        assert other.request_count == 1
+        assert (results.cache_hits, results.cache_misses) == (0, 1)
+
+
+def test_cache_tiers(tmp_path):
+    memory = MemoryCache()
+    disk = SQLiteCache(tmp_path / "cache.db")
+    tiered = TieredCache(memory, disk)
+    disk.set("key", "value")
+    assert memory.get("key") is None
+    # a value found in a later tier is promoted to the earlier ones
+    assert tiered.get("key") == "value"
+    assert memory.get("key") == "value"
+
+    disk = SQLiteCache(tmp_path / "cache.db", ttl=0.05)
+    disk.set("short", "value")
+    disk.set("long", "value", ttl=60)
+    assert disk.get("short") == "value"
+    time.sleep(0.1)
+    assert disk.get("short") is None
+    assert disk.get("long") == "value"
@@ -0,0 +1,51 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+import subprocess
+import sys
+
+import pytest
+
+import ai_tool_lib
+from ai_tool_lib.bot.client import AVAILABLE_CLIENTS, BotClientRegistry, get_bot_client
+from ai_tool_lib.bot.client.base import BaseBotClient
+from ai_tool_lib.bot.client.openai import OpenAIBotClient
+from ai_tool_lib.error.bot import BotClientNotFoundError
+
+""" Test clients are only imported when they are asked for. """
+
+
+def test_import_is_lazy():
+    code = (
+        "import sys\n"
+        "from ai_tool_lib import BasicTool, BotSession\n"
+        "BotSession.new()\n"
+        "assert 'openai' not in sys.modules\n"
+        "from ai_tool_lib import get_bot_client\n"
+        "get_bot_client('openai', api_key='_', tools=[])\n"
+        "assert 'openai' in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_exports():
+    assert set(ai_tool_lib.__all__) <= set(dir(ai_tool_lib))
+    for name in ai_tool_lib.__all__:
+        assert getattr(ai_tool_lib, name) is not None
+
+
+def test_registry():
+    class CustomBotClient(BaseBotClient):
+        @staticmethod
+        def name() -> str:
+            return "custom"
+
+    assert {"openai", "openai_async", "replay"} <= set(AVAILABLE_CLIENTS.names())
+    registry = BotClientRegistry({"openai": "ai_tool_lib.bot.client.openai:OpenAIBotClient"})
+    registry.register("custom", CustomBotClient)
+    assert registry.get("custom") is CustomBotClient
+    assert registry.get("openai") is OpenAIBotClient
+    with pytest.raises(BotClientNotFoundError):
+        registry.get("missing")
+    assert isinstance(get_bot_client("openai", api_key="_", tools=[]), OpenAIBotClient)
@@ -0,0 +1,38 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+from ai_tool_lib.bot.message import BotMessage, BotMessageRole, BotToolMessage
+
+""" Test messages cache their serialized forms and token counts. """
+
+
+def test_message_wire_cache():
+    rendered = []
+
+    def render(message: BotMessage) -> dict:
+        rendered.append(message.content)
+        return {"content": message.content, "tool_calls": len(message.tool_calls or [])}
+
+    message = BotMessage(role=BotMessageRole.BOT, content="a", tool_calls=[BotToolMessage(id="1", name="t", args="{}")])
+    wire = message.wire("test", render)
+    assert message.wire("test", render) is wire
+    assert message.wire("other", render) is not wire
+    assert rendered == ["a", "a"]
+    assert message.token_count("test", lambda _: 3) == 3
+    assert message.token_count("test", lambda _: 4) == 3
+
+    # assigning a field invalidates the cached forms
+    message.content = "b"
+    assert message.wire("test", render) == {"content": "b", "tool_calls": 1}
+    assert message.token_count("test", lambda _: 4) == 4
+    message.tool_calls = [*(message.tool_calls or []), BotToolMessage(id="2", name="t", args="{}")]
+    assert message.wire("test", render)["tool_calls"] == 2
+
+    # copies never share the cache, updated or not
+    rendered.clear()
+    copied = message.model_copy(update={"content": "c"})
+    assert copied.wire("test", render)["content"] == "c"
+    assert message.model_copy().wire("test", render)["content"] == "b"
+    assert message.wire("test", render)["content"] == "b"
+    assert rendered == ["c", "b"]
@@ -2,6 +2,7 @@
 #
 # SPDX-License-Identifier: MIT
 
+import asyncio
 
 from ai_tool_lib import BasicTool, get_bot_client
 from ai_tool_lib.bot.message import BotMessageRole
@@ -26,6 +27,26 @@ client = get_bot_client(
 )
 
 
+async def _async_done(message: str) -> ToolUserResponse:
+    return ToolUserResponse(data={"message": message})
+
+
+async_client = get_bot_client(
+    "openai_async",
+    api_key="_",
+    base_url="http://127.0.0.1:11434/v1",
+    model="llama3.2:3b",
+    tools=[
+        BasicTool(
+            "done",
+            "Respond to the user.",
+            properties=[PropertyDefinition(name="message", type=str, description="Your response to the user.")],
+            execute=_async_done,
+        )
+    ],
+)
+
+
 def test_one_shot():
     prompt = "Marco!"
     res = client.run(prompt)
@@ -59,3 +80,13 @@ def test_multi_conversation_session():
     assert (
         "nathan" in res2.response_data["message"].lower()
     )  # test that bot is able to infer context from previous query in same session
+
+
+def test_one_shot_async():
+    prompt = "Marco!"
+    res = asyncio.run(async_client.arun(prompt))
+    assert res.prompt == prompt
+    assert res.iterations > 0
+    assert res.tool_calls[0].tool == "done"
+    assert isinstance(res.tool_calls[0].response, ToolUserResponse)
+    assert res.response_data["message"] != ""
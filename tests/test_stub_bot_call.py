@@ -0,0 +1,778 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+
+import openai
+import pytest
+from openai.types.chat import ChatCompletionChunk
+
+from ai_tool_lib import BasicTool, BotSession, get_bot_client
+from ai_tool_lib.bot.client.balancer import EndpointBalancer
+from ai_tool_lib.bot.client.openai import ChatCompletionStreamAssembler
+from ai_tool_lib.bot.client.replay import Cassette
+from ai_tool_lib.bot.client.transport import close_transport, get_transport
+from ai_tool_lib.bot.compaction import SlidingWindowCompactor, ToolOutputCompactor, split_turns
+from ai_tool_lib.bot.message import BotMessage, BotMessageRole, BotToolMessage
+from ai_tool_lib.bot.metrics import BotSpanKind, HistogramMetrics
+from ai_tool_lib.bot.ratelimit import HedgePolicy, RateLimiter, RetryPolicy, SQLiteRateLimitStore
+from ai_tool_lib.bot.router import ModelRouter, ModelRule
+from ai_tool_lib.bot.session_store import MemoryBotSessionStore, SQLiteBotSessionStore
+from ai_tool_lib.bot.tool.execution import ProcessExecutionPolicy, ThreadExecutionPolicy
+from ai_tool_lib.bot.tool.handler import ToolHandler
+from ai_tool_lib.bot.tool.index import ToolIndex
+from ai_tool_lib.bot.tool.property import PropertyDefinition
+from ai_tool_lib.bot.tool.registry import ToolRegistry
+from ai_tool_lib.bot.tool.response import ToolBotResponse, ToolUserResponse
+from ai_tool_lib.bot.tool.validator import compile_validator
+from ai_tool_lib.error.bot import BotDeadlineError, BotReplayMissError, BotTokenLimitError
+from ai_tool_lib.error.tool import (
+    ToolNameConflictError,
+    ToolPropertyInvalidError,
+    ToolPropertyMissingError,
+    ToolTimeoutError,
+)
+from benchmarks.stub_server import StubChatCompletionServer, echo_script
+
+""" Test bot calls against an in-process stub chat completions endpoint. """
+
+
+def sleep_tool(seconds: float) -> ToolBotResponse:
+    time.sleep(seconds)
+    return ToolBotResponse(content=str(os.getpid()))
+
+
+def test_run_many_ordered(client):
+    prompts = [f"prompt {i}" for i in range(20)]
+    items = list(client.run_many(prompts, concurrency=4))
+    assert [item.index for item in items] == list(range(20))
+    assert [item.results.response_data["message"] for item in items] == prompts
+    assert all(item.error is None for item in items)
+
+
+def test_run_many_resume_from_checkpoint(client, server, tmp_path):
+    checkpoint = tmp_path / "batch.jsonl"
+    prompts = [f"prompt {i}" for i in range(10)]
+    for item in client.run_many(prompts, concurrency=2, checkpoint=checkpoint):
+        if item.index == 4:
+            break
+
+    request_count = server.request_count
+    items = list(client.run_many(prompts, concurrency=2, ordered=False, checkpoint=checkpoint))
+    assert sorted(item.index for item in items) == list(range(10))
+    resumed = [item for item in items if item.from_checkpoint]
+    assert len(resumed) >= 5
+    assert server.request_count - request_count == 10 - len(resumed)
+    assert all(item.results.response_data["message"] == item.prompt for item in items)
+
+
+def test_request_token_limit(client):
+    client.request_token_limit = 150
+    with pytest.raises(BotTokenLimitError):
+        client.run("x" * 1000)
+
+    # compaction hook keeps the system prompt and the latest message
+    client.on_token_limit = lambda messages, _budget, _results: [messages[0], messages[-1]]
+    session = BotSession.new()
+    session.messages = [BotMessage(role=BotMessageRole.SYSTEM, content="system")]
+    session.messages += [BotMessage(role=BotMessageRole.USER, content="y" * 400) for _ in range(3)]
+    results = client.run("short", session)
+    assert results.response_data["message"] == "short"
+    assert 0 < results.estimated_input_tokens <= 150
+
+
+def test_compaction(client):
+    client.compactor = ToolOutputCompactor(keep_turns=1)
+    session = BotSession.new()
+    session.messages = [BotMessage(role=BotMessageRole.SYSTEM, content="system")]
+    for i in range(3):
+        session.messages += [
+            BotMessage(role=BotMessageRole.USER, content=f"question {i}"),
+            BotMessage(
+                role=BotMessageRole.BOT, content=None, tool_calls=[BotToolMessage(id=f"{i}", name="t", args="{}")]
+            ),
+            BotMessage(role=BotMessageRole.TOOL, content="x" * 1000, tool_call_id=f"{i}"),
+        ]
+    results = client.run("short", session)
+    assert results.response_data["message"] == "short"
+    assert results.compacted_messages == 3
+    assert results.compacted_tokens > 600
+    # the session history is kept in full
+    assert [m.content for m in session.messages if m.role == BotMessageRole.TOOL][:3] == ["x" * 1000] * 3
+
+
+def test_session_store(client, tmp_path):
+    client.session_store = SQLiteBotSessionStore(tmp_path / "sessions.db")
+    results = client.run("first")
+    session = client.session_store.load(results.session.uid)
+    assert [m.content for m in session.messages] == [m.content for m in results.session.messages]
+    client.run("second", session)
+    assert client.session_store.count(session.uid) == len(session.messages)
+    # only the leading system message and the latest turn
+    last = client.session_store.load(session.uid, last=3)
+    assert [m.role for m in last.messages] == [
+        BotMessageRole.SYSTEM,
+        BotMessageRole.USER,
+        BotMessageRole.BOT,
+        BotMessageRole.TOOL,
+    ]
+
+    # a session that was not loaded from the store replaces its stored history rather than appending it again
+    for store in (client.session_store, MemoryBotSessionStore()):
+        store.save(session)
+        unloaded = BotSession.model_validate_json(session.model_dump_json())
+        assert unloaded.stored_messages == 0
+        unloaded.messages = unloaded.messages[:3]
+        store.save(unloaded)
+        assert store.count(session.uid) == 3
+        assert [m.content for m in store.load(session.uid).messages] == [m.content for m in session.messages[:3]]
+
+
+def test_shared_transport(client, server):
+    other = get_bot_client("openai", api_key="_", base_url=server.url, model="stub", tools=client.tools)
+    assert other.transport is client.transport
+    before = client.transport.stats()
+    for i in range(5):
+        other.run(f"prompt {i}")
+    stats = client.transport.stats()
+    assert stats.requests == before.requests + 5
+    # connections are kept alive between runs
+    assert stats.connects <= before.connects + 1
+
+    # an assigned OpenAI client gets a transport of its own
+    own = get_bot_client("openai", api_key="_", base_url="http://127.0.0.1:9/v1", model="stub", tools=client.tools)
+    own.client = openai.OpenAI(api_key="_", base_url=server.url)
+    assert own.transport is not client.transport
+    assert own.run("hello").response_data["message"] == "hello"
+    assert client.transport.stats().requests == stats.requests
+
+    # an evicted transport is replaced on next use
+    evicted = get_transport(api_key="evicted", base_url=server.url)
+    assert close_transport(api_key="evicted", base_url=server.url)
+    assert not close_transport(api_key="evicted", base_url=server.url)
+    assert get_transport(api_key="evicted", base_url=server.url) is not evicted
+    close_transport(api_key="evicted", base_url=server.url)
+
+
+def test_rate_limit_retry_after(client, tmp_path):
+    attempts = []
+
+    def script(request: dict) -> dict:
+        attempts.append(request)
+        if len(attempts) == 1:
+            return {"status": 429, "headers": {"Retry-After": "0.2"}}
+        return echo_script(request)
+
+    with StubChatCompletionServer(script=script) as server:
+        store = SQLiteRateLimitStore(tmp_path / "limits.db")
+        limited = get_bot_client(
+            "openai",
+            api_key="_",
+            base_url=server.url,
+            model="stub",
+            tools=client.tools,
+            rate_limiter=RateLimiter(requests_per_minute=600, store=store),
+            retry_policy=RetryPolicy(base_delay=0.01),
+        )
+        results = limited.run("hello")
+    assert results.response_data["message"] == "hello"
+    assert len(attempts) == 2
+    assert results.request_retries == 1
+    assert results.retry_wait >= 0.2
+
+    # the pause is shared with every limiter using the same store and key
+    assert RateLimiter(requests_per_minute=600, store=store).reserve() < 0.2
+    RateLimiter(requests_per_minute=600, store=store).pause(5)
+    assert RateLimiter(requests_per_minute=600, store=store).reserve() > 4
+
+
+def test_trace_and_histogram(client):
+    client.metrics = HistogramMetrics()
+    for i in range(5):
+        results = client.run(f"prompt {i}")
+
+    trace = results.trace
+    assert trace.kind == BotSpanKind.RUN
+    assert [s.kind for s in trace.children] == [BotSpanKind.ITERATION]
+    request, tool = trace.children[0].children
+    assert (request.kind, request.name) == (BotSpanKind.REQUEST, "stub")
+    assert request.attributes["input_tokens"] == 10
+    assert (tool.kind, tool.name) == (BotSpanKind.TOOL, "done")
+    assert [s.kind for s in tool.children] == [BotSpanKind.VALIDATION, BotSpanKind.EXECUTION]
+    assert trace.duration >= request.duration + tool.duration
+
+    assert client.metrics.count(BotSpanKind.TOOL, "done") == 5
+    percentiles = client.metrics.percentiles(BotSpanKind.REQUEST, "stub")
+    assert list(percentiles) == ["p50", "p95", "p99"]
+    assert 0 < percentiles["p50"] <= percentiles["p99"]
+
+
+def test_record_and_replay(client, tmp_path):
+    client.recorder = Cassette(tmp_path / "cassette.jsonl")
+    for i in range(3):
+        client.run(f"prompt {i}")
+    client.recorder = None
+
+    for stream in (False, True):
+        replay = get_bot_client("replay", cassette=tmp_path / "cassette.jsonl", tools=client.tools, stream=stream)
+        # exact match
+        results = replay.run("prompt 1")
+        assert results.response_data["message"] == "prompt 1"
+        assert results.input_tokens == 10
+        # falls back to a recording of the same step
+        assert replay.run("unseen prompt").response_data["message"].startswith("prompt ")
+
+    strict = get_bot_client("replay", cassette=tmp_path / "cassette.jsonl", tools=client.tools, match_levels=("exact",))
+    with pytest.raises(BotReplayMissError):
+        strict.run("unseen prompt")
+
+
+def test_tool_index(client):
+    topics = ["weather forecast", "stock price", "flight booking", "currency exchange rate", "restaurant reservation"]
+    catalog = [
+        BasicTool(
+            f"get_{topic.replace(' ', '_')}",
+            f"Look up the {topic}.",
+            properties=[PropertyDefinition(name="query", type=str, description="What to look up.")],
+            execute=lambda **_: ToolBotResponse(content=""),
+        )
+        for topic in topics
+    ]
+    index = ToolIndex([*catalog, *client.tools], top_k=2, pinned=["done"])
+    assert [t.name() for t, _ in index.search("what will the weather be tomorrow?")] == ["get_weather_forecast"]
+    assert [t.name() for t in index.select("book a flight and a restaurant")] == [
+        "get_flight_booking",
+        "get_restaurant_reservation",
+        "done",
+    ]
+
+    client.tools = index
+    results = client.run("What is the exchange rate for euros?")
+    assert results.offered_tools == [["get_currency_exchange_rate", "done"]]
+    assert results.trace.children[0].attributes["offered_tools"] == 2
+
+
+def test_tool_execution_policies():
+    sleep = BasicTool(
+        "sleep",
+        "Sleep.",
+        properties=[PropertyDefinition(name="seconds", type=float, description="Seconds to sleep.")],
+        execute=sleep_tool,
+        timeout=1,
+    )
+    policy = ProcessExecutionPolicy(max_workers=1)
+    handler = ToolHandler([sleep], execution_policy=policy)
+    try:
+        pid = handler.call("sleep", {"seconds": 0}).content
+        assert pid != str(os.getpid())
+        # the worker stays warm
+        assert handler.call("sleep", {"seconds": 0}).content == pid
+        start = time.perf_counter()
+        assert "did not respond within 1 seconds" in handler.call("sleep", {"seconds": 30}).content
+        assert time.perf_counter() - start < 5
+        # the hung worker was replaced
+        assert handler.call("sleep", {"seconds": 0}).content not in (pid, str(os.getpid()))
+    finally:
+        policy.shutdown()
+
+    handler = ToolHandler([sleep], execution_policy=ThreadExecutionPolicy(timeout_response=False))
+    with pytest.raises(ToolTimeoutError):
+        handler.call("sleep", {"seconds": 2})
+
+
+def test_latency_budget(client, server):
+    def script(request: dict) -> dict:
+        if request["messages"][-1]["content"] == client.iteration_limit_prompt:
+            return {"tool_calls": [("done", {"message": "final"})]}
+        return {"tool_calls": [("lookup", {"query": "more"})]}
+
+    client.tools.append(
+        BasicTool(
+            "lookup",
+            "Look something up.",
+            properties=[PropertyDefinition(name="query", type=str, description="What to look up.")],
+            execute=lambda query: ToolBotResponse(content=query),
+        )
+    )
+    server.script, server.latency = script, 0.3
+    try:
+        client.latency_budget = 1.0
+        results = client.run("Question?")
+        # the third iteration would not leave room for the final answer
+        assert results.early_final_answer
+        assert results.iterations == 3
+        assert results.response_data["message"] == "final"
+        assert 0 < results.latency_remaining < 0.4
+
+        client.latency_budget = 0.2
+        with pytest.raises(BotDeadlineError) as e:
+            client.run("Question?")
+        assert e.value.results.latency_remaining <= 0
+    finally:
+        server.script, server.latency = echo_script, 0.0
+
+
+def test_endpoint_balancer(client, server):
+    with StubChatCompletionServer(script=echo_script) as failing:
+        failing.healthy = False
+        balancer = EndpointBalancer(
+            [server.url, failing.url], api_key="_", failure_threshold=2, probe_interval=None, seed=1
+        )
+        balanced = get_bot_client(
+            "openai",
+            api_key="_",
+            model="stub",
+            tools=client.tools,
+            balancer=balancer,
+            retry_policy=RetryPolicy(base_delay=0),
+        )
+        for i in range(10):
+            assert balanced.run(f"prompt {i}").response_data["message"] == f"prompt {i}"
+        good, bad = balancer.stats()
+        # failed requests were retried on the healthy endpoint until the failing one was ejected
+        assert not bad.healthy
+        assert bad.ejections == 1
+        assert bad.failures == bad.requests == 2
+        assert good.healthy
+        assert good.requests == 10
+        assert good.outstanding == bad.outstanding == 0
+
+        failing.healthy = True
+        balancer.probe()
+        assert balancer.stats()[1].healthy
+
+        # every request of a session goes to the same endpoint
+        balancer.sticky = True
+        before = [s.requests for s in balancer.stats()]
+        session = BotSession.new()
+        for i in range(4):
+            balanced.run(f"prompt {i}", session)
+        after = [s.requests - b for s, b in zip(balancer.stats(), before)]
+        assert sorted(after) == [0, 4]
+        balancer.close()
+
+
+def test_hedged_requests(client, server):
+    latencies = iter([2.0])
+    server.latency = lambda: next(latencies, 0.0)
+    try:
+        client.hedge_policy = HedgePolicy(delay=0.1)
+        start = time.perf_counter()
+        results = client.run("hello")
+        # the straggler is abandoned and the duplicate answers
+        assert time.perf_counter() - start < 1.0
+        assert results.response_data["message"] == "hello"
+        assert results.hedged_requests == results.hedge_wins == 1
+        assert results.hedge_input_tokens > 0
+
+        results = client.run("hello")
+        assert results.hedged_requests == 0
+
+        # the adaptive delay waits until enough latencies were observed
+        adaptive = HedgePolicy(min_samples=5)
+        for latency in [0.1, 0.2, 0.3, 0.4]:
+            adaptive.observe(latency)
+        assert adaptive.delay() is None
+        adaptive.observe(0.5)
+        assert adaptive.delay() == 0.5
+    finally:
+        server.latency = 0.0
+        client.hedge_policy.shutdown()
+
+
+def test_model_router(client, server):
+    def script(request: dict) -> dict:
+        # the small model does not call tools
+        if request["model"] == "small":
+            return {"content": "Sure!"}
+        return {"tool_calls": [("done", {"message": request["model"]})]}
+
+    server.script = script
+    try:
+        client.router = ModelRouter(["small", "large"])
+        results = client.run("hello")
+        # escalated after the malformed response
+        assert results.response_data["message"] == "large"
+        assert results.malformed_responses == 1
+        assert list(results.model_usage) == ["small", "large"]
+        assert results.model_usage["large"].requests == 1
+        assert results.model_usage["large"].input_tokens == 10
+        assert results.model_usage["large"].latency > 0
+
+        client.router = ModelRouter(["small", "large"], rules=[ModelRule(model="large", min_tokens=500)])
+        results = client.run("hello " * 1000)
+        assert list(results.model_usage) == ["large"]
+
+        client.router = ModelRouter(["small", "large"], scorer=lambda _: 0.9)
+        results = client.run("hello")
+        assert list(results.model_usage) == ["large"]
+    finally:
+        server.script = echo_script
+
+
+def chunk(delta: dict | None = None, usage: dict | None = None) -> ChatCompletionChunk:
+    return ChatCompletionChunk.model_validate(
+        {
+            "id": "chunk",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "stub",
+            "choices": [{"index": 0, "delta": delta}] if delta is not None else [],
+            "usage": usage,
+        }
+    )
+
+
+def tool_call_delta(index: int, args: str, name: str | None = None) -> dict:
+    head = {"id": f"call_{index}", "type": "function"} if name else {}
+    return {"tool_calls": [{"index": index, **head, "function": {"name": name, "arguments": args}}]}
+
+
+def test_stream_assembler():
+    assembler = ChatCompletionStreamAssembler()
+    assert assembler.add(chunk({"content": "Hi"})) == ("Hi", [])
+    assert assembler.add(chunk(tool_call_delta(0, '{"query": ', "lookup"))) == ("", [])
+    # the second call is complete but waits for the first, whose arguments continue after it started
+    assert assembler.add(chunk(tool_call_delta(1, '{"message": "ok"}', "done"))) == ("", [])
+    _, completed = assembler.add(chunk(tool_call_delta(0, '"x"}')))
+    assert [(c.name, c.args) for c in completed] == [("lookup", '{"query": "x"}'), ("done", '{"message": "ok"}')]
+    assert assembler.finish() == []
+    # the usage arrives in a final chunk without choices
+    assert assembler.add(chunk(usage={"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15})) == ("", [])
+    assert assembler.usage.prompt_tokens == 10
+    message = assembler.message()
+    assert message.content == "Hi"
+    assert [c.id for c in message.tool_calls] == ["call_0", "call_1"]
+
+    # arguments that never parse are only reported when the stream ends
+    assembler = ChatCompletionStreamAssembler()
+    assert assembler.add(chunk(tool_call_delta(0, '{"query": ', "lookup"))) == ("", [])
+    assert [c.args for c in assembler.finish()] == ['{"query": ']
+
+
+def test_stream_early_dispatch(client, server):
+    lookups = []
+
+    def script(request: dict) -> dict:
+        if request["messages"][-1]["role"] == "tool":
+            return {"tool_calls": [("done", {"message": "ok"})]}
+        # the first request, with the system prompt and the prompt, has a malformed second call
+        if len(request["messages"]) == 2:
+            return {"tool_calls": [("lookup", {"query": "x"}), ("missing", {})]}
+        return {"tool_calls": [("lookup", {"query": "y"})]}
+
+    server.script = script
+    try:
+        for early_dispatch in (False, True):
+            lookups.clear()
+            lookup = BasicTool(
+                "lookup",
+                "Look something up.",
+                properties=[PropertyDefinition(name="query", type=str, description="What to look up.")],
+                execute=lambda query: lookups.append(query) or ToolBotResponse(content=query),
+                early_dispatch=early_dispatch,
+            )
+            streaming = get_bot_client(
+                "openai", api_key="_", base_url=server.url, model="stub", stream=True, tools=[*client.tools, lookup]
+            )
+            results = streaming.run("hello")
+            assert results.response_data["message"] == "ok"
+            assert results.malformed_responses == 1
+            # only a tool that allows it runs before the malformed call is seen
+            assert lookups == (["x", "y"] if early_dispatch else ["y"])
+    finally:
+        server.script = echo_script
+
+
+def test_stream_event_order(client, server):
+    server.script = lambda _: {"content": "Hi", "tool_calls": [("done", {"message": "ok"})]}
+    try:
+        streaming = get_bot_client(
+            "openai_async", api_key="_", base_url=server.url, model="stub", stream=True, tools=client.tools
+        )
+        expected = ["token", "tool_call_start", "tool_call_end", "iteration", "response"]
+        assert [e.type for e in streaming.iter_run("hello")] == expected
+
+        async def events() -> list[str]:
+            return [e.type async for e in streaming.aiter_run("hello")]
+
+        assert asyncio.run(events()) == expected
+    finally:
+        server.script = echo_script
+
+
+def test_parallel_tool_calls(client, server):
+    executed = []
+
+    def wait(seconds: float) -> ToolBotResponse:
+        time.sleep(seconds)
+        executed.append(("wait", seconds))
+        return ToolBotResponse(content=str(seconds))
+
+    def record(name: str) -> ToolBotResponse:
+        executed.append(("record", name))
+        return ToolBotResponse(content=name)
+
+    tools = [
+        *client.tools,
+        BasicTool("wait", "Wait.", [PropertyDefinition(name="seconds", type=float, description="")], wait),
+        BasicTool("record", "Record.", [PropertyDefinition(name="name", type=str, description="")], record),
+        BasicTool(
+            "strict", "Record.", [PropertyDefinition(name="name", type=str, description="")], record, thread_safe=False
+        ),
+    ]
+    parallel = get_bot_client(
+        "openai", api_key="_", base_url=server.url, model="stub", tools=tools, parallel_tool_calls=True
+    )
+
+    server.script = lambda request: (
+        {"tool_calls": [("done", {"message": "ok"})]}
+        if request["messages"][-1]["role"] == "tool"
+        else {"tool_calls": [("wait", {"seconds": s}) for s in (0.3, 0.2, 0.1)]}
+    )
+    try:
+        start = time.perf_counter()
+        results = parallel.run("hello")
+        assert time.perf_counter() - start < 0.55
+        # responses are recorded in call order, not completion order
+        assert [c.args["seconds"] for c in results.tool_calls[:3]] == [0.3, 0.2, 0.1]
+        assert [m.content for m in results.session.messages if m.role == BotMessageRole.TOOL][:3] == [
+            "0.3",
+            "0.2",
+            "0.1",
+        ]
+
+        executed.clear()
+        server.script = lambda _: {
+            "tool_calls": [("done", {"message": "ok"}), ("record", {"name": "loose"}), ("strict", {"name": "strict"})]
+        }
+        results = parallel.run("hello")
+        # nothing after the user response is recorded, and a tool that is not thread safe never runs
+        assert [c.tool for c in results.tool_calls] == ["done"]
+        assert ("record", "strict") not in executed
+    finally:
+        server.script = echo_script
+
+
+def test_chat_completion_wire_body(client, server):
+    bodies = []
+
+    def script(request: dict) -> dict:
+        bodies.append(request)
+        return echo_script(request)
+
+    def expected(system_prompt: str, **kwargs) -> dict:
+        return {
+            "messages": [
+                {"role": "system", "content": system_prompt, "tool_calls": None, "tool_call_id": None},
+                {"role": "user", "content": "hello", "tool_calls": None, "tool_call_id": None},
+            ],
+            "model": "stub",
+            "temperature": 0.2,
+            "top_p": 0.1,
+            "tools": [
+                {
+                    "type": "function",
+                    "function": {
+                        "name": "done",
+                        "description": "Respond to the user.",
+                        "parameters": {
+                            "type": "object",
+                            "properties": {"message": {"type": "string", "description": "Your response to the user."}},
+                            "required": [],
+                        },
+                    },
+                }
+            ],
+            "tool_choice": "required",
+            **kwargs,
+        }
+
+    server.script = script
+    try:
+        stream = {"stream": True, "stream_options": {"include_usage": True}}
+        for kind, options, extra in (
+            ("openai", {}, {}),
+            ("openai", {"stream": True}, stream),
+            ("openai_async", {}, {}),
+        ):
+            bodies.clear()
+            bot = get_bot_client(kind, api_key="_", base_url=server.url, model="stub", tools=client.tools, **options)
+            results = bot.run("hello")
+            assert bodies == [expected(results.session.messages[0].content, **extra)]
+    finally:
+        server.script = echo_script
+
+
+def test_tool_registry(client, server, monkeypatch):
+    def lookup(description: str) -> BasicTool:
+        return BasicTool(
+            "lookup",
+            description,
+            [PropertyDefinition(name="query", type=str, description="")],
+            lambda **_: ToolBotResponse(content=""),
+        )
+
+    validated = []
+    monkeypatch.setattr(
+        "ai_tool_lib.bot.tool.registry.compile_validator",
+        lambda name, properties: validated.append(name) or compile_validator(name, properties),
+    )
+    handlers = []
+
+    class CountingToolHandler(ToolHandler):
+        def __init__(self, *args, **kwargs):
+            handlers.append(self)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr("ai_tool_lib.bot.client.base.ToolHandler", CountingToolHandler)
+    descriptions = []
+
+    def script(request: dict) -> dict:
+        descriptions.append([t["function"]["description"] for t in request["tools"]])
+        return echo_script(request)
+
+    first, second = lookup("First."), lookup("Second.")
+    offered = [[*client.tools, first], client.tools, [*client.tools, first]]
+    server.script = script
+    try:
+        bot = get_bot_client("openai", api_key="_", base_url=server.url, model="stub", tools=lambda _: offered.pop(0))
+        for _ in range(3):
+            bot.run("hello")
+        # every tool is validated once, and offering the same tools again reuses their handler
+        assert validated == ["done", "lookup"]
+        assert len(handlers) == 2
+
+        # a different tool with a known name replaces it
+        offered = [[*client.tools, second]]
+        bot.run("hello")
+        assert validated == ["done", "lookup", "lookup"]
+        assert descriptions[-1] == ["Respond to the user.", "Second."]
+
+        offered = [[*client.tools, first, second]]
+        with pytest.raises(ToolNameConflictError):
+            bot.run("hello")
+    finally:
+        server.script = echo_script
+
+    with pytest.raises(ToolNameConflictError):
+        ToolRegistry([first, second])
+    registry = ToolRegistry([first])
+    version = registry.version
+    assert registry.merge([first, *client.tools]) == ["lookup", "done"]
+    assert registry.merge([first]) == ["lookup"]
+    assert registry.version == version + 1
+    assert registry.subset(["lookup"]).validator("lookup") is registry.validator("lookup")
+
+
+def test_compaction_turns_with_retries(client, server):
+    requests = []
+
+    def script(request: dict) -> dict:
+        requests.append(request)
+        # answer every prompt with an undefined tool first, so it is retried
+        if request["messages"][-1]["role"] == "user" and "try again" not in request["messages"][-1]["content"]:
+            return {"tool_calls": [("undefined", {})]}
+        return {"tool_calls": [("done", {"message": "ok"})]}
+
+    client.compactor = SlidingWindowCompactor(max_turns=1)
+    server.script = script
+    try:
+        results = client.run("first")
+        _, turns = split_turns(results.session.messages)
+        # the retry prompt stays in the turn of the prompt it follows
+        assert len(turns) == 1
+        assert next(m.content for m in turns[0] if m.role == BotMessageRole.USER) == "first"
+        assert [m.synthetic for m in turns[0] if m.role == BotMessageRole.USER] == [False, True]
+
+        requests.clear()
+        client.run("second", results.session)
+        # the last turn is kept with its prompt, not just from the retry prompt on
+        prompts = [m["content"] for m in requests[-1]["messages"] if m["role"] == "user"]
+        assert prompts[0] == "second"
+        assert len(prompts) == 2
+    finally:
+        server.script = echo_script
+
+
+def test_property_validation():
+    point = PropertyDefinition(
+        name="point",
+        type=dict,
+        description="",
+        required=True,
+        properties=[
+            PropertyDefinition(name="x", type=int, description="", range_min=0, range_max=10, required=True),
+            PropertyDefinition(name="label", type=str, description="", pattern="^[a-z]+$"),
+        ],
+    )
+    tags = PropertyDefinition(
+        name="tags",
+        type=list,
+        description="",
+        max_length=2,
+        items=PropertyDefinition(name="tag", type=str, description="", choices=["a", "b"]),
+    )
+    validate = compile_validator("plot", [point, tags])
+    validate({"point": {"x": 5, "label": "origin"}, "tags": ["a", "b"]})
+
+    # every violation, in nested objects and array items, is reported in one error
+    with pytest.raises(ToolPropertyInvalidError) as e:
+        validate({"point": {"x": 11, "label": "Origin"}, "tags": ["a", "c"]})
+    assert e.value.tool_name == "plot"
+    assert [path for path, _ in e.value.violations] == ["point.x", "point.label", "tags[1]"]
+    assert "had 3 problems" in e.value.retry_message()
+    with pytest.raises(ToolPropertyInvalidError) as e:
+        validate({"point": {"x": "5"}, "tags": ["a", "b", "a"]})
+    assert [path for path, _ in e.value.violations] == ["point.x", "tags"]
+    with pytest.raises(ToolPropertyMissingError) as e:
+        validate({"point": {"label": "origin"}})
+    assert e.value.property_name == "point.x"
+
+    # a property shared between tools names the tool it was validated for
+    for tool_name in ("plot", "draw"):
+        with pytest.raises(ToolPropertyInvalidError) as e:
+            point.validate_property_value({"x": 11}, tool_name)
+        assert e.value.tool_name == tool_name
+        assert f"tool '{tool_name}'" in str(e.value)
+        assert f"'{tool_name}' tool" in e.value.retry_message()
+
+
+def test_arun(server):
+    threads = []
+
+    def lookup(query: str) -> ToolBotResponse:
+        threads.append(threading.get_ident())
+        return ToolBotResponse(content=f"found {query}")
+
+    async def done(message: str) -> ToolUserResponse:
+        await asyncio.sleep(0)
+        return ToolUserResponse(data={"message": message})
+
+    tools = [
+        BasicTool("lookup", "Look up.", [PropertyDefinition(name="query", type=str, description="")], lookup),
+        BasicTool("done", "Respond.", [PropertyDefinition(name="message", type=str, description="")], done),
+    ]
+    server.script = lambda request: (
+        {"tool_calls": [("done", {"message": request["messages"][-1]["content"]})]}
+        if request["messages"][-1]["role"] == "tool"
+        else {"tool_calls": [("lookup", {"query": "it"})]}
+    )
+    try:
+        for kind in ("openai", "openai_async"):
+            threads.clear()
+            bot = get_bot_client(kind, api_key="_", base_url=server.url, model="stub", tools=tools)
+            results = asyncio.run(bot.arun("hello"))
+            assert [c.tool for c in results.tool_calls] == ["lookup", "done"]
+            assert results.response_data["message"] == "found it"
+            assert results.iterations == 2
+            # the sync tool does not block the event loop
+            assert threads[0] != threading.get_ident()
+    finally:
+        server.script = echo_script
@@ -0,0 +1,69 @@
+# SPDX-FileCopyrightText: 2024-present Nathan Ogden <nathan@ogden.tech>
+#
+# SPDX-License-Identifier: MIT
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ai_tool_lib import BasicTool
+from ai_tool_lib.bot.metrics import BotSpan, BotSpanKind
+from ai_tool_lib.bot.tool.cache import ToolResultCache
+from ai_tool_lib.bot.tool.handler import ToolHandler
+from ai_tool_lib.bot.tool.property import PropertyDefinition
+from ai_tool_lib.bot.tool.response import ToolBotResponse
+from ai_tool_lib.utils.cache import MemoryCache
+
+""" Test tool results are memoized for cacheable tools. """
+
+
+def test_tool_result_cache():
+    calls = []
+
+    def lookup(query: str) -> ToolBotResponse:
+        calls.append(query)
+        time.sleep(0.1)
+        if query == "fail" and calls.count(query) == 1:
+            raise RuntimeError(query)
+        return ToolBotResponse(content=f"{query} {len(calls)}")
+
+    def tool(name: str, **kwargs) -> BasicTool:
+        properties = [PropertyDefinition(name="query", type=str, description="")]
+        return BasicTool(name, "Look up.", properties, lookup, **kwargs)
+
+    handler = ToolHandler(
+        [tool("cached", cacheable=True), tool("expiring", cacheable=True, cache_ttl=0.05), tool("uncached")],
+        cache=ToolResultCache(),
+    )
+
+    # identical calls in flight at the same time execute the tool once
+    span = BotSpan.begin(BotSpanKind.ITERATION, "test")
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        responses = list(executor.map(lambda _: handler.call("cached", {"query": "a"}, span).content, range(4)))
+    assert responses == ["a 1"] * 4
+    assert handler.call("cached", {"query": "a"}, span).content == "a 1"
+    assert asyncio.run(handler.acall("cached", {"query": "a"}, span=span)).content == "a 1"
+    assert calls == ["a"]
+    # the cache reports its hits, only the call that executed the tool is not one
+    assert sorted(s.attributes["cached"] for s in span.children) == [False, True, True, True, True, True]
+
+    # errors are not cached
+    with pytest.raises(RuntimeError):
+        handler.call("cached", {"query": "fail"})
+    assert handler.call("cached", {"query": "fail"}).content == "fail 3"
+
+    calls.clear()
+    handler.call("expiring", {"query": "b"})
+    handler.call("expiring", {"query": "b"})
+    time.sleep(0.1)
+    handler.call("expiring", {"query": "b"})
+    assert calls == ["b", "b"]
+
+    # tools are not cached unless they opt in, also with a shared backend
+    calls.clear()
+    handler = ToolHandler([tool("uncached")], cache=ToolResultCache(MemoryCache()))
+    handler.call("uncached", {"query": "c"})
+    handler.call("uncached", {"query": "c"})
+    assert calls == ["c", "c"]